@@ -4,29 +4,123 @@ try:
 except ImportError:
     # Pymodbus < 3.0
     from pymodbus.client.sync import ModbusTcpClient
+from pymodbus.exceptions import ParameterException
 from Cryptodome.Cipher import AES
-from datetime import date
+import json
+import os
+import time
 
 PRIV_KEY = b'Grow#0*2Sun68CbE'
 NO_CRYPTO1 = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 NO_CRYPTO2 = b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff'
 GET_KEY = b'\x68\x68\x00\x00\x00\x06\xf7\x04\x0a\xe7\x00\x08'
 HEADER = bytes([0x68, 0x68])
+# packet_len is a single byte of the crypto header
+MAX_PACKET_LEN = 255
+# largest encrypted frame: crypto header + packet_len (1 byte) + padding
+MAX_FRAME_SIZE = 4 + MAX_PACKET_LEN + 16
+# transaction id, protocol id, length and unit id
+MBAP_SIZE = 7
+# largest read whose reply (function code, byte count, registers) fits a frame
+MAX_READ_REGISTERS = (MAX_PACKET_LEN - MBAP_SIZE - 2) // 2
+READ_REGISTERS = (3, 4)
+# 0xff padding for every possible padding length, indexed by length
+PADDING = tuple(b'\xff' * padding for padding in range(17))
+
+class SessionKeyCache:
+    """Session keys per host/port, valid for ttl seconds.
+
+    Shared between client instances so a new connection can skip the GET_KEY
+    round trip; pass path to keep the keys in a JSON file across restarts.
+    """
+
+    def __init__(self, ttl=3600, path=None):
+        self._ttl = ttl
+        self._path = path
+        self._keys = {}
+        if path:
+            self._load()
+
+    def get(self, host, port):
+        entry = self._keys.get("%s:%s" % (host, port))
+        if entry is None:
+            return None
+        key, expires = entry
+        if time.time() >= expires:
+            self.invalidate(host, port)
+            return None
+        return key
+
+    def put(self, host, port, key):
+        self._keys["%s:%s" % (host, port)] = (key, time.time() + self._ttl)
+        self._save()
+
+    def invalidate(self, host, port):
+        if self._keys.pop("%s:%s" % (host, port), None) is not None:
+            self._save()
+
+    def _load(self):
+        try:
+            with open(self._path) as store:
+                entries = json.load(store)
+            self._keys = dict(
+                (host, (bytes.fromhex(key), expires))
+                for host, (key, expires) in entries.items()
+            )
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def _save(self):
+        if not self._path:
+            return
+        entries = dict((host, (key.hex(), expires)) for host, (key, expires) in self._keys.items())
+        try:
+            with open(self._path + ".tmp", "w") as store:
+                json.dump(entries, store)
+            os.replace(self._path + ".tmp", self._path)
+        except OSError:
+            pass
 
 class SungrowModbusTcpClient(ModbusTcpClient):
-    def __init__(self, priv_key=PRIV_KEY, **kwargs):
+    def __init__(self, priv_key=PRIV_KEY, key_cache=None, single_connection=True,
+                 rekey_interval=86400, rekey_retry=60, **kwargs):
         ModbusTcpClient.__init__(self, **kwargs)
+        self._params = kwargs
         self._fifo = bytes()
         self._priv_key = priv_key
+        self._key_cache = key_cache
+        self._key_verified = False
+        self._key_from_cache = False
+        # keep the socket the key was exchanged on, firmware that does not
+        # answer there switches this back to a second connect
+        self._reconnect_after_key = not single_connection
         self._key = None
+        # requests are encrypted in place behind a reusable crypto header
+        self._cipher = bytearray(MAX_FRAME_SIZE)
+        self._cipher[0:2] = b'\x01\x00'
+        self._cipher_views = {}
         self._orig_recv = self._recv
         self._orig_send = self._send
-        self._key_date = date.today()
+        # the key is renewed rekey_interval seconds after it was obtained (0
+        # never), a failed renewal is retried after rekey_retry seconds,
+        # doubling up to the interval
+        self._rekey_interval = rekey_interval
+        self._rekey_retry = min(rekey_retry, rekey_interval) if rekey_interval else rekey_retry
+        self._rekey_retry_in = self._rekey_retry
+        self._key_due = None
 
-    def _setup(self):
-           self._key = bytes(a ^ b for (a, b) in zip(self._pub_key, self._priv_key))
+    def _setup(self, key=None):
+           # the key is trusted once the dongle answered with it
+           self._key_verified = False
+           self._key_from_cache = key is not None
+           if key is None:
+              key = bytes(a ^ b for (a, b) in zip(self._pub_key, self._priv_key))
+              if self._key_cache:
+                 self._key_cache.put(self.host, self.port, key)
+           self._key = key
            self._aes_ecb = AES.new(self._key, AES.MODE_ECB)
-           self._key_date = date.today()
+           self._key_due = time.monotonic() + self._rekey_interval if self._rekey_interval else None
+           self._rekey_retry_in = self._rekey_retry
            self._send = self._send_cipher
            self._recv = self._recv_decipher
            self._fifo = bytes()
@@ -39,8 +133,12 @@ class SungrowModbusTcpClient(ModbusTcpClient):
            self._fifo = bytes()
 
     def _getkey(self):
-        if (self._key is None) or (self._key_date != date.today()):
+        if self._key is None:
            self._restore()
+           key = self._key_cache.get(self.host, self.port) if self._key_cache else None
+           if key is not None:
+              self._setup(key)
+              return True
            self._send(GET_KEY)
            self._key_packet = self._recv(25)
            self._pub_key = self._key_packet[9:]
@@ -48,16 +146,69 @@ class SungrowModbusTcpClient(ModbusTcpClient):
               self._setup()
            else:
               self._key = b'no encryption'
-              self._key_date = date.today()
+              self._key_due = None
+        return False
+
+    def _reject_key(self):
+        # the dongle did not answer the first request with this key: forget
+        # a cached key, or go back to reconnecting after the key exchange,
+        # the next connect fetches a new key either way
+        if self._key_from_cache:
+           self._key_cache.invalidate(self.host, self.port)
+        elif not self._reconnect_after_key:
+           self._reconnect_after_key = True
+        else:
+           return False
+        self._restore()
+        ModbusTcpClient.close(self)
+        return True
+
+    @property
+    def rekey_due(self):
+        """True once the session key is due for renewal, see rekey."""
+        return self._key_due is not None and time.monotonic() >= self._key_due
+
+    def rekey(self):
+        """Renew the session key on a second connection, then switch to it.
+
+        Call it in a gap between polls to keep the handshake off the
+        requests, connect renews a due key itself otherwise.  The current
+        session stays in use if the renewal fails.
+        """
+        if self._key_cache:
+           # the new session must not reuse the key it replaces
+           self._key_cache.invalidate(self.host, self.port)
+        replacement = SungrowModbusTcpClient(
+            priv_key=self._priv_key,
+            key_cache=self._key_cache,
+            single_connection=not self._reconnect_after_key,
+            rekey_interval=0,
+            **self._params
+        )
+        if not replacement.connect() or replacement._aes_ecb is None:
+           replacement.close()
+           self._key_due = time.monotonic() + self._rekey_retry_in
+           self._rekey_retry_in = min(max(self._rekey_interval, self._rekey_retry), self._rekey_retry_in * 2)
+           return False
+        self.close()
+        self.socket, replacement.socket = replacement.socket, None
+        self._setup(replacement._key)
+        self._key_from_cache = replacement._key_from_cache
+        self._reconnect_after_key = replacement._reconnect_after_key
+        return True
 
     def connect(self):
+        if self._key is not None and self.rekey_due:
+            self.rekey()
+        if not self._reconnect_after_key and self.socket and self._key is not None:
+            return True
         self.close()
         result = ModbusTcpClient.connect(self)
         if not result:
             self._restore()
         else:
-            self._getkey()
-            if self._key is not None:
+            from_cache = self._getkey()
+            if self._key is not None and not from_cache and self._reconnect_after_key:
                # We now have the encryption key stored and a second
                # connect will likely succeed.
                self.close()
@@ -68,31 +219,93 @@ class SungrowModbusTcpClient(ModbusTcpClient):
        ModbusTcpClient.close(self)
        self._fifo = bytes()
 
+    def _drop_session(self):
+        # the reply stream is out of step, nothing more read on this socket
+        # can be trusted: the next request reconnects with a new key
+        self._restore()
+        ModbusTcpClient.close(self)
+        return b''
+
+    def execute(self, request=None):
+        if request is not None and self._key != b'no encryption':
+            if request.function_code in READ_REGISTERS:
+                if request.count > MAX_READ_REGISTERS:
+                    return self._split_read(request)
+            elif MBAP_SIZE + 1 + len(request.encode()) > MAX_PACKET_LEN:
+                # a write cannot be split without losing its atomicity
+                raise ParameterException("request does not fit an encrypted frame")
+        return ModbusTcpClient.execute(self, request)
+
+    def _split_read(self, request):
+        # the reply would not fit the packet_len byte, read the registers in
+        # the largest parts that do and join the replies
+        registers = []
+        response = None
+        for offset in range(0, request.count, MAX_READ_REGISTERS):
+            part = ModbusTcpClient.execute(self, type(request)(
+                request.address + offset,
+                min(MAX_READ_REGISTERS, request.count - offset),
+                unit=request.unit_id,
+            ))
+            if part.isError():
+                return part
+            registers.extend(part.registers)
+            response = response or part
+        response.registers = registers
+        return response
+
     def _send_cipher(self, request):
         self._fifo = bytes()
         length = len(request)
         padding = 16 - (length % 16)
+        end = 4 + length + padding
         self._transactionID = request[:2]
-        request = HEADER + bytes(request[2:]) + bytes([0xff for i in range(0, padding)])
-        crypto_header = bytes([1, 0, length, padding])
-        encrypted_request = crypto_header + self._aes_ecb.encrypt(request)
-        return ModbusTcpClient._send(self, encrypted_request) - len(crypto_header) - padding
+        cipher = self._cipher
+        cipher[2] = length
+        cipher[3] = padding
+        cipher[4:4 + length] = request
+        cipher[4:6] = HEADER
+        cipher[4 + length:end] = PADDING[padding]
+        frame, plain = self._cipher_frame(end)
+        self._aes_ecb.encrypt(plain, output=plain)
+        return ModbusTcpClient._send(self, frame) - 4 - padding
+
+    def _cipher_frame(self, end):
+        # frames are a multiple of 16 bytes, only a handful of sizes exist
+        views = self._cipher_views.get(end)
+        if views is None:
+           view = memoryview(self._cipher)
+           views = self._cipher_views[end] = (view[:end], view[4:end])
+        return views
 
     def _recv_decipher(self, size):
         if len(self._fifo) == 0:
             header = ModbusTcpClient._recv(self, 4)
             if header and len(header) == 4:
-               packet_len = int(header[2])
-               padding = int(header[3])
+               packet_len = header[2]
+               padding = header[3]
+               if padding > 16 or (packet_len + padding) % 16:
+                  # not a crypto header
+                  return self._drop_session()
                length = packet_len + padding
                encrypted_packet = ModbusTcpClient._recv(self, length)
                if encrypted_packet and len(encrypted_packet) == length:
                   packet = self._aes_ecb.decrypt(encrypted_packet)
+                  if packet[:2] != HEADER and not self._key_verified and self._reject_key():
+                     return b''
+                  self._key_verified = True
+                  if packet_len < MBAP_SIZE or (packet[4] << 8 | packet[5]) + 6 != packet_len:
+                     # a reply longer than packet_len can express arrives
+                     # cut off, the rest of it would be taken for the next reply
+                     return self._drop_session()
                   packet = self._transactionID + packet[2:]
                   self._fifo = self._fifo + packet[:packet_len]
+            elif not self._key_verified and self._reject_key():
+               return b''
 
         if size is None:
-           recv_size = 1
+           # unbounded read, hand over the whole decrypted frame
+           recv_size = len(self._fifo)
         else:
            recv_size = size
 
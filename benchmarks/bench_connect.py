@@ -0,0 +1,84 @@
+"""Benchmark SungrowModbusTcpClient connect and poll latency.
+
+Runs the simulated WiNet dongle (simulator.py) on localhost and compares the former
+double-connect handshake (single_connection=False) with the single
+connection mode: the time of a cold connect (key exchange included), the
+time per read when polling on one client, and the number of TCP connections
+the simulator accepted.  Each new connection costs --setup ms before the
+dongle serves it, on top of --latency ms per reply.  A last run uses a
+simulator that only answers on a fresh connection after the key exchange,
+to show the single connection mode falling back.  Needs pymodbus 2.x, like
+SungrowModbusTcpClient itself.
+
+    python benchmarks/bench_connect.py [--latency MS] [--setup MS] [--reads N]
+"""
+
+import argparse
+import time
+
+from simulator import Simulator
+
+from SungrowModbusTcpClient.SungrowModbusTcpClient import SungrowModbusTcpClient
+
+
+def cold_connect(port, single_connection, connects):
+    """Average seconds from a new client to its first successful read."""
+    elapsed = 0
+    for _ in range(connects):
+        client = SungrowModbusTcpClient(
+            host="127.0.0.1", port=port, timeout=1, single_connection=single_connection
+        )
+        start = time.perf_counter()
+        result = client.read_holding_registers(0, 10, unit=1)
+        while result.isError():
+            result = client.read_holding_registers(0, 10, unit=1)
+        elapsed += time.perf_counter() - start
+        client.close()
+    return elapsed / connects
+
+
+def poll(port, single_connection, reads):
+    """Average seconds per read on one connected client."""
+    client = SungrowModbusTcpClient(
+        host="127.0.0.1", port=port, timeout=1, single_connection=single_connection
+    )
+    client.read_holding_registers(0, 10, unit=1)
+    start = time.perf_counter()
+    for _ in range(reads):
+        assert not client.read_holding_registers(0, 10, unit=1).isError()
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed / reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=5, help="dongle reply latency in ms")
+    parser.add_argument("--setup", type=float, default=20, help="new connection setup time in ms")
+    parser.add_argument("--connects", type=int, default=10)
+    parser.add_argument("--reads", type=int, default=50)
+    args = parser.parse_args()
+
+    print(
+        f"dongle latency {args.latency} ms, setup {args.setup} ms,"
+        f" {args.connects} connects, {args.reads} reads"
+    )
+    print(f"{'firmware':>10} {'mode':>8} {'connect ms':>11} {'read ms':>8} {'tcp conns':>10}")
+    for firmware, reconnect_required in (("normal", False), ("reconnect", True)):
+        for mode, single_connection in (("double", False), ("single", True)):
+            dongle = Simulator(
+                latency=args.latency / 1000,
+                accept_delay=args.setup / 1000,
+                reconnect_required=reconnect_required,
+            ).start_in_thread()
+            connect = cold_connect(dongle.port, single_connection, args.connects)
+            read = poll(dongle.port, single_connection, args.reads)
+            print(
+                f"{firmware:>10} {mode:>8} {connect * 1000:>11.2f} {read * 1000:>8.2f}"
+                f" {dongle.connections:>10}"
+            )
+            dongle.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Benchmark decoding sensor registers into values.
+
+Decodes the registers of an int32 sensor (word swapped, scaled to one
+decimal, with and without a nan_value) with slave_count additional values,
+with RegisterDecoder (scalar, and with NumPy if installed) and with the
+former round trip through a comma separated string that the sensor parsed
+back into numbers, and reports the time per sample.  A second table
+compares the sensors of one block read decoding their own registers with
+BlockDecoder decoding them all from one buffer, as one array with NumPy
+from BlockDecoder.vector_min_values values on.
+
+    python benchmarks/bench_decode.py [--reads N]
+"""
+
+import argparse
+import struct
+import sys
+
+from common import measure
+
+import decoder
+from decoder import RegisterDecoder
+
+
+class ScalarDecoder(RegisterDecoder):
+    """Never decode with NumPy."""
+
+    vector_min_values = sys.maxsize
+
+
+class VectorDecoder(RegisterDecoder):
+    """Always decode with NumPy."""
+
+    vector_min_values = 1
+
+
+class LegacyDecoder(RegisterDecoder):
+    """Decode path as it was before the typed values, for comparison."""
+
+    def _swap_registers(self, registers, slave_count):
+        if slave_count:
+            swapped = []
+            for i in range(self.slave_count + 1):
+                inx = i * self.slave_size
+                inx2 = inx + self.slave_size
+                swapped.extend(self._swap_registers(registers[inx:inx2], 0))
+            return swapped
+        if self.swap_bytes:
+            for i, register in enumerate(registers):
+                registers[i] = int.from_bytes(
+                    register.to_bytes(2, byteorder="little"),
+                    byteorder="big",
+                    signed=False,
+                )
+        if self.swap_words:
+            registers.reverse()
+        return registers
+
+    def _process_raw_value(self, entry):
+        if self.nan_value and entry in (self.nan_value, -self.nan_value):
+            return None
+        val = self.scale * entry + self.offset
+        if self.precision == 0:
+            return str(round(val))
+        return f"{float(val):.{self.precision}f}"
+
+    def decode(self, registers):
+        registers = self._swap_registers(list(registers), self.slave_count)
+        byte_string = b"".join([x.to_bytes(2, byteorder="big") for x in registers])
+        val = struct.unpack(self.structure, byte_string)
+        if len(val) > 1:
+            result = ",".join(str(self._process_raw_value(entry)) for entry in val)
+        else:
+            result = self._process_raw_value(val[0])
+        if result is None:
+            return [None]
+        # the sensor parsed the string back into numbers
+        return [float(i) if i != "None" else None for i in result.split(",")]
+
+
+def make_decoder(klass, slave_count, nan_value):
+    return klass(
+        f">{slave_count + 1}i",
+        slave_size=2,
+        slave_count=slave_count,
+        swap_words=True,
+        scale=0.1,
+        precision=1,
+        nan_value=nan_value,
+    )
+
+
+def decode(decoder, registers, reads):
+    for _ in range(reads):
+        decoder.decode(registers)
+
+
+def decode_sensors(layout, registers, reads):
+    """Every sensor decodes its own slice of the block, as before."""
+    for _ in range(reads):
+        for start, sensor in layout:
+            start //= 2
+            sensor.decode(registers[start : start + sensor.slave_size])
+
+
+def decode_blocks(layout, registers, reads):
+    block_decoder = decoder.BlockDecoder(layout)
+    for _ in range(reads):
+        block_decoder.decode(registers)
+
+
+def block_layout(sensors):
+    """int32 sensors with all swap modes next to each other."""
+    swaps = ((False, False), (True, False), (False, True), (True, True))
+    return [
+        (
+            i * 4,
+            ScalarDecoder(
+                ">i",
+                slave_size=2,
+                swap_bytes=swaps[i % 4][0],
+                swap_words=swaps[i % 4][1],
+                scale=0.1,
+                precision=1,
+            ),
+        )
+        for i in range(sensors)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    decoders = [("legacy", LegacyDecoder), ("scalar", ScalarDecoder)]
+    if decoder.np is not None:
+        decoders.append(("numpy", VectorDecoder))
+    print(
+        f"{'decoder':>8} {'nan_value':>10} {'samples':>8} {'us/read':>10}"
+        f" {'us/sample':>10}"
+    )
+    for nan_value in (None, 0x7FFFFFFF):
+        for slave_count in (0, 10, 100, 500):
+            samples = slave_count + 1
+            registers = [(i * 7919) & 0xFFFF for i in range(samples * 2)]
+            # the last value is nan_value after the swap
+            registers[-2:] = [0xFFFF, 0x7FFF]
+            reads = max(1, args.reads * 10 // samples)
+            values = {}
+            for name, klass in decoders:
+                sensor = make_decoder(klass, slave_count, nan_value)
+                elapsed, _ = measure(decode, sensor, registers, reads, repeat=3)
+                values[name] = sensor.decode(registers)
+                print(
+                    f"{name:>8} {nan_value is not None!s:>10} {samples:>8}"
+                    f" {elapsed / reads * 1e6:>10.2f}"
+                    f" {elapsed / reads / samples * 1e6:>10.3f}"
+                )
+            assert all(result == values["legacy"] for result in values.values())
+
+    print()
+    print(f"{'decode':>8} {'sensors':>8} {'us/block':>10} {'us/sensor':>10}")
+    for sensors in (1, 10, 50, 200):
+        layout = block_layout(sensors)
+        registers = [(i * 7919) & 0xFFFF for i in range(sensors * 2)]
+        reads = max(1, args.reads * 10 // sensors)
+        for name, func in (("sensor", decode_sensors), ("block", decode_blocks)):
+            elapsed, _ = measure(func, layout, registers, reads, repeat=3)
+            print(
+                f"{name:>8} {sensors:>8} {elapsed / reads * 1e6:>10.2f}"
+                f" {elapsed / reads / sensors * 1e6:>10.3f}"
+            )
+        decoded = decoder.BlockDecoder(layout).decode(registers)
+        for start, sensor in layout:
+            start //= 2
+            assert decoded[sensor] == sensor.decode(registers[start : start + 2])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark AsyncSungrowModbusTcpClient frame decoding on fragmented input.
+
+Feeds a stream of encrypted read responses to the client's data callback in
+TCP-like segments of different sizes, from byte-by-byte splits up to several
+coalesced frames per segment, and reports throughput and allocation pressure
+for the client and for the former implementation.  "alloc B/frame" are the
+bytes allocated per decoded frame: tracemalloc has no allocation counter, so
+every segment is fed with the peak reset and what it allocated above the
+memory in use before is summed.  The "decoded" column shows how many frames
+reached pymodbus, "frames/s" counts only those; the former implementation
+only decoded one frame per segment.
+
+    python benchmarks/bench_receive_buffer.py [--frames N] [--registers N]
+"""
+
+import argparse
+import asyncio
+import tracemalloc
+
+from common import encrypt_frame, fragment, measure, read_response, session_key, PUB_KEY
+
+from pymodbus.logging import Log
+
+from sungrow import AsyncSungrowModbusTcpClient
+
+
+class LegacyClient(AsyncSungrowModbusTcpClient):
+    """Frame decoding as it was before the frame rework, for comparison."""
+
+    def crypto_state(self, data, addr=None):
+        self._legacy = getattr(self, "_legacy", b"") + data
+        if len(self._legacy) >= 4:
+            packet_len = int(self._legacy[2])
+            padding = int(self._legacy[3])
+            length = packet_len + padding + 4
+            if len(self._legacy) >= length:
+                encrypted_packet = self._legacy[4:length]
+                self._legacy = self._legacy[length:]
+                packet = self._aes_ecb.decrypt(encrypted_packet)
+                packet = self._transactionID + packet[2:]
+                self._orig_callback_data(packet, addr)
+        return len(data)
+
+    def _callback_data_decipher(self, data, addr=None):
+        # the states table is bound to the base class functions
+        Log.debug("*** AsyncSungrowModbusTcpClient *** {} decypher {}", self._state, len(data))
+        if self._state == "CRYPTO":
+            return self.crypto_state(data, addr)
+        return super()._callback_data_decipher(data, addr)
+
+
+def make_client(klass):
+    client = klass(host="127.0.0.1", port=502)
+    client._pub_key = PUB_KEY
+    client._setup()
+    client._transactionID = b"\x00\x01"
+    client.frames = 0
+
+    def sink(packet, addr=None):
+        client.frames += 1
+        return len(packet)
+
+    client._orig_callback_data = sink
+    return client
+
+
+def feed(client, chunks):
+    client.frames = 0
+    callback = client.ctx.callback_data
+    for chunk in chunks:
+        callback(chunk)
+
+
+def allocated(client, chunks):
+    """Bytes allocated while feeding chunks, summed per chunk."""
+    client.frames = 0
+    callback = client.ctx.callback_data
+    total = 0
+    tracemalloc.start()
+    for chunk in chunks:
+        tracemalloc.reset_peak()
+        in_use = tracemalloc.get_traced_memory()[0]
+        callback(chunk)
+        total += tracemalloc.get_traced_memory()[1] - in_use
+    tracemalloc.stop()
+    return total
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--registers", type=int, default=100)
+    args = parser.parse_args()
+
+    frame = encrypt_frame(session_key(), read_response(1, 1, args.registers))
+    stream = frame * args.frames
+    print(f"{args.frames} frames of {len(frame)} bytes ({args.registers} registers)")
+    print(
+        f"{'client':>8} {'segment':>8} {'MB/s':>8} {'frames/s':>10} {'peak KiB':>9}"
+        f" {'alloc B/frame':>14} {'decoded':>8}"
+    )
+    for segment in (1, 7, 64, 1460):
+        chunks = fragment(stream, segment)
+        for name, klass in (("legacy", LegacyClient), ("client", AsyncSungrowModbusTcpClient)):
+            client = make_client(klass)
+            elapsed, peak = measure(feed, client, chunks)
+            per_frame = allocated(make_client(klass), chunks) / max(1, client.frames)
+            print(
+                f"{name:>8} {segment:>8} {len(stream) / elapsed / 1e6:>8.2f}"
+                f" {client.frames / elapsed:>10.0f} {peak / 1024:>9.1f}"
+                f" {per_frame:>14.0f} {client.frames:>8}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
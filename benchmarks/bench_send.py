@@ -0,0 +1,107 @@
+"""Benchmark the AsyncSungrowModbusTcpClient encrypted send path.
+
+Encrypts Modbus TCP requests of different sizes the way the client hands
+them to the transport, once with the reusable cipher buffer and once with
+the former bytes concatenation, and reports the time and the tracemalloc
+peak per request.
+
+    python benchmarks/bench_send.py [--requests N]
+"""
+
+import argparse
+import asyncio
+import tracemalloc
+
+from common import measure, PUB_KEY
+
+from pymodbus.logging import Log
+
+from sungrow import AsyncSungrowModbusTcpClient, HEADER
+
+
+class LegacyClient(AsyncSungrowModbusTcpClient):
+    """Send path as it was before the reusable cipher buffer, for comparison."""
+
+    def _low_level_send_cipher(self, request, addr=None):
+        Log.debug("*** AsyncSungrowModbusTcpClient *** cypher {}", len(request))
+        if self._state != "CRYPTO":
+            return
+        length = len(request)
+        padding = 16 - (length % 16)
+        self._transactionID = request[:2]
+        request = HEADER + bytes(request[2:]) + bytes([0xff for i in range(0, padding)])
+        crypto_header = bytes([1, 0, length, padding])
+        encrypted_request = crypto_header + self._aes_ecb.encrypt(request)
+        self._orig_low_level_send(encrypted_request, addr)
+
+
+def make_client(klass):
+    client = klass(host="127.0.0.1", port=502)
+    client._pub_key = PUB_KEY
+    client._setup()
+    client.sent = None
+
+    def sink(data, addr=None):
+        client.sent = data
+
+    client._orig_low_level_send = sink
+    return client
+
+
+def write_request(registers):
+    """Plain Modbus TCP write multiple registers request."""
+    return (
+        b"\x00\x01\x00\x00"
+        + (7 + registers * 2).to_bytes(2, "big")
+        + bytes([1, 0x10, 0, 0, 0, registers, registers * 2])
+        + bytes(registers * 2)
+    )
+
+
+def send(client, request, requests):
+    low_level_send = client.ctx.low_level_send
+    for _ in range(requests):
+        low_level_send(request)
+
+
+def peak_per_request(client, request, samples=100):
+    """Mean tracemalloc peak above the level before each request."""
+    low_level_send = client.ctx.low_level_send
+    total = 0
+    tracemalloc.start()
+    for _ in range(samples):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        low_level_send(request)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'client':>8} {'bytes':>6} {'us/request':>11} {'peak B/request':>15}")
+    for registers in (0, 24, 120):
+        # a read request is 12 bytes, the write requests 13 + 2 * registers
+        if registers:
+            request = write_request(registers)
+        else:
+            request = b"\x00\x01\x00\x00\x00\x06\x01\x03\x00\x00\x00\x0a"
+        sent = {}
+        for name, klass in (("legacy", LegacyClient), ("buffer", AsyncSungrowModbusTcpClient)):
+            client = make_client(klass)
+            elapsed, _ = measure(send, client, request, args.requests, repeat=3)
+            peak = peak_per_request(client, request)
+            sent[name] = client.sent
+            print(
+                f"{name:>8} {len(request):>6} {elapsed / args.requests * 1e6:>11.2f}"
+                f" {peak:>15.0f}"
+            )
+        assert sent["legacy"] == sent["buffer"]
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,234 @@
+"""End-to-end throughput and latency of the async and sync clients.
+
+Starts the simulated dongle (simulator.py) in a separate process, so its CPU
+time does not count, and reads blocks of holding registers back to back with
+AsyncSungrowModbusTcpClient (pymodbus 3.x) or SungrowModbusTcpClient
+(pymodbus 2.x), whichever the installed pymodbus supports.  For every block
+size it reports requests/s, p50/p95/p99 latency, CPU time per request and
+the tracemalloc peak per request (CPython has no allocation counter; the
+peak above the level before the request is the closest measure of the bytes
+a request allocates; for the async client it includes the 256 KiB buffer
+asyncio allocates for every socket read).  Results can be written as JSON and two JSON files
+compared, to spot regressions between commits:
+
+    python benchmarks/bench_throughput.py [--requests N] [--output FILE]
+    python benchmarks/bench_throughput.py --compare BEFORE.json AFTER.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from common import ROOT
+
+import pymodbus
+
+ASYNC = int(pymodbus.__version__.split(".")[0]) >= 3
+# 123 registers is the largest read reply an encrypted frame can carry, the
+# async client reads larger blocks in several frames
+BLOCK_SIZES = (1, 10, 25, 50, 100, 123) + ((125,) if ASYNC else ())
+
+
+def start_simulator(latency):
+    """Run simulator.py in a child process, return (process, port)."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.py"),
+            "--port", "0",
+            "--latency", str(latency),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    return process, int(line.rsplit(":", 1)[1])
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(client, count, latencies, cpu, alloc):
+    elapsed = sum(latencies)
+    return {
+        "client": client,
+        "registers": count,
+        "requests": len(latencies),
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_us_per_request": cpu / len(latencies) * 1e6,
+        "alloc_bytes_per_request": alloc,
+    }
+
+
+def alloc_per_request(samples):
+    """Mean tracemalloc peak above the level before each request."""
+    return statistics.mean(samples) if samples else 0
+
+
+async def bench_async(port, count, requests, alloc_requests):
+    from sungrow import AsyncSungrowModbusTcpClient
+
+    client = AsyncSungrowModbusTcpClient(host="127.0.0.1", port=port, timeout=5)
+    await client.connect()
+    await client.read_holding_registers(0, count=count, device_id=1)
+    latencies = []
+    cpu = time.process_time()
+    for _ in range(requests):
+        start = time.perf_counter()
+        result = await client.read_holding_registers(0, count=count, device_id=1)
+        latencies.append(time.perf_counter() - start)
+        assert len(result.registers) == count
+    cpu = time.process_time() - cpu
+    allocs = []
+    tracemalloc.start()
+    for _ in range(alloc_requests):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await client.read_holding_registers(0, count=count, device_id=1)
+        allocs.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    client.close()
+    return summarize("async", count, latencies, cpu, alloc_per_request(allocs))
+
+
+def bench_sync(port, count, requests, alloc_requests):
+    from SungrowModbusTcpClient.SungrowModbusTcpClient import SungrowModbusTcpClient
+
+    client = SungrowModbusTcpClient(host="127.0.0.1", port=port, timeout=5)
+    client.read_holding_registers(0, count, unit=1)
+    latencies = []
+    cpu = time.process_time()
+    for _ in range(requests):
+        start = time.perf_counter()
+        result = client.read_holding_registers(0, count, unit=1)
+        latencies.append(time.perf_counter() - start)
+        assert len(result.registers) == count
+    cpu = time.process_time() - cpu
+    allocs = []
+    tracemalloc.start()
+    for _ in range(alloc_requests):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        client.read_holding_registers(0, count, unit=1)
+        allocs.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    client.close()
+    return summarize("sync", count, latencies, cpu, alloc_per_request(allocs))
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import Cryptodome
+
+    return {
+        "commit": commit,
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pymodbus": pymodbus.__version__,
+        "pycryptodomex": Cryptodome.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def print_results(results):
+    print(
+        f"{'client':>6} {'regs':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}"
+        f" {'p99 ms':>8} {'cpu us':>8} {'alloc B':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['client']:>6} {r['registers']:>5} {r['requests_per_s']:>9.0f}"
+            f" {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f}"
+            f" {r['cpu_us_per_request']:>8.1f} {r['alloc_bytes_per_request']:>9.0f}"
+        )
+
+
+def compare(before_path, after_path):
+    """Print after/before ratios for every metric of matching rows."""
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print(f"before {before['environment']['commit']}, after {after['environment']['commit']}")
+    metrics = {
+        "requests_per_s": "req/s",
+        "p50_ms": "p50",
+        "p95_ms": "p95",
+        "p99_ms": "p99",
+        "cpu_us_per_request": "cpu",
+        "alloc_bytes_per_request": "alloc",
+    }
+    print(f"{'client':>6} {'regs':>5}" + "".join(f" {label:>8}" for label in metrics.values()))
+    rows = {(r["client"], r["registers"]): r for r in before["results"]}
+    for r in after["results"]:
+        old = rows.get((r["client"], r["registers"]))
+        if old is None:
+            continue
+        ratios = "".join(
+            f" {r[m] / old[m]:>7.2f}x" if old[m] else f" {'-':>8}" for m in metrics
+        )
+        print(f"{r['client']:>6} {r['registers']:>5}{ratios}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--alloc-requests", type=int, default=100)
+    parser.add_argument("--registers", type=int, nargs="+", default=BLOCK_SIZES)
+    parser.add_argument("--latency", type=float, default=0, help="dongle reply latency in ms")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    process, port = start_simulator(args.latency)
+    try:
+        results = []
+        for count in args.registers:
+            if ASYNC:
+                results.append(
+                    asyncio.run(bench_async(port, count, args.requests, args.alloc_requests))
+                )
+            else:
+                results.append(bench_sync(port, count, args.requests, args.alloc_requests))
+    finally:
+        process.terminate()
+        process.wait()
+
+    print_results(results)
+    if args.output:
+        report = {
+            "environment": environment(),
+            "parameters": {
+                "requests": args.requests,
+                "alloc_requests": args.alloc_requests,
+                "latency_ms": args.latency,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
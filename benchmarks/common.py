@@ -0,0 +1,70 @@
+"""Shared helpers for the benchmark scripts.
+
+The benchmarks import ``sungrow.py`` directly (the same way standalone users
+do) so they run without Home Assistant installed.  ``sungrow.py`` needs
+pymodbus 3.x while ``SungrowModbusTcpClient`` still uses the pymodbus 2.x
+socket hooks, so this module imports neither.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "sungrowmodbus"))
+sys.path.insert(0, ROOT)
+
+from Cryptodome.Cipher import AES  # noqa: E402
+
+PRIV_KEY = b"Grow#0*2Sun68CbE"
+HEADER = bytes([0x68, 0x68])
+PUB_KEY = bytes(range(0x30, 0x40))
+
+
+def session_key(pub_key: bytes = PUB_KEY, priv_key: bytes = PRIV_KEY) -> bytes:
+    """Derive the AES key the same way the clients do."""
+    return bytes(a ^ b for (a, b) in zip(pub_key, priv_key))
+
+
+def read_response(transaction_id: int, slave: int, count: int) -> bytes:
+    """Build a plain Modbus TCP read holding registers response."""
+    payload = bytes([0x03, count * 2]) + b"".join((i & 0xFFFF).to_bytes(2, "big") for i in range(count))
+    return (
+        transaction_id.to_bytes(2, "big")
+        + b"\x00\x00"
+        + (len(payload) + 1).to_bytes(2, "big")
+        + bytes([slave])
+        + payload
+    )
+
+
+def encrypt_frame(key: bytes, packet: bytes) -> bytes:
+    """Wrap a plain Modbus TCP frame the way the WiNet dongle does."""
+    length = len(packet)
+    padding = 16 - (length % 16)
+    plain = HEADER + packet[2:] + b"\xff" * padding
+    return bytes([1, 0, length, padding]) + AES.new(key, AES.MODE_ECB).encrypt(plain)
+
+
+def fragment(stream: bytes, size: int) -> list[bytes]:
+    """Split a byte stream into TCP-like segments of at most size bytes."""
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def measure(func, *args, repeat: int = 5):
+    """Run func repeatedly, return (best seconds, peak traced bytes).
+
+    CPython has no allocation counter, so allocation pressure is reported as
+    the tracemalloc peak of an extra, traced run; timing uses untraced runs.
+    """
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
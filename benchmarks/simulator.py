@@ -0,0 +1,308 @@
+"""Simulated WiNet dongle / inverter for benchmarks and offline testing.
+
+An asyncio Modbus TCP server speaking the Sungrow key handshake (GET_KEY) and
+the AES-ECB framing, serving holding and input registers from a register map.
+Latency, fragmentation of the replies and disconnects can be injected to
+exercise the clients the way a WiFi dongle does.
+
+    python benchmarks/simulator.py [--port 5020] [--latency MS] [--segment N]
+
+From code, ``await Simulator(...).start()`` inside a running loop, or
+``Simulator(...).start_in_thread()`` for the synchronous client.
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+
+from common import encrypt_frame, session_key, HEADER, PUB_KEY
+
+from Cryptodome.Cipher import AES
+
+GET_KEY_REQUEST = bytes([0xF7, 0x04, 0x0A, 0xE7, 0x00, 0x08])
+NO_CRYPTO = bytes(16)
+MAX_PACKET_SIZE = 255
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_ADDRESS = 0x02
+ILLEGAL_VALUE = 0x03
+
+
+class Simulator:
+    """Encrypted Modbus TCP server with injectable faults.
+
+    holding_registers and input_registers map register addresses to 16 bit
+    values; registers not in the map read as 0, or fail with an illegal
+    address exception if strict.  latency is the reply delay in seconds,
+    jitter adds up to that many seconds at random, accept_delay is the time
+    a new connection waits before it is served.  segment splits every
+    reply into writes of at most that many bytes, segment_delay seconds
+    apart.  drop_after closes a connection after that many requests.
+    reconnect_required ignores requests on the connection the key was
+    exchanged on, like some firmware does.  encrypted=False announces no
+    encryption and serves plain Modbus TCP.  invalid_frames counts frames
+    that are neither a plain key request nor a valid encrypted frame, e.g.
+    a request sent in the clear; the connection is dropped on them.
+    """
+
+    def __init__(
+        self,
+        holding_registers=None,
+        input_registers=None,
+        strict=False,
+        latency=0.0,
+        jitter=0.0,
+        accept_delay=0.0,
+        segment=None,
+        segment_delay=0.0,
+        drop_after=None,
+        reconnect_required=False,
+        encrypted=True,
+        pub_key=PUB_KEY,
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.holding_registers = dict(holding_registers or {})
+        self.input_registers = dict(input_registers or {})
+        self.strict = strict
+        self.latency = latency
+        self.jitter = jitter
+        self.accept_delay = accept_delay
+        self.segment = segment
+        self.segment_delay = segment_delay
+        self.drop_after = drop_after
+        self.reconnect_required = reconnect_required
+        self.encrypted = encrypted
+        self.pub_key = pub_key
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.key_requests = 0
+        self.requests = 0
+        self.invalid_frames = 0
+        self._server = None
+        self._loop = None
+        self._writers = set()
+
+    async def start(self):
+        """Listen on host:port, a port of 0 picks a free one."""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def start_in_thread(self):
+        """Run the server on its own loop in a daemon thread."""
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(self.start())
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        """Stop listening and drop every connection."""
+        if self._server is not None:
+            self._loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        self._server.close()
+        self._drop_all()
+
+    def disconnect(self):
+        """Drop every open connection, the server keeps listening."""
+        self._loop.call_soon_threadsafe(self._drop_all)
+
+    def rekey(self, pub_key):
+        """Hand out pub_key from now on, connections already open keep theirs."""
+        self.pub_key = pub_key
+
+    def _drop_all(self):
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        session = _Session(self, writer)
+        replies = asyncio.get_running_loop().create_task(session.send_replies())
+        try:
+            # WiFi round trips and the dongle accepting the connection
+            await asyncio.sleep(self.accept_delay)
+            while not writer.is_closing():
+                await session.receive(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            replies.cancel()
+            self._writers.discard(writer)
+            writer.close()
+
+    def process(self, pdu):
+        """Answer a request PDU (function code onwards) with a response PDU."""
+        function_code = pdu[0]
+        if function_code in (0x03, 0x04):
+            if function_code == 0x03:
+                registers = self.holding_registers
+            else:
+                registers = self.input_registers
+            address = int.from_bytes(pdu[1:3], "big")
+            count = int.from_bytes(pdu[3:5], "big")
+            if not 1 <= count <= 125:
+                return _exception(function_code, ILLEGAL_VALUE)
+            if address + count > 0x10000 or (
+                self.strict and any(a not in registers for a in range(address, address + count))
+            ):
+                return _exception(function_code, ILLEGAL_ADDRESS)
+            values = b"".join(
+                (registers.get(a, 0) & 0xFFFF).to_bytes(2, "big")
+                for a in range(address, address + count)
+            )
+            return bytes([function_code, count * 2]) + values
+        if function_code == 0x06:
+            address = int.from_bytes(pdu[1:3], "big")
+            if self.strict and address not in self.holding_registers:
+                return _exception(function_code, ILLEGAL_ADDRESS)
+            self.holding_registers[address] = int.from_bytes(pdu[3:5], "big")
+            return bytes(pdu[:5])
+        if function_code == 0x10:
+            address = int.from_bytes(pdu[1:3], "big")
+            count = int.from_bytes(pdu[3:5], "big")
+            if not 1 <= count <= 123 or pdu[5] != count * 2:
+                return _exception(function_code, ILLEGAL_VALUE)
+            if self.strict and any(
+                a not in self.holding_registers for a in range(address, address + count)
+            ):
+                return _exception(function_code, ILLEGAL_ADDRESS)
+            for i in range(count):
+                value = pdu[6 + 2 * i:8 + 2 * i]
+                self.holding_registers[address + i] = int.from_bytes(value, "big")
+            return bytes(pdu[:5])
+        return _exception(function_code, ILLEGAL_FUNCTION)
+
+
+class _Session:
+    """Protocol state of one client connection."""
+
+    def __init__(self, simulator, writer):
+        self.simulator = simulator
+        self.writer = writer
+        # clients holding a cached key skip GET_KEY
+        self.key = session_key(simulator.pub_key) if simulator.encrypted else None
+        self.aes = AES.new(self.key, AES.MODE_ECB) if self.key else None
+        self.key_exchanged = False
+        self.requests = 0
+        # the dongle answers in request order, jitter only shifts replies
+        self.replies = asyncio.Queue()
+
+    async def receive(self, reader):
+        header = await reader.readexactly(4)
+        if header[:2] == HEADER or self.aes is None:
+            # plain MBAP frame, GET_KEY or an unencrypted request
+            rest = await reader.readexactly(2)
+            body = await reader.readexactly(int.from_bytes(rest, "big"))
+            frame = header + rest + body
+            if body == GET_KEY_REQUEST:
+                self._send_key()
+            else:
+                self._request(frame, encrypted=False)
+            return
+        if header[:2] != b"\x01\x00" or header[3] > 16 or (header[2] + header[3]) % 16:
+            # not a crypto header, the dongle gives up on the connection
+            self.simulator.invalid_frames += 1
+            raise ConnectionError("invalid frame")
+        encrypted = await reader.readexactly(header[2] + header[3])
+        self._request(self.aes.decrypt(encrypted)[:header[2]], encrypted=True)
+
+    def _send_key(self):
+        simulator = self.simulator
+        simulator.key_requests += 1
+        pub_key = simulator.pub_key if simulator.encrypted else NO_CRYPTO
+        if simulator.encrypted:
+            self.key = session_key(pub_key)
+            self.aes = AES.new(self.key, AES.MODE_ECB)
+            self.key_exchanged = True
+        self._reply(HEADER + b"\x00\x00\x00\x13\xf7\x04\x10" + pub_key)
+
+    def _request(self, frame, encrypted):
+        simulator = self.simulator
+        if encrypted and frame[:2] != HEADER:
+            # wrong key, the dongle stays silent
+            return
+        if encrypted and self.key_exchanged and simulator.reconnect_required:
+            # firmware that only serves a new connection
+            return
+        simulator.requests += 1
+        self.requests += 1
+        pdu = simulator.process(frame[7:])
+        if encrypted and len(pdu) + 7 > MAX_PACKET_SIZE:
+            # the crypto header has a single length byte
+            pdu = _exception(pdu[0], ILLEGAL_VALUE)
+        response = frame[:4] + (len(pdu) + 1).to_bytes(2, "big") + frame[6:7] + pdu
+        if encrypted:
+            response = encrypt_frame(self.key, response)
+        drop = simulator.drop_after is not None and self.requests >= simulator.drop_after
+        self._reply(response, drop)
+
+    def _reply(self, data, drop=False):
+        simulator = self.simulator
+        loop = asyncio.get_running_loop()
+        due = loop.time() + simulator.latency + random.uniform(0, simulator.jitter)
+        self.replies.put_nowait((due, data, drop))
+
+    async def send_replies(self):
+        simulator = self.simulator
+        loop = asyncio.get_running_loop()
+        while True:
+            due, data, drop = await self.replies.get()
+            await asyncio.sleep(due - loop.time())
+            size = simulator.segment or len(data)
+            for start in range(0, len(data), size):
+                if start:
+                    await asyncio.sleep(simulator.segment_delay)
+                self.writer.write(data[start:start + size])
+                await self.writer.drain()
+            if drop:
+                self.writer.close()
+                return
+
+
+def _exception(function_code, code):
+    return bytes([function_code | 0x80, code])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--latency", type=float, default=0, help="reply latency in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra latency in ms")
+    parser.add_argument("--accept-delay", type=float, default=0, help="connection setup in ms")
+    parser.add_argument("--segment", type=int, help="split replies into segments of N bytes")
+    parser.add_argument("--segment-delay", type=float, default=0, help="ms between segments")
+    parser.add_argument("--drop-after", type=int, help="close connections after N requests")
+    parser.add_argument("--reconnect-required", action="store_true")
+    parser.add_argument("--plain", action="store_true", help="announce no encryption")
+    args = parser.parse_args()
+
+    simulator = Simulator(
+        # a recognisable pattern: every register holds its own address
+        holding_registers={a: a for a in range(0x10000)},
+        input_registers={a: a for a in range(0x10000)},
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        accept_delay=args.accept_delay / 1000,
+        segment=args.segment,
+        segment_delay=args.segment_delay / 1000,
+        drop_after=args.drop_after,
+        reconnect_required=args.reconnect_required,
+        encrypted=not args.plain,
+        host=args.host,
+        port=args.port,
+    )
+    await simulator.start()
+    print(f"simulated dongle on {simulator.host}:{simulator.port}", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -53,15 +53,31 @@ from .const import (
     CALL_TYPE_REGISTER_INPUT,
     CALL_TYPE_X_COILS,
     CALL_TYPE_X_REGISTER_HOLDINGS,
+    CONF_BLOCK_MAX_GAP,
+    CONF_BLOCK_MAX_SIZE,
+    CONF_BREAKER_BACKOFF,
+    CONF_BREAKER_MAX_BACKOFF,
+    CONF_BREAKER_THRESHOLD,
+    CONF_CACHE_MAX_AGE,
+    CONF_CHANGE_ONLY,
     CONF_DATA_TYPE,
+    CONF_DEADBAND,
+    CONF_DEADBAND_PERCENT,
     CONF_DEVICE_ADDRESS,
+    CONF_DIAGNOSTIC_SENSORS,
+    CONF_HEARTBEAT,
     CONF_INPUT_TYPE,
     CONF_MAX_VALUE,
     CONF_MIN_VALUE,
     CONF_MSG_WAIT,
+    CONF_MSG_WAIT_MAX,
     CONF_NAN_VALUE,
+    CONF_PIPELINE_DEPTH,
     CONF_PRECISION,
+    CONF_RECONNECT_POLICY,
+    CONF_REKEY_INTERVAL,
     CONF_SCALE,
+    CONF_SESSION_KEY_TTL,
     CONF_SLAVE_COUNT,
     CONF_STATE_OFF,
     CONF_STATE_ON,
@@ -73,8 +89,19 @@ from .const import (
     CONF_VIRTUAL_COUNT,
     CONF_WRITE_TYPE,
     CONF_ZERO_SUPPRESS,
+    DEFAULT_BLOCK_MAX_GAP,
+    DEFAULT_BLOCK_MAX_SIZE,
+    DEFAULT_BREAKER_BACKOFF,
+    DEFAULT_BREAKER_MAX_BACKOFF,
+    DEFAULT_BREAKER_THRESHOLD,
+    DEFAULT_HEARTBEAT,
     DEFAULT_HUB,
+    DEFAULT_MSG_WAIT_MAX,
+    DEFAULT_PIPELINE_DEPTH,
+    DEFAULT_RECONNECT_POLICY,
+    DEFAULT_REKEY_INTERVAL,
     DEFAULT_SCAN_INTERVAL,
+    DEFAULT_SESSION_KEY_TTL,
     MODBUS_DOMAIN as DOMAIN,
     DataType,
 )
@@ -99,6 +126,9 @@ BASE_COMPONENT_SCHEMA = vol.Schema(
         vol.Optional(
             CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL
         ): cv.positive_int,
+        vol.Optional(CONF_CACHE_MAX_AGE): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
         vol.Optional(CONF_UNIQUE_ID): cv.string,
     }
 )
@@ -198,6 +228,10 @@ SENSOR_SCHEMA = vol.All(
             vol.Optional(CONF_MAX_VALUE): vol.Coerce(float),
             vol.Optional(CONF_NAN_VALUE): nan_validator,
             vol.Optional(CONF_ZERO_SUPPRESS): cv.positive_float,
+            vol.Optional(CONF_CHANGE_ONLY, default=False): cv.boolean,
+            vol.Optional(CONF_DEADBAND, default=0): cv.positive_float,
+            vol.Optional(CONF_DEADBAND_PERCENT, default=0): cv.positive_float,
+            vol.Optional(CONF_HEARTBEAT, default=DEFAULT_HEARTBEAT): cv.positive_int,
         }
     ),
 )
@@ -223,7 +257,36 @@ MODBUS_SCHEMA = vol.Schema(
         vol.Optional(CONF_NAME, default=DEFAULT_HUB): cv.string,
         vol.Optional(CONF_TIMEOUT, default=3): cv.socket_timeout,
         vol.Optional(CONF_DELAY, default=0): cv.positive_int,
+        vol.Optional(CONF_DIAGNOSTIC_SENSORS, default=False): cv.boolean,
         vol.Optional(CONF_MSG_WAIT): cv.positive_int,
+        vol.Optional(CONF_MSG_WAIT_MAX, default=DEFAULT_MSG_WAIT_MAX): cv.positive_int,
+        vol.Optional(CONF_PIPELINE_DEPTH, default=DEFAULT_PIPELINE_DEPTH): vol.All(
+            cv.positive_int, vol.Range(min=1, max=16)
+        ),
+        vol.Optional(
+            CONF_SESSION_KEY_TTL, default=DEFAULT_SESSION_KEY_TTL
+        ): cv.positive_int,
+        vol.Optional(
+            CONF_REKEY_INTERVAL, default=DEFAULT_REKEY_INTERVAL
+        ): cv.positive_int,
+        vol.Optional(
+            CONF_RECONNECT_POLICY, default=DEFAULT_RECONNECT_POLICY
+        ): vol.In(["queue", "fail"]),
+        vol.Optional(CONF_BLOCK_MAX_GAP, default=DEFAULT_BLOCK_MAX_GAP): vol.All(
+            cv.positive_int, vol.Range(max=124)
+        ),
+        vol.Optional(CONF_BLOCK_MAX_SIZE, default=DEFAULT_BLOCK_MAX_SIZE): vol.All(
+            cv.positive_int, vol.Range(min=1, max=125)
+        ),
+        vol.Optional(
+            CONF_BREAKER_THRESHOLD, default=DEFAULT_BREAKER_THRESHOLD
+        ): vol.All(cv.positive_int, vol.Range(min=1)),
+        vol.Optional(CONF_BREAKER_BACKOFF, default=DEFAULT_BREAKER_BACKOFF): vol.All(
+            cv.positive_int, vol.Range(min=1)
+        ),
+        vol.Optional(
+            CONF_BREAKER_MAX_BACKOFF, default=DEFAULT_BREAKER_MAX_BACKOFF
+        ): cv.positive_int,
         vol.Optional(CONF_BINARY_SENSORS): vol.All(
             cv.ensure_list, [BINARY_SENSOR_SCHEMA]
         ),
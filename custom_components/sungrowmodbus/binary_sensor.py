@@ -31,6 +31,7 @@ from .const import (
 )
 from .entity import BasePlatform
 from .modbus import ModbusHub
+from .planner import ReadSpan
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -76,6 +77,13 @@ class ModbusBinarySensor(BasePlatform, RestoreEntity, BinarySensorEntity):
         self._coordinator: DataUpdateCoordinator[list[int] | None] | None = None
         self._result: list[int] = []
         super().__init__(hass, hub, entry)
+        self._read_span = ReadSpan(
+            self._slave,
+            self._input_type,
+            self._scan_interval,
+            self._address,
+            self._count,
+        )
 
     async def async_setup_slaves(
         self, hass: HomeAssistant, slave_count: int, entry: dict[str, Any]
@@ -99,16 +107,26 @@ class ModbusBinarySensor(BasePlatform, RestoreEntity, BinarySensorEntity):
 
     async def async_added_to_hass(self) -> None:
         """Handle entity which will be added."""
+        self.async_on_remove(self._hub.register_read(self._read_span))
         await self.async_base_added_to_hass()
         if state := await self.async_get_last_state():
             self._attr_is_on = state.state == STATE_ON
 
+    @callback
+    def async_hub_available(self, available: bool) -> None:
+        """Follow the device going offline or coming back."""
+        if not available:
+            self._result = []
+            if self._coordinator:
+                self._coordinator.async_set_updated_data(self._result)
+        super().async_hub_available(available)
+
     async def _async_update(self) -> None:
         """Update the state of the sensor."""
 
         # do not allow multiple active calls to the same platform
-        result = await self._hub.async_pb_call(
-            self._slave, self._address, self._count, self._input_type
+        result = await self._hub.async_pb_read(
+            self._read_span, self._cache_max_age
         )
         if result is None:
             self._attr_available = False
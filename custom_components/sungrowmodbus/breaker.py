@@ -0,0 +1,66 @@
+"""Stop polling a device that stopped answering, e.g. at night."""
+
+from __future__ import annotations
+
+import time
+
+
+class CircuitBreaker:
+    """Open after threshold consecutive failures, probe with backoff.
+
+    While open the hub sends no reads; it probes the device after backoff
+    seconds, doubling the wait after every failed probe up to max_backoff.
+    Any reply, an exception reply included, closes the breaker again.
+    """
+
+    def __init__(self, threshold: int, backoff: float, max_backoff: float) -> None:
+        """Initialize a closed breaker."""
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max(backoff, max_backoff)
+        self.failures = 0
+        self.retry_in = 0.0
+        self.opened_at: float | None = None
+        self.trips = 0
+
+    @property
+    def closed(self) -> bool:
+        """Whether requests go to the device."""
+        return self.opened_at is None
+
+    def success(self) -> bool:
+        """Account a reply, return True if this closed the breaker."""
+        self.failures = 0
+        if self.opened_at is None:
+            return False
+        self.opened_at = None
+        self.retry_in = 0.0
+        return True
+
+    def failure(self) -> float | None:
+        """Account a failed request, return the seconds to the next probe.
+
+        None while the breaker stays closed.
+        """
+        self.failures += 1
+        if self.opened_at is None:
+            if self.failures < self.threshold:
+                return None
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            self.retry_in = self.backoff
+        else:
+            self.retry_in = min(self.max_backoff, self.retry_in * 2)
+        return self.retry_in
+
+    def stats(self) -> dict[str, float | int | None]:
+        """State, failure count and backoff."""
+        return {
+            "closed": self.closed,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in": self.retry_in,
+            "open_for": (
+                None if self.opened_at is None else time.monotonic() - self.opened_at
+            ),
+        }
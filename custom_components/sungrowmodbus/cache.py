@@ -0,0 +1,124 @@
+"""Short lived cache of register reads with single-flight fetching."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import time
+
+CacheKey = tuple[int, str]
+
+
+class _Entry:
+    __slots__ = ("address", "fetched_at", "values")
+
+    def __init__(self, address: int, values: list, fetched_at: float) -> None:
+        self.address = address
+        self.values = values
+        self.fetched_at = fetched_at
+
+    @property
+    def end(self) -> int:
+        return self.address + len(self.values)
+
+
+class RegisterCache:
+    """Recent read results per slave and input type.
+
+    A read is answered from any cached range that covers it and is not
+    older than the caller's max_age, so a switch verify read is served by
+    the block a sensor read just before.  Identical reads in flight share
+    one fetch; writes invalidate the slave since a device may change any
+    register in response.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty cache."""
+        self._entries: dict[CacheKey, list[_Entry]] = {}
+        self._pending: dict[
+            tuple[int, str, int, int], asyncio.Future[list | None]
+        ] = {}
+        # bumped by invalidate, a read started before is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def get(
+        self, slave: int, use_call: str, address: int, count: int, max_age: float
+    ) -> list | None:
+        """Return the cached values of the range if fresh enough."""
+        now = time.monotonic()
+        for entry in self._entries.get((slave, use_call), ()):
+            if (
+                entry.address <= address
+                and address + count <= entry.end
+                and now - entry.fetched_at <= max_age
+            ):
+                if address == entry.address and count == len(entry.values):
+                    # the same list until the range is read again
+                    return entry.values
+                offset = address - entry.address
+                return entry.values[offset : offset + count]
+        return None
+
+    def put(self, slave: int, use_call: str, address: int, values: list) -> None:
+        """Store a read, dropping the entries it covers."""
+        new = _Entry(address, values, time.monotonic())
+        entries = self._entries.setdefault((slave, use_call), [])
+        entries[:] = [
+            entry
+            for entry in entries
+            if not (new.address <= entry.address and entry.end <= new.end)
+        ]
+        entries.append(new)
+
+    def invalidate(self, slave: int | None = None) -> None:
+        """Forget the reads of slave, or of every slave."""
+        self._generation += 1
+        if slave is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[0] == slave]:
+            del self._entries[key]
+
+    async def async_read(
+        self,
+        slave: int,
+        use_call: str,
+        address: int,
+        count: int,
+        max_age: float,
+        fetch: Callable[[], Awaitable[list | None]],
+    ) -> list | None:
+        """Return the range from the cache, a read in flight or fetch."""
+        if max_age > 0 and (
+            values := self.get(slave, use_call, address, count, max_age)
+        ) is not None:
+            self.hits += 1
+            return values
+        key = (slave, use_call, address, count)
+        if (pending := self._pending.get(key)) is not None:
+            self.shared += 1
+            return await asyncio.shield(pending)
+        self.misses += 1
+        pending = self._pending[key] = asyncio.get_running_loop().create_future()
+        values = None
+        generation = self._generation
+        try:
+            values = await fetch()
+            if values is not None and generation == self._generation:
+                self.put(slave, use_call, address, values)
+        finally:
+            del self._pending[key]
+            pending.set_result(values)
+        return values
+
+    def stats(self) -> dict[str, int]:
+        """Hit, miss and shared in-flight read counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "ranges": sum(len(entries) for entries in self._entries.values()),
+        }
@@ -11,20 +11,38 @@ from homeassistant.const import (
 )
 
 # configuration names
+CONF_BLOCK_MAX_GAP = "block_max_gap"
+CONF_BLOCK_MAX_SIZE = "block_max_size"
+CONF_BREAKER_BACKOFF = "offline_retry"
+CONF_BREAKER_MAX_BACKOFF = "offline_retry_max"
+CONF_BREAKER_THRESHOLD = "offline_after_failures"
 CONF_BYTESIZE = "bytesize"
+CONF_CACHE_MAX_AGE = "cache_max_age"
+CONF_CHANGE_ONLY = "change_only"
 CONF_BRIGHTNESS_REGISTER = "brightness_address"
 CONF_COLOR_TEMP_REGISTER = "color_temp_address"
 CONF_DATA_TYPE = "data_type"
+CONF_DEADBAND = "deadband"
+CONF_DEADBAND_PERCENT = "deadband_percent"
+CONF_DECODER = "decoder"
 CONF_DEVICE_ADDRESS = "device_address"
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+CONF_HEARTBEAT = "heartbeat"
 CONF_INPUT_TYPE = "input_type"
 CONF_MAX_TEMP = "max_temp"
 CONF_MAX_VALUE = "max_value"
 CONF_MIN_TEMP = "min_temp"
 CONF_MIN_VALUE = "min_value"
 CONF_MSG_WAIT = "message_wait_milliseconds"
+CONF_MSG_WAIT_MAX = "message_wait_max_milliseconds"
 CONF_NAN_VALUE = "nan_value"
+CONF_PIPELINE_DEPTH = "pipeline_depth"
 CONF_PRECISION = "precision"
+CONF_RECONNECT_POLICY = "reconnect_policy"
+CONF_REGISTER_MAP = "register_map"
+CONF_REKEY_INTERVAL = "rekey_interval"
 CONF_SCALE = "scale"
+CONF_SESSION_KEY_TTL = "session_key_ttl"
 CONF_SLAVE_COUNT = "slave_count"
 CONF_STATE_CLOSED = "state_closed"
 CONF_STATE_CLOSING = "state_closing"
@@ -90,15 +108,28 @@ CALL_TYPE_X_REGISTER_HOLDINGS = "holdings"
 SERVICE_WRITE_COIL = "write_coil"
 SERVICE_WRITE_REGISTER = "write_register"
 SERVICE_STOP = "stop"
+SERVICE_GET_METRICS = "get_metrics"
 SERVICE_RESTART = "restart"
 
 # dispatcher signals
+SIGNAL_AVAILABILITY = "sungrowmodbus.availability_{}"
 SIGNAL_STOP_ENTITY = "sungrowmodbus.stop"
 SIGNAL_START_ENTITY = "sungrowmodbus.start"
 
 # integration names
+DEFAULT_BLOCK_MAX_GAP = 0  # registers
+DEFAULT_BLOCK_MAX_SIZE = 100  # registers
+DEFAULT_BREAKER_BACKOFF = 30  # seconds
+DEFAULT_BREAKER_MAX_BACKOFF = 600  # seconds
+DEFAULT_BREAKER_THRESHOLD = 5  # failed requests
+DEFAULT_HEARTBEAT = 300  # seconds
 DEFAULT_HUB = "sungrowmodbus_hub"
+DEFAULT_MSG_WAIT_MAX = 1000  # milliseconds
+DEFAULT_PIPELINE_DEPTH = 1
+DEFAULT_RECONNECT_POLICY = "queue"
+DEFAULT_REKEY_INTERVAL = 0  # seconds, 0 = disabled
 DEFAULT_SCAN_INTERVAL = 15  # seconds
+DEFAULT_SESSION_KEY_TTL = 0  # seconds, 0 = disabled
 DEFAULT_SLAVE = 1
 DEFAULT_STRUCTURE_PREFIX = ">f"
 DEFAULT_TEMP_UNIT = "C"
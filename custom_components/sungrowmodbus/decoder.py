@@ -0,0 +1,490 @@
+"""Decode the registers of a read into typed values."""
+
+from __future__ import annotations
+
+import contextlib
+from collections.abc import Iterable
+from itertools import islice, repeat
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+NAN_STRING = b"nan\x00"
+
+
+# the arrays are rounded with the NumPy errors ignored, NaN and inf follow
+# the IEEE rules as in the scalar path
+
+
+def _round_ints(val: np.ndarray) -> list[int]:
+    """Round like round(value) does, value by value."""
+    if np.all(np.abs(val) < 2**52):
+        return np.rint(val).astype(np.int64).tolist()
+    return list(map(round, val.tolist()))
+
+
+def _round_floats(
+    val: np.ndarray, factor: float | np.ndarray, precision: Iterable[int]
+) -> list[float]:
+    """Round like round(value, precision) does for precision 1 to 15.
+
+    factor is 10 ** precision, both may be given value by value.
+    """
+    shifted = val * factor
+    values = (np.rint(shifted) / factor).tolist()
+    # round() rounds the exact decimal value, the shift may have moved
+    # values close to a tie across it; 2**52 and more, inf and NaN count
+    # as close too
+    distance = np.abs(shifted - np.floor(shifted) - 0.5)
+    inexact = ~(distance > np.abs(shifted) * 1e-15 + 1e-9)
+    if inexact.any():
+        precision = list(islice(precision, len(values)))
+        for i in np.flatnonzero(inexact).tolist():
+            values[i] = round(float(val[i]), precision[i])
+    return values
+
+
+class RegisterDecoder:
+    """Swap, unpack, scale and limit the registers of one sensor.
+
+    The registers hold slave_count + 1 slices of slave_size registers, each
+    swapped on its own.  decode returns a list of numbers, None where the
+    device reported NaN or nan_value, or the text of a string sensor;
+    formatting is left to the presentation.
+
+    The structure and the register layout are compiled once.  Every value
+    of the structure is one slave slice, so the swaps become the byte order
+    of the buffer and of the structure: registers packed little endian swap
+    the bytes, a little endian structure reverses the words of a value, and
+    both together cancel out the buffer order.  With NumPy installed, reads
+    of at least vector_min_values values of one data type are swapped,
+    scaled and limited as arrays; only the rounding stays with round() so
+    both paths return the same values.
+    """
+
+    vector_min_values = 64
+
+    def __init__(
+        self,
+        structure: str,
+        *,
+        slave_size: int,
+        slave_count: int = 0,
+        swap_bytes: bool = False,
+        swap_words: bool = False,
+        scale: float = 1,
+        offset: float = 0,
+        precision: int = 0,
+        min_value: float | None = None,
+        max_value: float | None = None,
+        zero_suppress: float | None = None,
+        nan_value: int | None = None,
+        string: bool = False,
+        none_as_zero: bool = False,
+    ) -> None:
+        """Initialize the decoder of a sensor configuration."""
+        self.structure = structure
+        self.slave_size = slave_size
+        self.slave_count = slave_count
+        self.swap_bytes = swap_bytes
+        self.swap_words = swap_words
+        self.scale = scale
+        self.offset = offset
+        self.precision = precision
+        self.min_value = min_value
+        self.max_value = max_value
+        self.zero_suppress = zero_suppress
+        self.nan_value = nan_value
+        self.string = string
+        # custom structures report a missing value as 0
+        self.none_as_zero = none_as_zero
+        # without limits, NaN handling or text every value is only scaled
+        self._scale_only = (
+            min_value is None
+            and max_value is None
+            and zero_suppress is None
+            and not nan_value
+            and not string
+            and not any(code in structure for code in "cdefps")
+        )
+        self._registers = registers = (slave_count + 1) * slave_size
+        # read the registers packed little endian, see decode_buffer
+        self.little_buffer = swap_bytes != swap_words
+        self._byte_order = "<" if swap_words else ">"
+        if swap_words:
+            structure = "<" + structure.lstrip("@=<>!")
+        self._struct = struct.Struct(structure)
+        # the values of the text "nan" sent instead of a 32 bit number
+        self._nan_raw: tuple | None = None
+        if registers == 2 and not string:
+            nan = NAN_STRING[::-1] if swap_words else NAN_STRING
+            with contextlib.suppress(struct.error):
+                self._nan_raw = self._struct.unpack(nan)
+        self._pack = struct.Struct(
+            f"{'<' if self.little_buffer else '>'}{registers}H"
+        ).pack
+        self._dtype = self._vector_dtype()
+
+    def _vector_dtype(self) -> np.dtype | None:
+        """Array type of the values if the read is decoded with NumPy."""
+        if (
+            np is None
+            or self.string
+            or self.none_as_zero
+            or self.slave_count + 1 < self.vector_min_values
+            # 64 bit integers do not fit the float64 the arrays are scaled
+            # in, while the scalar path keeps them exact
+            or self.structure[-1] in "qQ"
+        ):
+            return None
+        # struct_validator makes the structure >{count}{code}
+        return np.dtype(self._byte_order + self.structure[-1])
+
+    def _decode_vector(self, buffer: bytes, start: int) -> list[float | int | None]:
+        """Decode a read with array operations."""
+        raw = np.frombuffer(
+            buffer, dtype=self._dtype, count=self.slave_count + 1, offset=start
+        )
+        # NaN and inf follow the IEEE rules as in the scalar path
+        with np.errstate(all="ignore"):
+            if raw.dtype.kind == "f":
+                # compare with nan_value as python floats do
+                raw = raw.astype(np.float64)
+            missing = raw != raw  # noqa: PLR0124
+            if self.nan_value:
+                missing |= (raw == self.nan_value) | (raw == -self.nan_value)
+            val = raw.astype(np.float64) * self.scale + self.offset
+            if self.min_value is not None:
+                val = np.where(val < self.min_value, self.min_value, val)
+            if self.max_value is not None:
+                val = np.where(val > self.max_value, self.max_value, val)
+            zero = np.zeros(len(val), dtype=bool)
+            if self.zero_suppress is not None:
+                zero = np.abs(val) <= self.zero_suppress
+            val[missing | zero] = 0.0
+            values = self._round_vector(val)
+        for i in np.flatnonzero(zero).tolist():
+            values[i] = 0
+        for i in np.flatnonzero(missing).tolist():
+            values[i] = None
+        return values
+
+    def _round_vector(self, val: np.ndarray) -> list[float | int]:
+        """Round like round(value, precision) does, value by value."""
+        precision = self.precision
+        if precision == 0:
+            return _round_ints(val)
+        if precision > 15:
+            return list(map(round, val.tolist(), repeat(precision)))
+        return _round_floats(val, 10.0**precision, repeat(precision))
+
+    def value(self, raw: float | bytes) -> float | int | str | None:
+        """Scale and limit one unpacked value."""
+        if self.nan_value and raw in (self.nan_value, -self.nan_value):
+            return None
+        if isinstance(raw, bytes):
+            return raw.decode()
+        if raw != raw:  # noqa: PLR0124
+            # NaN float detection replace with None
+            return None
+        val: float | int = self.scale * raw + self.offset
+        if self.min_value is not None and val < self.min_value:
+            val = self.min_value
+        if self.max_value is not None and val > self.max_value:
+            val = self.max_value
+        if self.zero_suppress is not None and abs(val) <= self.zero_suppress:
+            return 0
+        if self.precision == 0:
+            return round(val)
+        return round(float(val), self.precision)
+
+    def decode(self, registers: list[int]) -> list[float | int | str | None] | None:
+        """Return the values of a read, None if it holds no value.
+
+        Raises struct.error if the registers do not match the structure.
+        """
+        return self.decode_buffer(self._pack(*registers), 0)
+
+    def decode_buffer(
+        self, buffer: bytes, start: int
+    ) -> list[float | int | str | None] | None:
+        """Decode the registers packed in buffer from byte start on.
+
+        The registers are packed big endian, or little endian if
+        little_buffer is set.
+        """
+        if self.string:
+            return [buffer[start : start + self._registers * 2].decode()]
+        if self._dtype is not None:
+            return self._decode_vector(buffer, start)
+        return self.values(self._struct.unpack_from(buffer, start))
+
+    def values(self, raw_values: tuple) -> list[float | int | None] | None:
+        """Scale and limit the unpacked values of a read."""
+        if raw_values == self._nan_raw:
+            return None
+        if self._scale_only:
+            scale, offset, precision = self.scale, self.offset, self.precision
+            if precision == 0:
+                return [round(scale * raw + offset) for raw in raw_values]
+            return [round(float(scale * raw + offset), precision) for raw in raw_values]
+        values = [self.value(raw) for raw in raw_values]
+        if self.none_as_zero and len(values) > 1:
+            return [0 if value is None else value for value in values]
+        return values
+
+
+# decoders of a block read with the byte offset of their registers
+BlockLayout = list[tuple[int, RegisterDecoder]]
+
+# the struct codes a block decodes as arrays, 64 bit integers stay exact
+# in the scalar path
+_VECTOR_CODES = frozenset("bBhHiIlLefd")
+
+
+class _VectorRun:
+    """Scale, limit and round the unpacked values of a block as arrays.
+
+    The sensor settings become arrays of one entry per value.  The values
+    are reordered so the sensors rounded to integers come first, which
+    rounds all values in two passes and hands every sensor a slice.
+    """
+
+    def __init__(self, members: list) -> None:
+        """Compile the settings of the members of a run."""
+        ints = [member for member in members if member[0].precision == 0]
+        floats = [member for member in members if member[0].precision]
+        order: list[int] = []
+        decoders: list[RegisterDecoder] = []
+        nan_raw: list[float] = []
+        # (decoder, first value, end value) in the reordered values
+        self._members: list[tuple[RegisterDecoder, int, int]] = []
+        for decoder, first, end, _ in ints + floats:
+            self._members.append((decoder, len(order), len(order) + end - first))
+            order.extend(range(first, end))
+            decoders.extend(repeat(decoder, end - first))
+            nan_raw.extend(decoder._nan_raw or repeat(float("nan"), end - first))
+        # None if the integers come first already
+        self._order = None if order == sorted(order) else np.array(order, dtype=np.intp)
+        self._ints = sum(end - first for _, first, end, _ in ints)
+
+        def setting(values: Iterable[float | None], default: float) -> np.ndarray | None:
+            """Array of a setting, None if no member uses it."""
+            values = list(values)
+            if all(value is None or value == default for value in values):
+                return None
+            return np.array(
+                [default if value is None else value for value in values],
+                dtype=np.float64,
+            )
+
+        inf = float("inf")
+        self._scale = setting((d.scale for d in decoders), 1.0)
+        # the offset also turns -0.0 into 0.0 as in the scalar path
+        self._offset = np.array([d.offset for d in decoders], dtype=np.float64)
+        self._min = setting((d.min_value for d in decoders), -inf)
+        self._max = setting((d.max_value for d in decoders), inf)
+        self._zero_suppress = setting((d.zero_suppress for d in decoders), -inf)
+        self._nan_value = setting(
+            (d.nan_value or None for d in decoders), float("nan")
+        )
+        self._floats = any(d.structure[-1] in "efd" for d in decoders)
+        self._precision = [d.precision for d in decoders[self._ints :]]
+        self._factor = 10.0 ** np.array(self._precision, dtype=np.float64)
+        # the members that recognize the text "nan" and where they start
+        self._nan_text = np.array(
+            [decoder._nan_raw is not None for decoder, _, _ in self._members]
+        )
+        self._nan_raw = np.array(nan_raw, dtype=np.float64)
+        self._starts = np.array([first for _, first, _ in self._members], dtype=np.intp)
+        if not self._nan_text.any():
+            self._nan_text = None
+
+    def decode(self, raw_values: tuple, decoded: dict) -> None:
+        """Add the values of the members to decoded."""
+        raw = np.array(raw_values, dtype=np.float64)
+        if self._order is not None:
+            raw = raw[self._order]
+        # NaN and inf follow the IEEE rules as in the scalar path
+        with np.errstate(all="ignore"):
+            missing = raw != raw if self._floats else None  # noqa: PLR0124
+            if self._nan_value is not None:
+                nan = (raw == self._nan_value) | (raw == -self._nan_value)
+                missing = nan if missing is None else missing | nan
+            val = (raw if self._scale is None else raw * self._scale) + self._offset
+            if self._min is not None:
+                val = np.where(val < self._min, self._min, val)
+            if self._max is not None:
+                val = np.where(val > self._max, self._max, val)
+            zero = None
+            if self._zero_suppress is not None:
+                zero = np.abs(val) <= self._zero_suppress
+            flagged = [
+                mask for mask in (zero, missing) if mask is not None and mask.any()
+            ]
+            if flagged:
+                val = val.copy()
+                for mask in flagged:
+                    val[mask] = 0.0
+            ints = self._ints
+            values = _round_ints(val[:ints]) if ints else []
+            if ints < len(val):
+                values += _round_floats(val[ints:], self._factor, self._precision)
+            text = None
+            if self._nan_text is not None and (hit := raw == self._nan_raw).any():
+                text = np.logical_and.reduceat(hit, self._starts) & self._nan_text
+        if flagged:
+            if zero is not None:
+                for i in np.flatnonzero(zero).tolist():
+                    values[i] = 0
+            if missing is not None:
+                for i in np.flatnonzero(missing).tolist():
+                    values[i] = None
+        for decoder, first, end in self._members:
+            decoded[decoder] = values[first:end]
+        if text is not None:
+            for i in np.flatnonzero(text).tolist():
+                decoded[self._members[i][0]] = None
+
+
+class BlockDecoder:
+    """Decode all sensors of a block read in one pass.
+
+    The sensors are compiled into one struct.Struct per buffer and byte
+    order, skipping the registers between them, so a read unpacks the
+    whole block with a few calls.  With NumPy installed, a struct of at
+    least vector_min_values numbers is scaled, limited and rounded as one
+    array and every sensor gets a slice of the result; smaller ones leave
+    the scaling to every sensor.  Sensors that overlap get another struct,
+    strings and NumPy decoded sensors decode from the buffer on their own.
+    A reply too short for a struct decodes the sensors of it that it holds
+    one by one.
+    """
+
+    vector_min_values = 16
+
+    def __init__(self, layout: BlockLayout) -> None:
+        """Compile the structs of a block layout."""
+        # (little buffer, struct, [(decoder, first value, end value, byte)],
+        # numbers only)
+        self._runs: list[tuple[bool, struct.Struct, list, bool]] = []
+        self._single: list[tuple[int, RegisterDecoder]] = []
+        runs: dict[tuple[bool, str, bool], list[list]] = {}
+        for start, decoder in sorted(layout, key=lambda item: item[0]):
+            fmt = decoder._struct.format
+            if decoder.string or decoder._dtype is not None or fmt[0] not in "<>!":
+                self._single.append((start, decoder))
+                continue
+            # a run is [end of last sensor, format, members, values]
+            vector = (
+                np is not None
+                and not decoder.none_as_zero
+                and decoder.precision <= 15
+                and decoder.structure[-1] in _VECTOR_CODES
+            )
+            group = runs.setdefault((decoder.little_buffer, fmt[0], vector), [])
+            run = next((run for run in group if run[0] <= start), None)
+            if run is None:
+                run = [0, fmt[0], [], 0]
+                group.append(run)
+            if start > run[0]:
+                run[1] += f"{start - run[0]}x"
+            count = len(decoder._struct.unpack_from(bytes(decoder._struct.size)))
+            run[1] += fmt[1:]
+            run[2].append((decoder, run[3], run[3] + count, start))
+            run[0] = start + decoder._struct.size
+            run[3] += count
+        # the values of the runs of numbers in one array, if worth it
+        vectored: list = []
+        for (little, _, vector), group in runs.items():
+            for _, fmt, members, _ in group:
+                compiled = struct.Struct(fmt)
+                if vector:
+                    offset = sum(end for _, _, end, _ in vectored[-1:])
+                    vectored.extend(
+                        (decoder, offset + first, offset + end, start)
+                        for decoder, first, end, start in members
+                    )
+                self._runs.append((little, compiled, members, vector))
+        # a block of one sensor skips the structs: (first, end register)
+        self._only: tuple[int, int, RegisterDecoder] | None = None
+        if len(layout) == 1:
+            start, decoder = layout[0]
+            self._only = (start // 2, start // 2 + decoder._registers, decoder)
+        # the byte orders the registers are packed in
+        self._buffers = {little for little, _, _, _ in self._runs} | {
+            decoder.little_buffer for _, decoder in self._single
+        }
+        self._packers: dict[tuple[bool, int], struct.Struct] = {}
+        self._vector: _VectorRun | None = None
+        self._vector_size = 0
+        if vectored and vectored[-1][2] >= self.vector_min_values:
+            self._vector = _VectorRun(vectored)
+            self._vector_size = max(
+                compiled.size for _, compiled, _, vector in self._runs if vector
+            )
+
+    def _packer(self, little: bool, count: int) -> struct.Struct:
+        """Struct packing count registers into a buffer."""
+        if (packer := self._packers.get((little, count))) is None:
+            packer = self._packers[little, count] = struct.Struct(
+                f"{'<' if little else '>'}{count}H"
+            )
+        return packer
+
+    def decode(self, registers: list[int]) -> dict[RegisterDecoder, list | None]:
+        """Return the values of every sensor, by decoder.
+
+        Sensors whose registers the reply does not hold completely, e.g. a
+        short reply, are left out.
+        """
+        if self._only is not None:
+            start, end, decoder = self._only
+            if end > len(registers):
+                return {}
+            if not self._single:
+                return {decoder: decoder.decode(registers[start:end])}
+            try:
+                return {decoder: decoder.decode(registers[start:end])}
+            except (struct.error, ValueError):
+                return {}
+        count = len(registers)
+        buffers = {
+            little: self._packer(little, count).pack(*registers)
+            for little in self._buffers
+        }
+        size = len(registers) * 2
+        decoded: dict[RegisterDecoder, list | None] = {}
+        # a reply too short for one of the runs decodes them one by one
+        vector = self._vector if self._vector_size <= size else None
+        numbers: tuple = ()
+        for little, compiled, members, vectored in self._runs:
+            if compiled.size <= size:
+                raw_values = compiled.unpack_from(buffers[little])
+                if vectored and vector is not None:
+                    numbers += raw_values
+                    continue
+                for decoder, first, end, _ in members:
+                    decoded[decoder] = decoder.values(raw_values[first:end])
+                continue
+            for decoder, _, _, start in members:
+                if start + decoder._struct.size <= size:
+                    decoded[decoder] = decoder.values(
+                        decoder._struct.unpack_from(buffers[little], start)
+                    )
+        for start, decoder in self._single:
+            if start + decoder._registers * 2 > size:
+                # a string would be cut off
+                continue
+            try:
+                decoded[decoder] = decoder.decode_buffer(
+                    buffers[decoder.little_buffer], start
+                )
+            except (struct.error, ValueError):
+                continue
+        if vector is not None:
+            vector.decode(numbers, decoded)
+        return decoded
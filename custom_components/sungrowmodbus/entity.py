@@ -5,7 +5,7 @@ from __future__ import annotations
 from abc import abstractmethod
 import asyncio
 from collections.abc import Callable
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 import struct
 from typing import Any, cast
@@ -18,10 +18,8 @@ from homeassistant.const import (
     CONF_DELAY,
     CONF_DEVICE_CLASS,
     CONF_NAME,
-    CONF_OFFSET,
     CONF_SCAN_INTERVAL,
     CONF_SLAVE,
-    CONF_STRUCTURE,
     CONF_UNIQUE_ID,
     STATE_OFF,
     STATE_ON,
@@ -29,7 +27,7 @@ from homeassistant.const import (
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import Entity, ToggleEntity
-from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.restore_state import RestoreEntity
 
 from .const import (
@@ -43,30 +41,30 @@ from .const import (
     CALL_TYPE_WRITE_REGISTERS,
     CALL_TYPE_X_COILS,
     CALL_TYPE_X_REGISTER_HOLDINGS,
+    CONF_CACHE_MAX_AGE,
     CONF_DATA_TYPE,
+    CONF_DECODER,
     CONF_DEVICE_ADDRESS,
     CONF_INPUT_TYPE,
     CONF_MAX_VALUE,
     CONF_MIN_VALUE,
     CONF_NAN_VALUE,
     CONF_PRECISION,
-    CONF_SCALE,
     CONF_SLAVE_COUNT,
     CONF_STATE_OFF,
     CONF_STATE_ON,
-    CONF_SWAP,
-    CONF_SWAP_BYTE,
-    CONF_SWAP_WORD,
-    CONF_SWAP_WORD_BYTE,
     CONF_VERIFY,
     CONF_VIRTUAL_COUNT,
     CONF_WRITE_TYPE,
     CONF_ZERO_SUPPRESS,
+    SIGNAL_AVAILABILITY,
     SIGNAL_START_ENTITY,
     SIGNAL_STOP_ENTITY,
-    DataType,
 )
+from .decoder import RegisterDecoder
 from .modbus import ModbusHub
+from .planner import ReadSpan
+from .request_queue import RequestPriority
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -92,6 +90,8 @@ class BasePlatform(Entity):
         self._address = int(entry[CONF_ADDRESS])
         self._input_type = entry[CONF_INPUT_TYPE]
         self._scan_interval = int(entry[CONF_SCAN_INTERVAL])
+        # by default a read of the current poll cycle is reused
+        self._cache_max_age = entry.get(CONF_CACHE_MAX_AGE, self._scan_interval / 2)
         self._cancel_timer: Callable[[], None] | None = None
         self._cancel_call: Callable[[], None] | None = None
 
@@ -131,6 +131,9 @@ class BasePlatform(Entity):
         self, now: datetime | None = None
     ) -> None:
         """Update the entity state if not already in progress."""
+        if not self._hub.available:
+            # the hub probes the device and signals when it is back
+            return
         if self._update_lock.locked():
             _LOGGER.debug("Update for entity %s is already in progress", self.name)
             return
@@ -142,10 +145,8 @@ class BasePlatform(Entity):
         self._async_cancel_update_polling()
         self._async_schedule_future_update(0.1)
         if self._scan_interval > 0:
-            self._cancel_timer = async_track_time_interval(
-                self.hass,
-                self._async_update_if_not_in_progress,
-                timedelta(seconds=self._scan_interval),
+            self._cancel_timer = self._hub.scheduler.add(
+                self._scan_interval, self._async_update_if_not_in_progress
             )
         self._attr_available = True
         self.async_write_ha_state()
@@ -188,6 +189,23 @@ class BasePlatform(Entity):
         self.async_on_remove(
             async_dispatcher_connect(self.hass, SIGNAL_START_ENTITY, self.async_run)
         )
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_AVAILABILITY.format(self._hub.name),
+                self.async_hub_available,
+            )
+        )
+
+    @callback
+    def async_hub_available(self, available: bool) -> None:
+        """Follow the device going offline or coming back."""
+        if available:
+            self._async_schedule_future_update(0.1)
+            return
+        self._async_cancel_future_pending_update()
+        self._attr_available = False
+        self.async_write_ha_state()
 
 
 class BaseStructPlatform(BasePlatform, RestoreEntity):
@@ -196,103 +214,26 @@ class BaseStructPlatform(BasePlatform, RestoreEntity):
     def __init__(self, hass: HomeAssistant, hub: ModbusHub, config: dict) -> None:
         """Initialize the switch."""
         super().__init__(hass, hub, config)
-        self._swap = config[CONF_SWAP]
         self._data_type = config[CONF_DATA_TYPE]
-        self._structure: str = config[CONF_STRUCTURE]
-        self._scale = config[CONF_SCALE]
-        self._offset = config[CONF_OFFSET]
         self._slave_count = config.get(CONF_SLAVE_COUNT) or config.get(
             CONF_VIRTUAL_COUNT, 0
         )
         self._slave_size = self._count = config[CONF_COUNT]
-        self._value_is_int: bool = self._data_type in (
-            DataType.INT16,
-            DataType.INT32,
-            DataType.INT64,
-            DataType.UINT16,
-            DataType.UINT32,
-            DataType.UINT64,
-        )
-        if not self._value_is_int:
-            self._precision = config.get(CONF_PRECISION, 2)
-        else:
-            self._precision = config.get(CONF_PRECISION, 0)
-            if self._precision > 0 or self._scale != int(self._scale):
-                self._value_is_int = False
-
-    def _swap_registers(self, registers: list[int], slave_count: int) -> list[int]:
-        """Do swap as needed."""
-        if slave_count:
-            swapped = []
-            for i in range(self._slave_count + 1):
-                inx = i * self._slave_size
-                inx2 = inx + self._slave_size
-                swapped.extend(self._swap_registers(registers[inx:inx2], 0))
-            return swapped
-        if self._swap in (CONF_SWAP_BYTE, CONF_SWAP_WORD_BYTE):
-            # convert [12][34] --> [21][43]
-            for i, register in enumerate(registers):
-                registers[i] = int.from_bytes(
-                    register.to_bytes(2, byteorder="little"),
-                    byteorder="big",
-                    signed=False,
-                )
-        if self._swap in (CONF_SWAP_WORD, CONF_SWAP_WORD_BYTE):
-            # convert [12][34] ==> [34][12]
-            registers.reverse()
-        return registers
-
-    def __process_raw_value(self, entry: float | str | bytes) -> str | None:
-        """Process value from sensor with NaN handling, scaling, offset, min/max etc."""
-        if self._nan_value and entry in (self._nan_value, -self._nan_value):
-            return None
-        if isinstance(entry, bytes):
-            return entry.decode()
-        if entry != entry:  # noqa: PLR0124
-            # NaN float detection replace with None
-            return None
-        val: float | int = self._scale * entry + self._offset
-        if self._min_value is not None and val < self._min_value:
-            val = self._min_value
-        if self._max_value is not None and val > self._max_value:
-            val = self._max_value
-        if self._zero_suppress is not None and abs(val) <= self._zero_suppress:
-            return "0"
-        if self._precision == 0:
-            return str(round(val))
-        return f"{float(val):.{self._precision}f}"
-
-    def unpack_structure_result(self, registers: list[int]) -> str | None:
-        """Convert registers to proper result."""
-
-        if self._swap:
-            registers = self._swap_registers(registers, self._slave_count)
-        byte_string = b"".join([x.to_bytes(2, byteorder="big") for x in registers])
-        if self._data_type == DataType.STRING:
-            return byte_string.decode()
-        if byte_string == b"nan\x00":
-            return None
-
+        self._precision = config[CONF_PRECISION]
+        # compiled by struct_validator
+        self._decoder: RegisterDecoder = config[CONF_DECODER]
+
+    def unpack_structure_result(
+        self, registers: list[int]
+    ) -> list[float | int | str | None] | None:
+        """Convert registers to typed values, None if there is no value."""
         try:
-            val = struct.unpack(self._structure, byte_string)
+            return self._decoder.decode(registers)
         except struct.error as err:
             recv_size = len(registers) * 2
             msg = f"Received {recv_size} bytes, unpack error {err}"
             _LOGGER.error(msg)
             return None
-        if len(val) > 1:
-            # Apply scale, precision, limits to floats and ints
-            v_result = []
-            for entry in val:
-                v_temp = self.__process_raw_value(entry)
-                if self._data_type != DataType.CUSTOM:
-                    v_result.append(str(v_temp))
-                else:
-                    v_result.append(str(v_temp) if v_temp is not None else "0")
-            return ",".join(map(str, v_result))
-
-        # Apply scale, precision, limits to floats and ints
-        return self.__process_raw_value(val[0])
 
 
 class BaseSwitch(BasePlatform, ToggleEntity, RestoreEntity):
@@ -341,6 +282,15 @@ class BaseSwitch(BasePlatform, ToggleEntity, RestoreEntity):
             self._state_off = config[CONF_VERIFY].get(
                 CONF_STATE_OFF, [self._command_off]
             )
+            # not registered for blocks, it is served by a cached block
+            # covering it or read alone
+            self._verify_span = ReadSpan(
+                self._slave,
+                self._verify_type,
+                self._scan_interval,
+                self._verify_address,
+                1,
+            )
         else:
             self._verify_active = False
 
@@ -389,8 +339,8 @@ class BaseSwitch(BasePlatform, ToggleEntity, RestoreEntity):
             return
 
         # do not allow multiple active calls to the same platform
-        result = await self._hub.async_pb_call(
-            self._slave, self._verify_address, 1, self._verify_type
+        result = await self._hub.async_pb_read(
+            self._verify_span, self._cache_max_age, RequestPriority.VERIFY
         )
         if result is None:
             self._attr_available = False
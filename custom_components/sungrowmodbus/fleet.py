@@ -0,0 +1,479 @@
+"""Poll a fleet of inverters outside Home Assistant.
+
+Reads the sungrowmodbus: section of a configuration.yaml, or a YAML list of
+hubs in the same form (!include, !secret and !env_var are resolved), and
+polls the sensors of every hub: each sensor is compiled with the rules of
+struct_validator in validators.py and the sensors of a hub are read in
+blocks as the integration plans them (block_max_gap, block_max_size) and
+decoded in one pass.  Binary sensors and switches are not polled.
+
+All hubs share one event loop.  Every hub keeps one encrypted session and
+reads its blocks one after the other, waiting the adaptive gap of its
+PacingController (message_wait_milliseconds is the floor) between a reply
+and its next request; at most --concurrency requests and connects are in
+flight across the fleet.  The first polls are spread over the shortest
+scan_interval so hundreds of hubs do not poll in step.  Samples stream to
+stdout as text, CSV or InfluxDB line protocol, logging goes to stderr.
+
+Standalone, next to sungrow.py, decoder.py, planner.py and pacing.py (no
+Home Assistant needed, PyYAML is):
+
+    python fleet.py fleet.yaml [--format text|csv|line] [--concurrency 64] [--once]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Iterable
+import csv
+from datetime import datetime, timezone
+import logging
+import math
+import os
+import random
+import signal
+import sys
+import time
+from typing import Any
+
+from pymodbus.exceptions import ModbusException, ModbusIOException
+import yaml
+
+from decoder import BlockDecoder, RegisterDecoder
+from pacing import PacingController
+from planner import ReadBlock, ReadSpan, plan_blocks
+from sensor_format import INTEGER_TYPES, sensor_structure
+from sungrow import (
+    BUSY_EXCEPTIONS,
+    RECONNECT_FAIL,
+    AsyncSungrowModbusTcpClient,
+    SessionKeyCache,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "sungrowmodbus"
+DEFAULT_HUB = "sungrowmodbus_hub"
+DEFAULT_SCAN_INTERVAL = 15
+DEFAULT_BLOCK_MAX_GAP = 0
+DEFAULT_BLOCK_MAX_SIZE = 100
+DEFAULT_MSG_WAIT_MAX = 1000
+
+READ_CALLS = {
+    "holding": "read_holding_registers",
+    "input": "read_input_registers",
+}
+
+
+class _Loader(yaml.SafeLoader):
+    """Safe loader resolving the tags Home Assistant adds to YAML."""
+
+
+def _relative(loader: _Loader, path: str) -> str:
+    return os.path.join(os.path.dirname(loader.name), path)
+
+
+def _include(loader: _Loader, node: yaml.Node) -> Any:
+    return load_yaml(_relative(loader, loader.construct_scalar(node)))
+
+
+def _secret(loader: _Loader, node: yaml.Node) -> Any:
+    key = loader.construct_scalar(node)
+    secrets = load_yaml(_relative(loader, "secrets.yaml")) or {}
+    if key not in secrets:
+        raise ValueError(f"secret {key} not found in secrets.yaml")
+    return secrets[key]
+
+
+def _env_var(loader: _Loader, node: yaml.Node) -> Any:
+    name, *default = loader.construct_scalar(node).split(None, 1)
+    if name not in os.environ and not default:
+        raise ValueError(f"environment variable {name} not set")
+    return os.environ.get(name, default[0] if default else None)
+
+
+_Loader.add_constructor("!include", _include)
+_Loader.add_constructor("!secret", _secret)
+_Loader.add_constructor("!env_var", _env_var)
+
+
+def load_yaml(path: str) -> Any:
+    """Load a YAML file of a Home Assistant configuration."""
+    with open(path, encoding="utf-8") as stream:
+        return yaml.load(stream, _Loader)  # noqa: S506
+
+
+def _number(value: Any) -> int:
+    """nan_value as an int, a hex string or a decimal string."""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return int(value, 16)
+
+
+def compile_sensor(sensor: dict[str, Any]) -> tuple[ReadSpan, RegisterDecoder]:
+    """Return the read and the decoder of a sensor configuration.
+
+    Raises ValueError for a configuration struct_validator rejects.
+    """
+    name = sensor["name"]
+    data_type = sensor.get("data_type", "int16")
+    if data_type == "int":
+        data_type = "int16"
+    slave_count = sensor.get("slave_count", sensor.get("virtual_count"))
+    swap = sensor.get("swap")
+    structure, count = sensor_structure(
+        name,
+        data_type,
+        sensor.get("count"),
+        sensor.get("structure"),
+        slave_count,
+        swap,
+    )
+    slave_count = slave_count or 0
+    precision = sensor.get("precision", 0 if data_type in INTEGER_TYPES else 2)
+    nan_value = sensor.get("nan_value")
+    min_value = sensor.get("min_value")
+    max_value = sensor.get("max_value")
+    zero_suppress = sensor.get("zero_suppress")
+    decoder = RegisterDecoder(
+        structure,
+        slave_size=count,
+        slave_count=slave_count,
+        swap_bytes=swap in ("byte", "word_byte"),
+        swap_words=swap in ("word", "word_byte"),
+        scale=float(sensor.get("scale", 1)),
+        offset=float(sensor.get("offset", 0)),
+        precision=precision,
+        min_value=None if min_value is None else float(min_value),
+        max_value=None if max_value is None else float(max_value),
+        zero_suppress=None if zero_suppress is None else float(zero_suppress),
+        nan_value=None if nan_value is None else _number(nan_value),
+        string=data_type == "string",
+        none_as_zero=data_type == "custom",
+    )
+
+    input_type = sensor.get("input_type", "holding")
+    if input_type not in READ_CALLS:
+        raise ValueError(f"{name}: `input_type: {input_type}` is not polled")
+    slave = sensor.get("slave", sensor.get("device_address", 1))
+    span = ReadSpan(
+        slave,
+        input_type,
+        int(sensor.get("scan_interval", DEFAULT_SCAN_INTERVAL)),
+        int(sensor["address"]),
+        count * (slave_count + 1),
+    )
+    return span, decoder
+
+
+class FleetHub:
+    """One inverter, its session and its compiled block reads."""
+
+    def __init__(self, config: dict[str, Any], timeout: float) -> None:
+        """Compile the sensors of a hub configuration."""
+        self.name: str = config["name"]
+        self.host: str = config["host"]
+        self.port: int = int(config["port"])
+        entries: dict[ReadSpan, list[tuple[RegisterDecoder, list[str]]]] = {}
+        for sensor in config.get("sensors") or ():
+            span, decoder = compile_sensor(sensor)
+            # value i of a sensor with slaves is its slave sensor i - 1
+            labels = [sensor["name"]] + [
+                f"{sensor['name']} {idx}" for idx in range(decoder.slave_count)
+            ]
+            entries.setdefault(span, []).append((decoder, labels))
+        # (block, its decoder, labels of the values by decoder)
+        self.blocks: list[tuple[ReadBlock, BlockDecoder, list]] = []
+        for block in plan_blocks(
+            entries,
+            config.get("block_max_gap", DEFAULT_BLOCK_MAX_GAP),
+            config.get("block_max_size", DEFAULT_BLOCK_MAX_SIZE),
+        ):
+            members = [entry for span in block.spans for entry in entries[span]]
+            layout = [
+                (block.offset(span) * 2, decoder)
+                for span in block.spans
+                for decoder, _ in entries[span]
+            ]
+            self.blocks.append((block, BlockDecoder(layout), members))
+        key_ttl = config.get("session_key_ttl", 0)
+        # a hub that is offline fails its reads at once instead of taking
+        # a slot of the fleet while the client reconnects in the background
+        self.client = AsyncSungrowModbusTcpClient(
+            host=self.host,
+            port=self.port,
+            timeout=config.get("timeout", timeout),
+            pipeline_depth=1,
+            key_cache=SessionKeyCache(ttl=key_ttl) if key_ttl else None,
+            reconnect_policy=RECONNECT_FAIL,
+        )
+        self.pacing = PacingController(
+            self.name,
+            config.get("message_wait_milliseconds", 0) / 1000,
+            config.get("message_wait_max_milliseconds", DEFAULT_MSG_WAIT_MAX) / 1000,
+        )
+        self.next_send = 0.0
+        self.reads = 0
+        self.failures = 0
+        self.skipped = 0
+        self.samples = 0
+
+
+def load_fleet(path: str, timeout: float = 3) -> list[FleetHub]:
+    """Compile the hubs of a configuration.yaml or a list of hubs."""
+    config = load_yaml(path)
+    if isinstance(config, dict) and DOMAIN in config:
+        config = config[DOMAIN]
+    if isinstance(config, dict):
+        config = [config]
+    if not isinstance(config, list):
+        raise ValueError(f"{path}: neither a list of hubs nor a {DOMAIN}: section")
+    hubs: list[FleetHub] = []
+    names: set[str] = set()
+    hosts: set[str] = set()
+    for inx, hub in enumerate(config):
+        if "host" not in hub or "port" not in hub:
+            raise ValueError(f"{path}: hub {inx + 1} needs host and port")
+        hub.setdefault("name", DEFAULT_HUB if not inx else f"{DEFAULT_HUB}_{inx}")
+        host = f"{hub['host']}_{hub['port']}"
+        if hub["name"] in names or host in hosts:
+            raise ValueError(f"Modbus {hub['name']} host/port {host} is duplicate")
+        names.add(hub["name"])
+        hosts.add(host)
+        hubs.append(FleetHub(hub, timeout))
+    return hubs
+
+
+# one poll result: hub name, time in nanoseconds, (label, value) pairs
+Samples = list[tuple[str, Any]]
+
+
+class SampleWriter:
+    """Write samples to a stream, flushing once per loop iteration."""
+
+    def __init__(self, stream) -> None:
+        """Write to stream, e.g. sys.stdout."""
+        self.stream = stream
+        self._flush: asyncio.Handle | None = None
+
+    def write(self, hub: str, timestamp: int, samples: Samples) -> None:
+        """Write the samples of one block read."""
+        self._write(hub, timestamp, samples)
+        if self._flush is None:
+            self._flush = asyncio.get_running_loop().call_soon(self.flush)
+
+    def _write(self, hub: str, timestamp: int, samples: Samples) -> None:
+        moment = datetime.fromtimestamp(timestamp / 1e9, timezone.utc)
+        prefix = f"{moment.isoformat(timespec='milliseconds')} {hub} "
+        self.stream.write("".join(f"{prefix}{label}: {value}\n" for label, value in samples))
+
+    def flush(self) -> None:
+        """Flush the stream."""
+        self._flush = None
+        self.stream.flush()
+
+
+class CsvWriter(SampleWriter):
+    """time,hub,sensor,value rows after a header."""
+
+    def __init__(self, stream) -> None:
+        """Write the header."""
+        super().__init__(stream)
+        self._csv = csv.writer(stream, lineterminator="\n")
+        self._csv.writerow(("time", "hub", "sensor", "value"))
+
+    def _write(self, hub: str, timestamp: int, samples: Samples) -> None:
+        moment = datetime.fromtimestamp(timestamp / 1e9, timezone.utc)
+        moment_text = moment.isoformat(timespec="milliseconds")
+        self._csv.writerows((moment_text, hub, label, value) for label, value in samples)
+
+
+def _escape(text: str, special: str = ", =") -> str:
+    for char in "\\" + special:
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+class LineProtocolWriter(SampleWriter):
+    """One InfluxDB line protocol point per block read, tagged with the hub.
+
+    Numbers are written as floats, a sensor that rounds to an integer may
+    report a float on another read, e.g. after zero_suppress.  Line
+    protocol has no inf or NaN, such a value is left out and a read left
+    without values writes no point.
+    """
+
+    measurement = "sungrow"
+
+    def _write(self, hub: str, timestamp: int, samples: Samples) -> None:
+        fields = ",".join(
+            f"{_escape(label)}="
+            + (f'"{_escape(value, chr(34))}"' if isinstance(value, str) else str(value))
+            for label, value in samples
+            if isinstance(value, str) or math.isfinite(value)
+        )
+        if not fields:
+            return
+        self.stream.write(
+            f"{_escape(self.measurement, ', ')},hub={_escape(hub)} {fields} {timestamp}\n"
+        )
+
+
+FORMATS: dict[str, type[SampleWriter]] = {
+    "text": SampleWriter,
+    "csv": CsvWriter,
+    "line": LineProtocolWriter,
+}
+
+
+class FleetPoller:
+    """Poll the hubs of a fleet with a global cap on requests in flight."""
+
+    def __init__(
+        self, hubs: Iterable[FleetHub], writer: SampleWriter, concurrency: int = 64
+    ) -> None:
+        """Initialize without sessions."""
+        self.hubs = list(hubs)
+        self.writer = writer
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def run(self, once: bool = False) -> None:
+        """Connect and poll every hub until cancelled, or each block once."""
+        try:
+            await asyncio.gather(*(self._run_hub(hub, once) for hub in self.hubs))
+        finally:
+            for hub in self.hubs:
+                hub.client.close()
+
+    def stats(self) -> dict[str, int]:
+        """Reads, failed and skipped reads, samples of the fleet."""
+        return {
+            "hubs": len(self.hubs),
+            "reads": sum(hub.reads for hub in self.hubs),
+            "failures": sum(hub.failures for hub in self.hubs),
+            "skipped": sum(hub.skipped for hub in self.hubs),
+            "samples": sum(hub.samples for hub in self.hubs),
+        }
+
+    async def _run_hub(self, hub: FleetHub, once: bool) -> None:
+        loop = asyncio.get_running_loop()
+        # a failed connect is retried by the client in the background
+        async with self._slots:
+            await hub.client.connect()
+        if once:
+            for block in hub.blocks:
+                await self._read(hub, *block)
+            return
+        intervals: dict[int, list] = {}
+        for block in hub.blocks:
+            intervals.setdefault(block[0].scan_interval, []).append(block)
+        if not intervals:
+            return
+        start = loop.time() + random.uniform(0, min(intervals))
+        due = dict.fromkeys(intervals, start)
+        while True:
+            interval = min(due, key=due.__getitem__)
+            if (wait := due[interval] - loop.time()) > 0:
+                await asyncio.sleep(wait)
+            for block in intervals[interval]:
+                await self._read(hub, *block)
+            due[interval] += interval
+            if due[interval] < loop.time():
+                # a cycle took longer than the interval, skip the missed ones
+                due[interval] = loop.time() + interval
+
+    async def _read(
+        self, hub: FleetHub, block: ReadBlock, decoder: BlockDecoder, members: list
+    ) -> None:
+        if not hub.client.connected:
+            hub.skipped += 1
+            return
+        loop = asyncio.get_running_loop()
+        if (wait := hub.next_send - loop.time()) > 0:
+            # give the dongle the current gap since the last reply
+            await asyncio.sleep(wait)
+        call = getattr(hub.client, READ_CALLS[block.use_call])
+        hub.reads += 1
+        async with self._slots:
+            start = loop.time()
+            try:
+                result = await call(block.address, count=block.count, device_id=block.slave)
+            except ModbusException as exception_error:
+                result = None
+                if isinstance(exception_error, ModbusIOException):
+                    hub.pacing.timeout()
+                _LOGGER.debug("%s: read of %r failed: %s", hub.name, block, exception_error)
+            latency = loop.time() - start
+        if result is not None and result.isError():
+            if getattr(result, "exception_code", None) in BUSY_EXCEPTIONS:
+                hub.pacing.error_reply()
+            else:
+                hub.pacing.response(latency)
+            _LOGGER.debug("%s: read of %r failed: %s", hub.name, block, result)
+            result = None
+        elif result is not None:
+            hub.pacing.response(latency)
+        hub.next_send = loop.time() + hub.pacing.gap
+        if result is None:
+            hub.failures += 1
+            return
+        decoded = decoder.decode(result.registers)
+        samples = [
+            (label, value)
+            for sensor, labels in members
+            if (values := decoded.get(sensor)) is not None
+            for label, value in zip(labels, values)
+            if value is not None
+        ]
+        if samples:
+            hub.samples += len(samples)
+            self.writer.write(hub.name, time.time_ns(), samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", help="configuration.yaml or a YAML list of hubs")
+    parser.add_argument("--format", choices=FORMATS, default="text")
+    parser.add_argument(
+        "--concurrency", type=int, default=64, help="requests in flight across the fleet"
+    )
+    parser.add_argument("--timeout", type=float, default=3, help="unless set by the hub")
+    parser.add_argument("--measurement", default="sungrow", help="line protocol measurement")
+    parser.add_argument("--once", action="store_true", help="read every block once and exit")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    try:
+        hubs = load_fleet(args.config, args.timeout)
+    except (OSError, ValueError, KeyError, yaml.YAMLError) as err:
+        parser.error(str(err))
+    writer = FORMATS[args.format](sys.stdout)
+    if isinstance(writer, LineProtocolWriter):
+        writer.measurement = args.measurement
+    poller = FleetPoller(hubs, writer, args.concurrency)
+    _LOGGER.info(
+        "polling %s blocks of %s hubs",
+        sum(len(hub.blocks) for hub in hubs),
+        len(hubs),
+    )
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        await poller.run(args.once)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        writer.flush()
+        _LOGGER.info("%s", poller.stats())
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,287 @@
+"""Plain Modbus TCP gateway sharing one encrypted WiNet session.
+
+WiNet dongles accept only a few connections at a time.  The gateway keeps
+one AsyncSungrowModbusTcpClient session to the dongle and serves any number
+of local Modbus TCP clients without encryption: every client keeps its own
+transaction ids, the upstream client numbers the requests of the session
+itself and the reply goes back with the id the client sent.  Identical
+reads in flight are sent to the dongle once, and a read is answered from
+a read of the same or a covering range at most cache_max_age seconds old;
+a write drops the cached reads of its slave.
+
+Standalone, next to sungrow.py and cache.py (no Home Assistant needed):
+
+    python gateway.py --host 192.168.1.10 [--listen-port 5020] [--cache-max-age 1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import struct
+
+from pymodbus.exceptions import ModbusException
+
+from cache import RegisterCache
+from sungrow import AsyncSungrowModbusTcpClient
+
+_LOGGER = logging.getLogger(__name__)
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_VALUE = 0x03
+GATEWAY_NO_RESPONSE = 0x0B
+
+# function code: (read call, cache key, largest count)
+READS = {
+    0x01: ("read_coils", "coil", 2000),
+    0x02: ("read_discrete_inputs", "discrete", 2000),
+    0x03: ("read_holding_registers", "holding", 125),
+    0x04: ("read_input_registers", "input", 125),
+}
+
+
+def _exception(function_code: int, code: int) -> bytes:
+    return bytes([function_code | 0x80, code])
+
+
+def _pack_bits(bits: list[bool]) -> bytes:
+    data = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            data[i // 8] |= 1 << (i % 8)
+    return bytes(data)
+
+
+def _unpack_bits(data: bytes, count: int) -> list[bool]:
+    return [bool(data[i // 8] >> (i % 8) & 1) for i in range(count)]
+
+
+class ModbusGateway:
+    """Serve local Modbus TCP clients from one upstream client."""
+
+    def __init__(
+        self, client: AsyncSungrowModbusTcpClient, cache_max_age: float = 1.0
+    ) -> None:
+        """Initialize a gateway in front of a connected client."""
+        self.client = client
+        self.cache_max_age = cache_max_age
+        self.cache = RegisterCache()
+        # reads in flight by slave, function, address and count
+        self._pending: dict[tuple[int, int, int, int], asyncio.Task[bytes]] = {}
+        self._server: asyncio.Server | None = None
+        # bumped by every write, a read started before is not cached
+        self._writes = 0
+        self.clients = 0
+        self.requests = 0
+        self.upstream_requests = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 5020) -> asyncio.Server:
+        """Listen on host:port, a port of 0 picks a free one."""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server
+
+    def stats(self) -> dict[str, int]:
+        """Clients, requests and upstream requests, cache counters."""
+        return {
+            "clients": self.clients,
+            "requests": self.requests,
+            "upstream_requests": self.upstream_requests,
+            **self.cache.stats(),
+        }
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.clients += 1
+        replies: set[asyncio.Task[None]] = set()
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                _tid, protocol, length, unit = struct.unpack(">HHHB", header)
+                if protocol or not 2 <= length <= 254:
+                    # not Modbus TCP, the stream cannot be followed
+                    break
+                pdu = await reader.readexactly(length - 1)
+                # a client may send several requests without waiting
+                reply = asyncio.create_task(self._reply(writer, header, unit, pdu))
+                replies.add(reply)
+                reply.add_done_callback(replies.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients -= 1
+            for reply in replies:
+                reply.cancel()
+            writer.close()
+
+    async def _reply(
+        self, writer: asyncio.StreamWriter, header: bytes, unit: int, pdu: bytes
+    ) -> None:
+        response = await self.handle(unit, pdu)
+        if writer.is_closing():
+            return
+        writer.write(
+            header[:4] + struct.pack(">HB", len(response) + 1, unit) + response
+        )
+
+    async def handle(self, unit: int, pdu: bytes) -> bytes:
+        """Answer a request PDU (function code onwards) with a response PDU."""
+        self.requests += 1
+        function_code = pdu[0]
+        if function_code in READS:
+            if len(pdu) != 5:
+                return _exception(function_code, ILLEGAL_VALUE)
+            address, count = struct.unpack(">HH", pdu[1:])
+            if not 1 <= count <= READS[function_code][2]:
+                return _exception(function_code, ILLEGAL_VALUE)
+            return await self._read(unit, function_code, address, count)
+        if function_code in (0x05, 0x06, 0x0F, 0x10):
+            return await self._write(unit, pdu)
+        return _exception(function_code, ILLEGAL_FUNCTION)
+
+    async def _read(
+        self, unit: int, function_code: int, address: int, count: int
+    ) -> bytes:
+        kind = READS[function_code][1]
+        if self.cache_max_age > 0 and (
+            values := self.cache.get(unit, kind, address, count, self.cache_max_age)
+        ) is not None:
+            self.cache.hits += 1
+            return self._read_response(function_code, values)
+        key = (unit, function_code, address, count)
+        if (pending := self._pending.get(key)) is None:
+            self.cache.misses += 1
+            pending = self._pending[key] = asyncio.get_running_loop().create_task(
+                self._fetch(unit, function_code, address, count)
+            )
+        else:
+            self.cache.shared += 1
+        # a client that goes away does not cancel a read others wait for
+        return await asyncio.shield(pending)
+
+    async def _fetch(
+        self, unit: int, function_code: int, address: int, count: int
+    ) -> bytes:
+        call, kind, _ = READS[function_code]
+        writes = self._writes
+        try:
+            values = await self._upstream(unit, call, address, count=count)
+        finally:
+            del self._pending[(unit, function_code, address, count)]
+        if isinstance(values, int):
+            return _exception(function_code, values)
+        if values is None:
+            return _exception(function_code, GATEWAY_NO_RESPONSE)
+        values = values[:count]
+        if self.cache_max_age > 0 and writes == self._writes:
+            self.cache.put(unit, kind, address, values)
+        return self._read_response(function_code, values)
+
+    @staticmethod
+    def _read_response(function_code: int, values: list) -> bytes:
+        if function_code in (0x01, 0x02):
+            data = _pack_bits(values)
+        else:
+            data = struct.pack(f">{len(values)}H", *values)
+        return bytes([function_code, len(data)]) + data
+
+    async def _write(self, unit: int, pdu: bytes) -> bytes:
+        function_code = pdu[0]
+        if len(pdu) < 5:
+            return _exception(function_code, ILLEGAL_VALUE)
+        self._writes += 1
+        address, value = struct.unpack(">HH", pdu[1:5])
+        if function_code == 0x05:
+            if value not in (0x0000, 0xFF00):
+                return _exception(function_code, ILLEGAL_VALUE)
+            result = await self._upstream(unit, "write_coil", address, value=value == 0xFF00)
+        elif function_code == 0x06:
+            result = await self._upstream(unit, "write_register", address, value=value)
+        else:
+            # value is the count, followed by the byte count and the data
+            data = pdu[6:]
+            if len(pdu) < 6 or pdu[5] != len(data) or not value:
+                return _exception(function_code, ILLEGAL_VALUE)
+            if function_code == 0x0F:
+                if len(data) != (value + 7) // 8:
+                    return _exception(function_code, ILLEGAL_VALUE)
+                result = await self._upstream(
+                    unit, "write_coils", address, values=_unpack_bits(data, value)
+                )
+            else:
+                if len(data) != 2 * value:
+                    return _exception(function_code, ILLEGAL_VALUE)
+                result = await self._upstream(
+                    unit,
+                    "write_registers",
+                    address,
+                    values=list(struct.unpack(f">{value}H", data)),
+                )
+        # the device may change any register in response
+        self.cache.invalidate(unit)
+        if isinstance(result, int):
+            return _exception(function_code, result)
+        if result is None:
+            return _exception(function_code, GATEWAY_NO_RESPONSE)
+        return pdu[:5]
+
+    async def _upstream(
+        self, unit: int, call: str, address: int, **kwargs
+    ) -> list | int | None:
+        """Send a request upstream.
+
+        Return the values of a read (an empty list for a write), the
+        exception code of an exception reply or None without a reply.
+        """
+        self.upstream_requests += 1
+        try:
+            result = await getattr(self.client, call)(address, device_id=unit, **kwargs)
+        except ModbusException as exception_error:
+            _LOGGER.debug("%s %s of slave %s failed: %s", call, address, unit, exception_error)
+            return None
+        if result.isError():
+            return getattr(result, "exception_code", None) or GATEWAY_NO_RESPONSE
+        if call in ("read_coils", "read_discrete_inputs"):
+            return result.bits
+        if call.startswith("read"):
+            return result.registers
+        return []
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", required=True, help="dongle address")
+    parser.add_argument("--port", type=int, default=502, help="dongle port")
+    parser.add_argument("--listen-host", default="127.0.0.1")
+    parser.add_argument("--listen-port", type=int, default=5020)
+    parser.add_argument(
+        "--cache-max-age", type=float, default=1.0, help="seconds a read is reused, 0 never"
+    )
+    parser.add_argument("--timeout", type=float, default=3)
+    parser.add_argument("--pipeline-depth", type=int, default=1)
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    client = AsyncSungrowModbusTcpClient(
+        host=args.host,
+        port=args.port,
+        timeout=args.timeout,
+        pipeline_depth=args.pipeline_depth,
+    )
+    # a failed connect is retried by the client in the background
+    await client.connect()
+    gateway = ModbusGateway(client, args.cache_max_age)
+    server = await gateway.start(args.listen_host, args.listen_port)
+    port = server.sockets[0].getsockname()[1]
+    print(f"gateway on {args.listen_host}:{port} to {args.host}:{args.port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
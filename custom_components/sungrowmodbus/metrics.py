@@ -0,0 +1,148 @@
+"""Request counters and latency histograms of a hub."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+import time
+
+# upper bounds of the latency buckets in seconds, the last bucket is open
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# requests per second are averaged over this many seconds
+RATE_WINDOW = 60.0
+
+
+class LatencyHistogram:
+    """Request latencies counted in fixed buckets."""
+
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, latency: float) -> None:
+        """Count one latency."""
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+
+    def merge(self, other: LatencyHistogram) -> None:
+        """Add the counts of other."""
+        for i, bucket in enumerate(other.buckets):
+            self.buckets[i] += bucket
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, fraction: float) -> float | None:
+        """Upper bound of the bucket holding the given fraction."""
+        if not self.count:
+            return None
+        wanted = fraction * self.count
+        seen = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, self.buckets, strict=False):
+            seen += bucket
+            if seen >= wanted:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        """Counts per bucket and summary in milliseconds."""
+        bounds = [f"le_{bound * 1000:g}ms" for bound in LATENCY_BUCKETS] + ["inf"]
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else None,
+            "p50_ms": None if p50 is None else p50 * 1000,
+            "p95_ms": None if p95 is None else p95 * 1000,
+            "buckets": dict(zip(bounds, self.buckets, strict=True)),
+        }
+
+
+class HubMetrics:
+    """Counters updated with every request, a few integer adds each."""
+
+    def __init__(self) -> None:
+        """Initialize all counters at zero."""
+        self.latency: dict[str, LatencyHistogram] = {}
+        self.requests = 0
+        self.error_replies = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.retries = 0
+        self.state_writes = 0
+        self.state_writes_suppressed = 0
+        self.rate: float | None = None
+        self._rate_start = time.monotonic()
+        self._rate_requests = 0
+
+    def response(self, use_call: str, latency: float, retries: int) -> None:
+        """Account a reply, exception replies included."""
+        if (histogram := self.latency.get(use_call)) is None:
+            histogram = self.latency[use_call] = LatencyHistogram()
+        histogram.observe(latency)
+        self.retries += retries
+        self._request()
+
+    def error_reply(self) -> None:
+        """Account an exception reply."""
+        self.error_replies += 1
+
+    def failure(self, timeout: bool) -> None:
+        """Account a request without a reply."""
+        if timeout:
+            self.timeouts += 1
+        self.failures += 1
+        self._request()
+
+    def state_write(self, written: bool) -> None:
+        """Account a read an entity wrote to its state or suppressed."""
+        if written:
+            self.state_writes += 1
+        else:
+            self.state_writes_suppressed += 1
+
+    def requests_per_second(self) -> float:
+        """Request rate over the last complete window."""
+        now = time.monotonic()
+        self._roll(now)
+        if self.rate is None:
+            # the first window is still running
+            return self._rate_requests / max(now - self._rate_start, 1.0)
+        return self.rate
+
+    def _request(self) -> None:
+        self.requests += 1
+        self._rate_requests += 1
+
+    def _roll(self, now: float) -> None:
+        if (elapsed := now - self._rate_start) >= RATE_WINDOW:
+            self.rate = self._rate_requests / elapsed
+            self._rate_start = now
+            self._rate_requests = 0
+
+    def overall_latency(self) -> LatencyHistogram:
+        """Latencies of all call types together."""
+        total = LatencyHistogram()
+        for histogram in self.latency.values():
+            total.merge(histogram)
+        return total
+
+    def as_dict(self) -> dict:
+        """All counters and histograms."""
+        return {
+            "requests": self.requests,
+            "requests_per_s": self.requests_per_second(),
+            "error_replies": self.error_replies,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "retries": self.retries,
+            "state_writes": self.state_writes,
+            "state_writes_suppressed": self.state_writes_suppressed,
+            "latency": self.overall_latency().as_dict(),
+            "latency_by_call": {
+                use_call: histogram.as_dict()
+                for use_call, histogram in self.latency.items()
+            },
+        }
@@ -6,10 +6,11 @@ import asyncio
 from collections import namedtuple
 from collections.abc import Callable
 import logging
+import time
 from typing import Any
-from .sungrow import AsyncSungrowModbusTcpClient
+from .sungrow import BUSY_EXCEPTIONS, AsyncSungrowModbusTcpClient, SessionKeyCache
 
-from pymodbus.exceptions import ModbusException
+from pymodbus.exceptions import ModbusException, ModbusIOException
 from pymodbus.framer import FramerType
 from pymodbus.pdu import ModbusPDU
 import voluptuous as vol
@@ -23,7 +24,14 @@ from homeassistant.const import (
     CONF_TIMEOUT,
     EVENT_HOMEASSISTANT_STOP,
 )
-from homeassistant.core import Event, HomeAssistant, ServiceCall, callback
+from homeassistant.core import (
+    Event,
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.discovery import async_load_platform
 from homeassistant.helpers.dispatcher import async_dispatcher_send
@@ -45,16 +53,49 @@ from .const import (
     CALL_TYPE_WRITE_COILS,
     CALL_TYPE_WRITE_REGISTER,
     CALL_TYPE_WRITE_REGISTERS,
+    CONF_BLOCK_MAX_GAP,
+    CONF_BLOCK_MAX_SIZE,
+    CONF_BREAKER_BACKOFF,
+    CONF_BREAKER_MAX_BACKOFF,
+    CONF_BREAKER_THRESHOLD,
     CONF_MSG_WAIT,
+    CONF_MSG_WAIT_MAX,
+    CONF_PIPELINE_DEPTH,
+    CONF_RECONNECT_POLICY,
+    CONF_REGISTER_MAP,
+    CONF_REKEY_INTERVAL,
+    CONF_SESSION_KEY_TTL,
+    DEFAULT_BLOCK_MAX_GAP,
+    DEFAULT_BLOCK_MAX_SIZE,
+    DEFAULT_BREAKER_BACKOFF,
+    DEFAULT_BREAKER_MAX_BACKOFF,
+    DEFAULT_BREAKER_THRESHOLD,
     DEFAULT_HUB,
+    DEFAULT_MSG_WAIT_MAX,
+    DEFAULT_PIPELINE_DEPTH,
+    DEFAULT_RECONNECT_POLICY,
+    DEFAULT_REKEY_INTERVAL,
+    DEFAULT_SESSION_KEY_TTL,
     MODBUS_DOMAIN as DOMAIN,
     PLATFORMS,
+    SERVICE_GET_METRICS,
     SERVICE_STOP,
     SERVICE_WRITE_COIL,
     SERVICE_WRITE_REGISTER,
+    SIGNAL_AVAILABILITY,
     SIGNAL_STOP_ENTITY,
     SUNGROW,
 )
+from .breaker import CircuitBreaker
+from .cache import RegisterCache
+from .decoder import BlockDecoder
+from .metrics import HubMetrics
+from .pacing import PacingController
+from .planner import ReadBlock, ReadSpan, plan_blocks
+from .register_map import RegisterMap
+from .rekey import KeyLifecycle
+from .request_queue import RequestPriority, RequestQueue
+from .scheduler import PollScheduler
 from .validators import check_config
 
 _LOGGER = logging.getLogger(__name__)
@@ -63,6 +104,28 @@ DATA_MODBUS_HUBS: HassKey[dict[str, ModbusHub]] = HassKey(DOMAIN)
 
 ConfEntry = namedtuple("ConfEntry", "call_type attr func_name value_attr_name")  # noqa: PYI024
 RunEntry = namedtuple("RunEntry", "attr func value_attr_name")  # noqa: PYI024
+WRITE_CALLS = {
+    CALL_TYPE_WRITE_COIL,
+    CALL_TYPE_WRITE_COILS,
+    CALL_TYPE_WRITE_REGISTER,
+    CALL_TYPE_WRITE_REGISTERS,
+}
+# poll-free seconds ahead needed to start a key renewal
+REKEY_MIN_IDLE = 1
+# client counters that add up over the clients of a hub, a key renewal
+# replaces the client
+CLIENT_COUNTERS = (
+    "bytes_sent",
+    "bytes_received",
+    "connects",
+    "reconnects",
+    "reconnect_attempts",
+)
+# the slice of a block read handed to one entity
+# decoded holds the values of all sensors of the block read, by decoder
+ReadResult = namedtuple(  # noqa: PYI024
+    "ReadResult", "registers bits decoded", defaults=(None,)
+)
 PB_CALL = [
     ConfEntry(
         CALL_TYPE_COIL,
@@ -216,6 +279,18 @@ async def async_modbus_setup(
             ),
         )
 
+    async def async_get_metrics(service: ServiceCall) -> ServiceResponse:
+        """Return the performance counters of a hub."""
+        return hub_collect[service.data.get(ATTR_HUB, DEFAULT_HUB)].diagnostics()
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_METRICS,
+        async_get_metrics,
+        schema=vol.Schema({vol.Optional(ATTR_HUB, default=DEFAULT_HUB): cv.string}),
+        supports_response=SupportsResponse.ONLY,
+    )
+
     async def async_stop_hub(service: ServiceCall) -> None:
         """Stop Modbus hub."""
         async_dispatcher_send(hass, SIGNAL_STOP_ENTITY)
@@ -243,7 +318,12 @@ class ModbusHub:
         ) = None
         self._async_cancel_listener: Callable[[], None] | None = None
         self._in_error = False
-        self._lock = asyncio.Lock()
+        # up to pipeline_depth requests share the connection at once,
+        # granted by priority, connect/close take every slot
+        self._pipeline_depth = client_config.get(
+            CONF_PIPELINE_DEPTH, DEFAULT_PIPELINE_DEPTH
+        )
+        self.queue = RequestQueue(self._pipeline_depth)
         self.hass = hass
         self.name = client_config[CONF_NAME]
         self._config_delay = client_config[CONF_DELAY]
@@ -253,15 +333,66 @@ class ModbusHub:
             "port": client_config[CONF_PORT],
             "timeout": client_config[CONF_TIMEOUT],
             "retries": 3,
+            "pipeline_depth": self._pipeline_depth,
+            # the client reconnects a lost session itself
+            "reconnect_policy": client_config.get(
+                CONF_RECONNECT_POLICY, DEFAULT_RECONNECT_POLICY
+            ),
         }
 
         self._pb_params["host"] = client_config[CONF_HOST]
         self._pb_params["framer"] = FramerType.SOCKET
+        # the cache outlives the client, so reconnects skip GET_KEY
+        if key_ttl := client_config.get(
+            CONF_SESSION_KEY_TTL, DEFAULT_SESSION_KEY_TTL
+        ):
+            self._pb_params["key_cache"] = SessionKeyCache(ttl=key_ttl)
+        # the key is renewed on a second connection in an idle gap
+        self.rekey = KeyLifecycle(
+            client_config.get(CONF_REKEY_INTERVAL, DEFAULT_REKEY_INTERVAL)
+        )
+        self._rekey_task: asyncio.Task[None] | None = None
+        # counters of the clients the hub no longer uses
+        self._retired = dict.fromkeys(CLIENT_COUNTERS, 0)
+        self._last_recovery: float | None = None
+        self._max_recovery: float | None = None
+
+        # the gap between a reply and the next request adapts to the
+        # dongle, message_wait_milliseconds is its floor
+        self.pacing = PacingController(
+            self.name,
+            client_config.get(CONF_MSG_WAIT, 0) / 1000,
+            client_config.get(CONF_MSG_WAIT_MAX, DEFAULT_MSG_WAIT_MAX) / 1000,
+        )
+        self._next_send = 0.0
+        # reads stop while the device does not answer, e.g. at night
+        self.breaker = CircuitBreaker(
+            client_config.get(CONF_BREAKER_THRESHOLD, DEFAULT_BREAKER_THRESHOLD),
+            client_config.get(CONF_BREAKER_BACKOFF, DEFAULT_BREAKER_BACKOFF),
+            client_config.get(CONF_BREAKER_MAX_BACKOFF, DEFAULT_BREAKER_MAX_BACKOFF),
+        )
+        self._async_cancel_probe: Callable[[], None] | None = None
+        self.metrics = HubMetrics()
 
-        if CONF_MSG_WAIT in client_config:
-            self._msg_wait = client_config[CONF_MSG_WAIT] / 1000
-        else:
-            self._msg_wait = 0
+        # entity reads are coalesced into blocks, the plan is rebuilt
+        # whenever an entity is added or removed
+        self._block_max_gap = client_config.get(
+            CONF_BLOCK_MAX_GAP, DEFAULT_BLOCK_MAX_GAP
+        )
+        self._block_max_size = client_config.get(
+            CONF_BLOCK_MAX_SIZE, DEFAULT_BLOCK_MAX_SIZE
+        )
+        self._read_spans: dict[ReadSpan, int] = {}
+        self._block_of: dict[ReadSpan, ReadBlock] | None = None
+        self._block_failed: dict[ReadBlock, float] = {}
+        # sensors decoded together per block, compiled by check_config
+        self.register_map: RegisterMap | None = client_config.get(CONF_REGISTER_MAP)
+        self._block_decoders: dict[ReadBlock, BlockDecoder] = {}
+        self._decoded: dict[ReadBlock, tuple[list, dict]] = {}
+        # recent reads, shared by entities reading the same registers
+        self.cache = RegisterCache()
+        # one task polls all entities of the hub
+        self.scheduler = PollScheduler(self.name, hass.loop)
 
     def _log_error(self, text: str, error_state: bool = True) -> None:
         log_text = f"Pymodbus: {self.name}: {text}"
@@ -273,33 +404,107 @@ class ModbusHub:
 
     async def async_pb_connect(self) -> None:
         """Connect to device, async."""
-        async with self._lock:
+        async with self.queue.exclusive():
             try:
-                await self._client.connect()  # type: ignore[union-attr]
+                connected = await self._client.connect()  # type: ignore[union-attr]
             except ModbusException as exception_error:
                 err = f"{self.name} connect failed, retry in pymodbus  ({exception_error!s})"
                 self._log_error(err, error_state=False)
                 return
-            message = f"modbus {self.name} communication open"
-            _LOGGER.info(message)
+            if not connected:
+                # the client keeps reconnecting in the background
+                err = f"{self.name} connect failed, retrying"
+                self._log_error(err, error_state=False)
+            else:
+                message = f"modbus {self.name} communication open"
+                _LOGGER.info(message)
+        self.rekey.obtained()
+        if self.rekey.interval and self._rekey_task is None:
+            self._rekey_task = self.hass.async_create_background_task(
+                self._async_rekey_loop(), "modbus-rekey"
+            )
+
+    def _bind_client(self, client: AsyncSungrowModbusTcpClient) -> None:
+        """Send the requests of the hub through client."""
+        self._client = client
+        for entry in PB_CALL:
+            func = getattr(client, entry.func_name)
+            self._pb_request[entry.call_type] = RunEntry(
+                entry.attr, func, entry.value_attr_name
+            )
+
+    async def _async_rekey_loop(self) -> None:
+        """Renew the session key whenever it is due."""
+        while (wait := self.rekey.wait()) is not None:
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if (
+                self._client is None
+                or self._client.plain
+                or not self.breaker.closed
+                or self.scheduler.idle_for() < REKEY_MIN_IDLE
+            ):
+                # wait for a gap between poll cycles, or for the device
+                await asyncio.sleep(REKEY_MIN_IDLE)
+                continue
+            await self._async_rekey()
+
+    async def _async_rekey(self) -> None:
+        """Open a session with a new key, then switch the hub over to it."""
+        start = time.monotonic()
+        if key_cache := self._pb_params.get("key_cache"):
+            # the new session must not reuse the key it replaces
+            key_cache.invalidate(self._pb_params["host"], self._pb_params["port"])
+        client = self._pb_class(**self._pb_params)
+        connected = False
+        try:
+            connected = await client.connect()
+        except (ModbusException, TimeoutError) as exception_error:
+            _LOGGER.debug("modbus %s: rekey failed: %s", self.name, exception_error)
+        finally:
+            if not connected:
+                client.close()
+        if not connected:
+            retry_in = self.rekey.failed()
+            _LOGGER.warning(
+                "modbus %s: session key renewal failed, retry in %.0fs",
+                self.name,
+                retry_in,
+            )
+            return
+        # requests in flight finish on the old session, none waits for the
+        # handshake
+        try:
+            async with self.queue.exclusive():
+                old, self._client = self._client, None
+                if old is not None:
+                    self._retire_client(old)
+                    old.close()
+                self._bind_client(client)
+        except asyncio.CancelledError:
+            client.close()
+            raise
+        self.rekey.renewed(time.monotonic() - start)
+        _LOGGER.debug(
+            "modbus %s: session key renewed in %.2fs",
+            self.name,
+            self.rekey.last_duration,
+        )
 
     async def async_setup(self) -> bool:
         """Set up pymodbus client."""
         try:
-            self._client = self._pb_class(**self._pb_params)
+            client = self._pb_class(**self._pb_params)
         except ModbusException as exception_error:
             self._log_error(str(exception_error), error_state=False)
             return False
-
-        for entry in PB_CALL:
-            func = getattr(self._client, entry.func_name)
-            self._pb_request[entry.call_type] = RunEntry(
-                entry.attr, func, entry.value_attr_name
-            )
+        self._bind_client(client)
 
         self.hass.async_create_background_task(
             self.async_pb_connect(), "modbus-connect"
         )
+        self.scheduler.start()
 
         # Start counting down to allow modbus requests.
         if self._config_delay:
@@ -326,14 +531,23 @@ class ModbusHub:
         if self._async_cancel_listener:
             self._async_cancel_listener()
             self._async_cancel_listener = None
-        async with self._lock:
+        if self._async_cancel_probe:
+            self._async_cancel_probe()
+            self._async_cancel_probe = None
+        if self._rekey_task:
+            self._rekey_task.cancel()
+            self._rekey_task = None
+        self.scheduler.stop()
+        async with self.queue.exclusive():
             if self._client:
+                self._retire_client(self._client)
                 try:
                     self._client.close()
                 except ModbusException as exception_error:
                     self._log_error(str(exception_error))
                 del self._client
                 self._client = None
+                self._block_failed.clear()
                 message = f"modbus {self.name} communication closed"
                 _LOGGER.info(message)
 
@@ -351,26 +565,44 @@ class ModbusHub:
                 value = [value]
 
         kwargs[entry.value_attr_name] = value
+        start = time.monotonic()
         try:
             result: ModbusPDU = await entry.func(address, **kwargs)
         except ModbusException as exception_error:
+            timeout = isinstance(exception_error, ModbusIOException)
+            if timeout:
+                self.pacing.timeout()
+            self.metrics.failure(timeout)
             error = f"Error: device: {slave} address: {address} -> {exception_error!s}"
             self._log_error(error)
+            self._breaker_failure()
             return None
+        latency = time.monotonic() - start
         if not result:
             error = (
                 f"Error: device: {slave} address: {address} -> pymodbus returned None"
             )
             self._log_error(error)
+            self.metrics.failure(False)
+            self._breaker_failure()
             return None
+        self.metrics.response(use_call, latency, getattr(result, "retries", 0))
+        self._breaker_success()
         if not hasattr(result, entry.attr):
             error = f"Error: device: {slave} address: {address} -> {result!s}"
             self._log_error(error)
             return None
         if result.isError():
+            if getattr(result, "exception_code", None) in BUSY_EXCEPTIONS:
+                self.pacing.error_reply()
+            else:
+                # e.g. an illegal address, answered in time
+                self.pacing.response(latency)
+            self.metrics.error_reply()
             error = f"Error: device: {slave} address: {address} -> pymodbus returned isError True"
             self._log_error(error)
             return None
+        self.pacing.response(latency)
         self._in_error = False
         return result
 
@@ -380,15 +612,252 @@ class ModbusHub:
         address: int,
         value: int | list[int],
         use_call: str,
+        priority: RequestPriority | None = None,
     ) -> ModbusPDU | None:
         """Convert async to sync pymodbus call."""
         if self._config_delay:
             return None
-        async with self._lock:
-            if not self._client:
+        write = use_call in WRITE_CALLS
+        if not (write or self.breaker.closed):
+            return None
+        if priority is None:
+            priority = RequestPriority.WRITE if write else RequestPriority.POLL
+        async with self.queue.slot(priority):
+            if not self._client or not (write or self.breaker.closed):
                 return None
+            if (wait := self._next_send - time.monotonic()) > 0:
+                # give the dongle the current gap since the last reply
+                await asyncio.sleep(wait)
             result = await self.low_level_pb_call(unit, address, value, use_call)
-            if self._msg_wait:
-                # small delay until next request/response
-                await asyncio.sleep(self._msg_wait)
+            if gap := self.pacing.gap:
+                self._next_send = time.monotonic() + gap
+            if write:
+                # reads in flight are not cached either
+                self.cache.invalidate(unit if unit is not None else 1)
             return result
+
+    def _retire_client(self, client: AsyncSungrowModbusTcpClient) -> None:
+        """Keep the counters of a client the hub stops using."""
+        for counter in CLIENT_COUNTERS:
+            self._retired[counter] += getattr(client, counter)
+        if client.last_recovery is not None:
+            self._last_recovery = client.last_recovery
+        if client.max_recovery is not None:
+            self._max_recovery = max(self._max_recovery or 0, client.max_recovery)
+
+    def connection_stats(self) -> dict[str, float | int | None] | None:
+        """Traffic, connect and reconnect counters of the hub's clients."""
+        if (client := self._client) is None:
+            return None
+        stats: dict[str, float | int | None] = {
+            counter: total + getattr(client, counter)
+            for counter, total in self._retired.items()
+        }
+        stats["last_recovery"] = (
+            self._last_recovery
+            if client.last_recovery is None
+            else client.last_recovery
+        )
+        stats["max_recovery"] = (
+            self._max_recovery
+            if client.max_recovery is None
+            else max(self._max_recovery or 0, client.max_recovery)
+        )
+        return stats
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Performance counters of the hub and its connection."""
+        return {
+            "available": self.available,
+            "requests": self.metrics.as_dict(),
+            "queue": self.queue.stats(),
+            "cache": self.cache.stats(),
+            "pacing": self.pacing.stats(),
+            "breaker": self.breaker.stats(),
+            "scheduler": self.scheduler.stats(),
+            "connection": self.connection_stats(),
+            "session": self.rekey.stats(),
+            "register_map": (
+                None if self.register_map is None else self.register_map.as_dict()
+            ),
+        }
+
+    @property
+    def available(self) -> bool:
+        """Whether the device answers, False while the breaker is open."""
+        return self.breaker.closed
+
+    def _breaker_success(self) -> None:
+        if self.breaker.success():
+            _LOGGER.info("modbus %s: device answers again", self.name)
+            async_dispatcher_send(
+                self.hass, SIGNAL_AVAILABILITY.format(self.name), True
+            )
+
+    def _breaker_failure(self) -> None:
+        was_closed = self.breaker.closed
+        if (retry_in := self.breaker.failure()) is None:
+            return
+        if was_closed:
+            _LOGGER.warning(
+                "modbus %s: no reply to %d requests, reads paused",
+                self.name,
+                self.breaker.failures,
+            )
+            async_dispatcher_send(
+                self.hass, SIGNAL_AVAILABILITY.format(self.name), False
+            )
+        _LOGGER.debug("modbus %s: probing again in %.0fs", self.name, retry_in)
+        if self._async_cancel_probe:
+            self._async_cancel_probe()
+        self._async_cancel_probe = async_call_later(
+            self.hass, retry_in, self._async_start_probe
+        )
+
+    @callback
+    def _async_start_probe(self, now: Any) -> None:
+        self._async_cancel_probe = None
+        self.hass.async_create_background_task(self._async_probe(), "modbus-probe")
+
+    async def _async_probe(self) -> None:
+        """Send one read of an entity to see if the device is back."""
+        if self.breaker.closed:
+            return
+        if (span := next(iter(self._read_spans), None)) is None:
+            # nothing polls the device, let the next read try
+            self._breaker_success()
+            return
+        async with self.queue.slot(RequestPriority.POLL):
+            if self._client:
+                await self.low_level_pb_call(
+                    span.slave, span.address, span.count, span.use_call
+                )
+
+    @callback
+    def register_read(self, span: ReadSpan) -> Callable[[], None]:
+        """Add an entity read to the block plan, return its removal."""
+        self._read_spans[span] = self._read_spans.get(span, 0) + 1
+        self._block_of = None
+
+        @callback
+        def unregister() -> None:
+            if refs := self._read_spans[span] - 1:
+                self._read_spans[span] = refs
+            else:
+                del self._read_spans[span]
+            self._block_of = None
+
+        return unregister
+
+    def _block_plan(self) -> dict[ReadSpan, ReadBlock]:
+        if self._block_of is None:
+            register_map = self.register_map
+            if (
+                register_map is not None
+                and self._read_spans.keys() == register_map.entries.keys()
+            ):
+                # only sensors, as compiled
+                blocks = register_map.blocks
+            else:
+                blocks = plan_blocks(
+                    self._read_spans, self._block_max_gap, self._block_max_size
+                )
+            self._block_of = {span: block for block in blocks for span in block.spans}
+            self._block_failed.clear()
+            self._decoded.clear()
+            self._block_decoders = {}
+            if register_map is not None:
+                for block in blocks:
+                    if layout := register_map.layout(block):
+                        self._block_decoders[block] = BlockDecoder(layout)
+            _LOGGER.debug(
+                "modbus %s: %d reads in %d blocks",
+                self.name,
+                len(self._read_spans),
+                len(blocks),
+            )
+        return self._block_of
+
+    async def async_pb_read(
+        self,
+        span: ReadSpan,
+        max_age: float = 0.0,
+        priority: RequestPriority = RequestPriority.POLL,
+    ) -> ReadResult | None:
+        """Read an entity span through the cache and the block covering it.
+
+        A cached range not older than max_age seconds answers the read.
+        """
+        if self._config_delay:
+            return None
+        block = self._block_plan().get(span)
+        values = decoded = None
+        if block is not None and not self._block_failed_recently(block, max_age):
+            # a verify read keeps its priority when it maps to a block
+            values = await self._async_read(
+                block.slave,
+                block.use_call,
+                block.address,
+                block.count,
+                max_age,
+                priority,
+            )
+            if values is not None:
+                if (block_decoder := self._block_decoders.get(block)) is not None:
+                    decoded = self._decode(block, block_decoder, values)
+                offset = block.offset(span)
+                values = values[offset : offset + span.count]
+            else:
+                self._block_failed[block] = time.monotonic()
+                if len(block.spans) == 1:
+                    return None
+        if values is None:
+            # no block, or e.g. the device refuses a register in a gap
+            values = await self._async_read(
+                span.slave, span.use_call, span.address, span.count, max_age, priority
+            )
+            if values is None:
+                return None
+        if self._pb_request[span.use_call].attr == "bits":
+            return ReadResult([], values)
+        return ReadResult(values, [], decoded)
+
+    def _decode(
+        self, block: ReadBlock, block_decoder: BlockDecoder, values: list
+    ) -> dict:
+        """Decode the sensors of a block read once for all of them."""
+        # the cache hands out the same list until the block is read again
+        if (last := self._decoded.get(block)) is not None and last[0] is values:
+            return last[1]
+        decoded = block_decoder.decode(values)
+        self._decoded[block] = (values, decoded)
+        return decoded
+
+    def _block_failed_recently(self, block: ReadBlock, max_age: float) -> bool:
+        if (failed_at := self._block_failed.get(block)) is None:
+            return False
+        # the other spans of the block go straight to their own reads
+        # for the rest of the cycle
+        if time.monotonic() - failed_at < max(max_age, 1.0):
+            return True
+        del self._block_failed[block]
+        return False
+
+    async def _async_read(
+        self,
+        slave: int,
+        use_call: str,
+        address: int,
+        count: int,
+        max_age: float,
+        priority: RequestPriority = RequestPriority.POLL,
+    ) -> list | None:
+        async def fetch() -> list | None:
+            result = await self.async_pb_call(slave, address, count, use_call, priority)
+            if result is None:
+                return None
+            return getattr(result, self._pb_request[use_call].attr)[:count]
+
+        return await self.cache.async_read(
+            slave, use_call, address, count, max_age, fetch
+        )
@@ -0,0 +1,82 @@
+"""Adapt the gap between requests to how the dongle copes."""
+
+from __future__ import annotations
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# seconds added to the gap on overload, a gap shrinking below it drops
+# to the floor
+STEP = 0.02
+# weight of a new latency sample in the moving average
+LATENCY_WEIGHT = 0.2
+# the baseline follows rising latency this slowly, dropping at once
+BASELINE_WEIGHT = 0.01
+# latency above this multiple of the baseline means the dongle is queueing
+OVERLOAD_FACTOR = 2.0
+
+
+class PacingController:
+    """Gap between requests, within [floor, ceiling] seconds.
+
+    The gap grows on timeouts (doubling), busy replies (by half) and when
+    the average response latency climbs above twice its baseline, and
+    shrinks by a fifth with every timely response.  With a floor of 0 a
+    responsive dongle gets its requests back to back.
+    """
+
+    def __init__(self, name: str, floor: float, ceiling: float) -> None:
+        """Start at the floor."""
+        self.name = name
+        self.floor = floor
+        self.ceiling = max(floor, ceiling)
+        self.gap = floor
+        self.latency: float | None = None
+        self.baseline: float | None = None
+        self.responses = 0
+        self.error_replies = 0
+        self.timeouts = 0
+
+    def response(self, latency: float) -> None:
+        """Account a reply received after latency seconds."""
+        self.responses += 1
+        if self.latency is None or self.baseline is None:
+            self.latency = self.baseline = latency
+        else:
+            self.latency += (latency - self.latency) * LATENCY_WEIGHT
+            self.baseline = min(
+                latency, self.baseline + (latency - self.baseline) * BASELINE_WEIGHT
+            )
+        if self.latency > self.baseline * OVERLOAD_FACTOR + STEP:
+            self._set(self.gap + STEP)
+        else:
+            gap = self.gap * 0.8
+            self._set(gap if gap >= STEP else self.floor)
+
+    def error_reply(self) -> None:
+        """Account a reply saying the device or gateway is busy."""
+        self.error_replies += 1
+        self._set(self.gap * 1.5 + STEP)
+
+    def timeout(self) -> None:
+        """Account a request that got no reply."""
+        self.timeouts += 1
+        self._set(self.gap * 2 + STEP)
+
+    def _set(self, gap: float) -> None:
+        gap = min(self.ceiling, max(self.floor, gap))
+        if gap != self.gap and (gap == self.ceiling or self.gap == self.ceiling):
+            _LOGGER.debug("modbus %s: message gap %.0f ms", self.name, gap * 1000)
+        self.gap = gap
+
+    def stats(self) -> dict[str, float | int | None]:
+        """Current gap and latencies in milliseconds, reply counters."""
+        return {
+            "gap_ms": self.gap * 1000,
+            "latency_ms": None if self.latency is None else self.latency * 1000,
+            "baseline_ms": None if self.baseline is None else self.baseline * 1000,
+            "responses": self.responses,
+            "error_replies": self.error_replies,
+            "timeouts": self.timeouts,
+        }
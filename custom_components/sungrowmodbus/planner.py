@@ -0,0 +1,76 @@
+"""Coalesce the reads of many entities into few block reads."""
+
+from __future__ import annotations
+
+from collections import namedtuple
+from collections.abc import Iterable
+from itertools import groupby
+
+# one entity read: count registers (or bits) from address
+ReadSpan = namedtuple(  # noqa: PYI024
+    "ReadSpan", "slave use_call scan_interval address count"
+)
+
+
+class ReadBlock:
+    """A contiguous read covering the spans of one or more entities."""
+
+    __slots__ = ("address", "count", "scan_interval", "slave", "spans", "use_call")
+
+    def __init__(self, span: ReadSpan) -> None:
+        """Start a block with its first span."""
+        self.slave = span.slave
+        self.use_call = span.use_call
+        self.scan_interval = span.scan_interval
+        self.address = span.address
+        self.count = span.count
+        self.spans = [span]
+
+    @property
+    def end(self) -> int:
+        """First address after the block."""
+        return self.address + self.count
+
+    def try_add(self, span: ReadSpan, max_gap: int, max_size: int) -> bool:
+        """Extend the block with span if the gap and size limits allow it."""
+        end = max(self.end, span.address + span.count)
+        if span.address > self.end + max_gap or end - self.address > max_size:
+            return False
+        self.count = end - self.address
+        self.spans.append(span)
+        return True
+
+    def offset(self, span: ReadSpan) -> int:
+        """Position of span in the values read for the block."""
+        return span.address - self.address
+
+    def __repr__(self) -> str:
+        """Return a readable block."""
+        return (
+            f"ReadBlock(slave={self.slave}, {self.use_call} {self.address}"
+            f"+{self.count}, spans={len(self.spans)})"
+        )
+
+
+def _group(span: ReadSpan) -> tuple:
+    return (span.slave, span.use_call, span.scan_interval)
+
+
+def plan_blocks(
+    spans: Iterable[ReadSpan], max_gap: int, max_size: int
+) -> list[ReadBlock]:
+    """Merge spans into blocks per slave, input type and scan interval.
+
+    Spans are merged in address order while the registers skipped between
+    them do not exceed max_gap and the block stays within max_size; a span
+    longer than max_size gets a block of its own.
+    """
+    blocks: list[ReadBlock] = []
+    ordered = sorted(set(spans), key=lambda span: (_group(span), span.address))
+    for _, group in groupby(ordered, key=_group):
+        block: ReadBlock | None = None
+        for span in group:
+            if block is None or not block.try_add(span, max_gap, max_size):
+                block = ReadBlock(span)
+                blocks.append(block)
+    return blocks
@@ -0,0 +1,60 @@
+"""Decode the sensors of a block read together."""
+
+from __future__ import annotations
+
+from collections import namedtuple
+from collections.abc import Iterable
+
+from .decoder import BlockLayout
+from .planner import ReadBlock, ReadSpan, plan_blocks
+
+# a sensor read with its decoder, target names the sensor
+MapEntry = namedtuple("MapEntry", "span decoder target")  # noqa: PYI024
+
+
+class RegisterMap:
+    """Sensor reads of a hub and their decoders, compiled by check_config.
+
+    blocks holds the block plan of the sensors alone; the hub plans its
+    blocks with the reads of all entities and asks for the layout of each.
+    A fetched block is packed into one buffer (and one little endian
+    buffer if a sensor swaps) that every sensor decodes from its offset.
+    """
+
+    def __init__(
+        self, entries: Iterable[MapEntry], max_gap: int, max_size: int
+    ) -> None:
+        """Compile the block plan of the entries."""
+        self.entries: dict[ReadSpan, list[MapEntry]] = {}
+        for entry in entries:
+            self.entries.setdefault(entry.span, []).append(entry)
+        self.blocks = plan_blocks(self.entries, max_gap, max_size)
+
+    def layout(self, block: ReadBlock) -> BlockLayout:
+        """Byte offset and decoder of every sensor read in block."""
+        return [
+            (block.offset(span) * 2, entry.decoder)
+            for span in block.spans
+            for entry in self.entries.get(span, ())
+        ]
+
+    def as_dict(self) -> dict:
+        """Compiled blocks and their sensors."""
+        return {
+            "sensors": sum(len(entries) for entries in self.entries.values()),
+            "blocks": [
+                {
+                    "slave": block.slave,
+                    "input_type": block.use_call,
+                    "address": block.address,
+                    "count": block.count,
+                    "sensors": [
+                        entry.target
+                        for span in block.spans
+                        for entry in self.entries[span]
+                    ],
+                }
+                for block in self.blocks
+            ],
+        }
+
@@ -0,0 +1,67 @@
+"""Renew the session key of a hub before it gets old."""
+
+from __future__ import annotations
+
+import time
+
+
+class KeyLifecycle:
+    """When the session key is due for renewal.
+
+    A key is renewed interval seconds after it was obtained (0 never).  The
+    hub renews it in an idle gap between poll cycles on a second connection
+    and keeps using the current session until the new one is ready; a
+    failed renewal is retried after retry seconds, doubling up to the
+    interval.
+    """
+
+    def __init__(self, interval: float, retry: float = 60) -> None:
+        """Initialize without a key."""
+        self.interval = interval
+        self.retry = min(retry, interval) if interval else retry
+        self.retry_in = self.retry
+        self.obtained_at: float | None = None
+        self.due: float | None = None
+        self.rekeys = 0
+        self.failures = 0
+        self.last_duration = 0.0
+
+    def obtained(self) -> None:
+        """Account a session with a new key, e.g. after connecting."""
+        self.obtained_at = time.monotonic()
+        self.due = self.obtained_at + self.interval if self.interval else None
+        self.retry_in = self.retry
+
+    def renewed(self, duration: float) -> None:
+        """Account a renewal that took duration seconds."""
+        self.rekeys += 1
+        self.last_duration = duration
+        self.obtained()
+
+    def failed(self) -> float:
+        """Account a failed renewal, return the seconds to the next try."""
+        self.failures += 1
+        retry_in = self.retry_in
+        self.due = time.monotonic() + retry_in
+        self.retry_in = min(max(self.interval, self.retry), retry_in * 2)
+        return retry_in
+
+    def wait(self) -> float | None:
+        """Seconds until the key is due, None if it is never renewed."""
+        if self.due is None:
+            return None
+        return max(0.0, self.due - time.monotonic())
+
+    def stats(self) -> dict[str, float | int | None]:
+        """Key age, renewals and failures."""
+        return {
+            "interval": self.interval,
+            "key_age": (
+                None
+                if self.obtained_at is None
+                else time.monotonic() - self.obtained_at
+            ),
+            "rekeys": self.rekeys,
+            "failures": self.failures,
+            "last_duration": self.last_duration,
+        }
@@ -0,0 +1,139 @@
+"""Hand out the request slots of a hub by priority."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from itertools import count
+import time
+
+
+class RequestPriority(IntEnum):
+    """Request classes, lower values are served first."""
+
+    WRITE = 0
+    VERIFY = 1
+    POLL = 2
+
+
+class _ClassStats:
+    __slots__ = ("max_wait", "requests", "total_wait")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class RequestQueue:
+    """Semaphore of `slots` request slots granted by priority.
+
+    A free slot goes to the oldest waiter of the most urgent class, so a
+    write waits for the requests in flight but not for the polls queued
+    behind them.  To keep polls from starving under a stream of writes, a
+    waiter passed over max_bypass times in a row is served next.
+    """
+
+    def __init__(self, slots: int, max_bypass: int = 8) -> None:
+        """Initialize with all slots free."""
+        self._slots = slots
+        self._free = slots
+        self._max_bypass = max_bypass
+        self._bypassed = 0
+        self._seq = count()
+        self._waiters: tuple[deque[tuple[int, asyncio.Future[None]]], ...] = tuple(
+            deque() for _ in RequestPriority
+        )
+        self._exclusive_lock = asyncio.Lock()
+        self._stats = {priority: _ClassStats() for priority in RequestPriority}
+
+    @asynccontextmanager
+    async def slot(self, priority: RequestPriority) -> AsyncIterator[None]:
+        """Hold one slot for a request of the given class."""
+        start = time.monotonic()
+        await self._acquire(priority)
+        wait = time.monotonic() - start
+        stats = self._stats[priority]
+        stats.requests += 1
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def exclusive(self) -> AsyncIterator[None]:
+        """Wait for the requests in flight and hold off new ones."""
+        async with self._exclusive_lock:
+            acquired = 0
+            try:
+                for _ in range(self._slots):
+                    await self._acquire(RequestPriority.WRITE)
+                    acquired += 1
+                yield
+            finally:
+                for _ in range(acquired):
+                    self._release()
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Requests, waiting, mean and max wait in seconds per class."""
+        return {
+            priority.name.lower(): {
+                "requests": stats.requests,
+                "waiting": len(self._waiters[priority]),
+                "mean_wait": (
+                    stats.total_wait / stats.requests if stats.requests else 0.0
+                ),
+                "max_wait": stats.max_wait,
+            }
+            for priority, stats in self._stats.items()
+        }
+
+    async def _acquire(self, priority: RequestPriority) -> None:
+        if self._free and not any(self._waiters):
+            self._free -= 1
+            return
+        waiters = self._waiters[priority]
+        waiter = (next(self._seq), asyncio.get_running_loop().create_future())
+        waiters.append(waiter)
+        if self._free:
+            # only cancelled waiters were ahead
+            self._wake()
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter[1].cancelled():
+                if waiter in waiters:
+                    waiters.remove(waiter)
+            else:
+                # granted and cancelled before the waiter ran
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._free += 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._free:
+            for waiters in self._waiters:
+                while waiters and waiters[0][1].done():
+                    waiters.popleft()
+            queued = [waiters for waiters in self._waiters if waiters]
+            if not queued:
+                return
+            waiters = queued[0]
+            oldest = min(queued, key=lambda waiters: waiters[0][0])
+            if oldest is waiters:
+                self._bypassed = 0
+            elif self._bypassed >= self._max_bypass:
+                waiters = oldest
+                self._bypassed = 0
+            else:
+                self._bypassed += 1
+            self._free -= 1
+            waiters.popleft()[1].set_result(None)
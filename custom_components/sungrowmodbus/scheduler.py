@@ -0,0 +1,163 @@
+"""Poll the entities of a hub from one task on shared ticks."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Coroutine
+import logging
+import math
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+PollCallback = Callable[[], Coroutine[Any, Any, None]]
+
+
+class PollGroup:
+    """The updates of all entities sharing a scan interval."""
+
+    __slots__ = (
+        "cycles",
+        "due",
+        "interval",
+        "last_duration",
+        "overruns",
+        "running",
+        "updates",
+    )
+
+    def __init__(self, interval: int, now: float) -> None:
+        """Start the group on the next tick of its interval."""
+        self.interval = interval
+        self.updates: list[PollCallback] = []
+        self.due = _next_tick(interval, now)
+        self.running = False
+        self.cycles = 0
+        self.overruns = 0
+        self.last_duration = 0.0
+
+
+def _next_tick(interval: int, now: float) -> float:
+    """First multiple of interval after now, so groups share ticks."""
+    return (math.floor(now / interval) + 1) * interval
+
+
+class PollScheduler:
+    """One polling task per hub instead of a timer per entity.
+
+    Entities are grouped by scan interval; the ticks of every group are
+    aligned to multiples of its interval on the loop clock, so groups whose
+    intervals divide each other poll together.  The updates of every group
+    due on a tick are started at once and queue on the hub.  A group whose
+    cycle takes longer than its interval skips the missed ticks and counts
+    an overrun, without holding up the other groups.
+    """
+
+    def __init__(self, name: str, loop: asyncio.AbstractEventLoop) -> None:
+        """Initialize an idle scheduler."""
+        self.name = name
+        self._loop = loop
+        self._groups: dict[int, PollGroup] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._cycles: set[asyncio.Task[None]] = set()
+        self._changed = asyncio.Event()
+
+    def add(self, interval: int, update: PollCallback) -> Callable[[], None]:
+        """Poll update every interval seconds, return its removal."""
+        if (group := self._groups.get(interval)) is None:
+            group = self._groups[interval] = PollGroup(interval, self._loop.time())
+        group.updates.append(update)
+        self._changed.set()
+        self.start()
+
+        def remove() -> None:
+            group.updates.remove(update)
+            if not group.updates and self._groups.get(interval) is group:
+                del self._groups[interval]
+            self._changed.set()
+
+        return remove
+
+    def start(self) -> None:
+        """Start the polling task unless it runs."""
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+
+    def stop(self) -> None:
+        """Cancel polling, the entities stay registered."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for cycle in self._cycles:
+            cycle.cancel()
+
+    def idle_for(self) -> float:
+        """Seconds until the next poll cycle, 0 while one runs."""
+        if any(group.running for group in self._groups.values()):
+            return 0.0
+        if not self._groups:
+            return math.inf
+        due = min(group.due for group in self._groups.values())
+        return max(0.0, due - self._loop.time())
+
+    def stats(self) -> dict[int, dict[str, float]]:
+        """Entities, cycles, overruns and last cycle duration per interval."""
+        return {
+            interval: {
+                "entities": len(group.updates),
+                "cycles": group.cycles,
+                "overruns": group.overruns,
+                "last_duration": group.last_duration,
+            }
+            for interval, group in self._groups.items()
+        }
+
+    async def _run(self) -> None:
+        while True:
+            self._changed.clear()
+            waiting = [group for group in self._groups.values() if not group.running]
+            if not waiting:
+                await self._changed.wait()
+                continue
+            due = min(group.due for group in waiting)
+            delay = due - self._loop.time()
+            if delay > 0:
+                try:
+                    # an entity added or a cycle finished may change the tick
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                    continue
+                except TimeoutError:
+                    pass
+            for group in waiting:
+                if group.due <= due:
+                    group.running = True
+                    cycle = self._loop.create_task(self._cycle(group))
+                    self._cycles.add(cycle)
+                    cycle.add_done_callback(self._cycles.discard)
+
+    async def _cycle(self, group: PollGroup) -> None:
+        start = self._loop.time()
+        try:
+            results = await asyncio.gather(
+                *(update() for update in list(group.updates)),
+                return_exceptions=True,
+            )
+        finally:
+            now = self._loop.time()
+            group.running = False
+            group.cycles += 1
+            group.last_duration = now - start
+            group.due += group.interval
+            if group.due <= now:
+                group.overruns += 1
+                _LOGGER.debug(
+                    "modbus %s: %ss poll cycle took %.1fs",
+                    self.name,
+                    group.interval,
+                    now - start,
+                )
+                group.due = _next_tick(group.interval, now)
+            self._changed.set()
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.error("modbus %s: poll failed: %s", self.name, result)
@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
+from collections.abc import Callable
+from dataclasses import dataclass
 import logging
 from typing import Any
 
 from homeassistant.components.sensor import (
     CONF_STATE_CLASS,
     RestoreSensor,
+    SensorDeviceClass,
     SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
 )
 from homeassistant.const import (
     CONF_DEVICE_CLASS,
@@ -16,19 +21,35 @@ from homeassistant.const import (
     CONF_SENSORS,
     CONF_UNIQUE_ID,
     CONF_UNIT_OF_MEASUREMENT,
+    PERCENTAGE,
+    EntityCategory,
+    UnitOfInformation,
+    UnitOfTime,
 )
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType, StateType
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
 )
 
 from . import get_hub
-from .const import CONF_SLAVE_COUNT, CONF_VIRTUAL_COUNT
+from .const import (
+    CONF_CHANGE_ONLY,
+    CONF_DEADBAND,
+    CONF_DEADBAND_PERCENT,
+    CONF_DIAGNOSTIC_SENSORS,
+    CONF_HEARTBEAT,
+    CONF_SLAVE_COUNT,
+    CONF_VIRTUAL_COUNT,
+    MODBUS_DOMAIN,
+    DataType,
+)
 from .entity import BaseStructPlatform
 from .modbus import ModbusHub
+from .planner import ReadSpan
+from .state_filter import StateFilter
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -46,7 +67,7 @@ async def async_setup_platform(
     if discovery_info is None:
         return
 
-    sensors: list[ModbusRegisterSensor | SlaveSensor] = []
+    sensors: list[ModbusRegisterSensor | SlaveSensor | HubMetricSensor] = []
     hub = get_hub(hass, discovery_info[CONF_NAME])
     for entry in discovery_info[CONF_SENSORS]:
         slave_count = entry.get(CONF_SLAVE_COUNT, None) or entry.get(
@@ -56,6 +77,10 @@ async def async_setup_platform(
         if slave_count > 0:
             sensors.extend(await sensor.async_setup_slaves(hass, slave_count, entry))
         sensors.append(sensor)
+    if discovery_info.get(CONF_DIAGNOSTIC_SENSORS):
+        sensors.extend(
+            HubMetricSensor(hub, description) for description in HUB_METRIC_SENSORS
+        )
     async_add_entities(sensors)
 
 
@@ -76,9 +101,25 @@ class ModbusRegisterSensor(BaseStructPlatform, RestoreSensor, SensorEntity):
         self._coordinator: DataUpdateCoordinator[list[float | None] | None] | None = (
             None
         )
+        if self._data_type not in (DataType.CUSTOM, DataType.STRING):
+            # values are rounded numbers, shown with the same precision
+            self._attr_suggested_display_precision = self._precision
         self._attr_native_unit_of_measurement = entry.get(CONF_UNIT_OF_MEASUREMENT)
         self._attr_state_class = entry.get(CONF_STATE_CLASS)
         self._attr_device_class = entry.get(CONF_DEVICE_CLASS)
+        self._state_filter = StateFilter(
+            entry.get(CONF_CHANGE_ONLY, False),
+            entry.get(CONF_DEADBAND, 0),
+            entry.get(CONF_DEADBAND_PERCENT, 0),
+            entry.get(CONF_HEARTBEAT, 0),
+        )
+        self._read_span = ReadSpan(
+            self._slave,
+            self._input_type,
+            self._scan_interval,
+            self._address,
+            self._count,
+        )
 
     async def async_setup_slaves(
         self, hass: HomeAssistant, slave_count: int, entry: dict[str, Any]
@@ -102,18 +143,30 @@ class ModbusRegisterSensor(BaseStructPlatform, RestoreSensor, SensorEntity):
 
     async def async_added_to_hass(self) -> None:
         """Handle entity which will be added."""
+        self.async_on_remove(self._hub.register_read(self._read_span))
         await self.async_base_added_to_hass()
         state = await self.async_get_last_sensor_data()
         if state:
             self._attr_native_value = state.native_value
 
+    @callback
+    def async_hub_available(self, available: bool) -> None:
+        """Follow the device going offline or coming back."""
+        if not available and self._coordinator:
+            self._coordinator.async_set_updated_data(None)
+        super().async_hub_available(available)
+
+    async def _async_update_write_state(self) -> None:
+        """Update the entity state, _async_update writes it if it changed."""
+        await self.async_update()
+
     async def _async_update(self) -> None:
         """Update the state of the sensor."""
         # remark "now" is a dummy parameter to avoid problems with
         # async_track_time_interval
         self._cancel_call = None
-        raw_result = await self._hub.async_pb_call(
-            self._slave, self._address, self._count, self._input_type
+        raw_result = await self._hub.async_pb_read(
+            self._read_span, self._cache_max_age
         )
         if raw_result is None:
             #self._attr_available = False
@@ -122,29 +175,38 @@ class ModbusRegisterSensor(BaseStructPlatform, RestoreSensor, SensorEntity):
             #    self._coordinator.async_set_updated_data(None)
             #self.async_write_ha_state()
             return
-        self._attr_available = True
-        result = self.unpack_structure_result(raw_result.registers)
+        if raw_result.decoded is not None and self._decoder in raw_result.decoded:
+            # decoded by the hub with the other sensors of the block
+            values = raw_result.decoded[self._decoder]
+        else:
+            values = self.unpack_structure_result(raw_result.registers)
+        if not self._attr_available:
+            self._attr_available = True
+            self._state_filter.reset()
+        written = self._state_filter.should_write(values)
+        self._hub.metrics.state_write(written)
+        if not written:
+            return
         if self._coordinator:
-            result_array: list[float | None] = []
-            if result:
-                for i in result.split(","):
-                    if i != "None":
-                        result_array.append(
-                            float(i) if not self._value_is_int else int(i)
-                        )
-                    else:
-                        result_array.append(None)
-
-                self._attr_native_value = result_array[0]
-                self._coordinator.async_set_updated_data(result_array)
-            else:
-                self._attr_native_value = None
-                result_array = (self._slave_count + 1) * [None]
-                self._coordinator.async_set_updated_data(result_array)
+            if not values:
+                values = (self._slave_count + 1) * [None]
+            self._attr_native_value = values[0]
+            self._coordinator.async_set_updated_data(values)
+        elif not values:
+            self._attr_native_value = None
+        elif len(values) == 1:
+            self._attr_native_value = values[0]
         else:
-            self._attr_native_value = result
+            # a custom structure shows all its values as text
+            self._attr_native_value = ",".join(map(self._format_value, values))
         self.async_write_ha_state()
 
+    def _format_value(self, value: float | str | None) -> str:
+        """Text of one value, with the configured precision."""
+        if isinstance(value, float):
+            return f"{value:.{self._precision}f}"
+        return str(value)
+
 
 class SlaveSensor(
     CoordinatorEntity[DataUpdateCoordinator[list[float | None] | None]],
@@ -190,3 +252,164 @@ class SlaveSensor(
         self._attr_native_value = result[self._idx] if result else None
         self._attr_available = result is not None
         super()._handle_coordinator_update()
+
+
+@dataclass(frozen=True, kw_only=True)
+class HubMetricSensorEntityDescription(SensorEntityDescription):
+    """Describes a performance counter of a hub."""
+
+    value_fn: Callable[[ModbusHub], StateType]
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _cache_hit_ratio(hub: ModbusHub) -> float | None:
+    if not (lookups := hub.cache.hits + hub.cache.misses + hub.cache.shared):
+        return None
+    return round((hub.cache.hits + hub.cache.shared) / lookups * 100, 1)
+
+
+def _connection(hub: ModbusHub, counter: str) -> int | None:
+    if (connection := hub.connection_stats()) is None:
+        return None
+    return connection[counter]
+
+
+HUB_METRIC_SENSORS: tuple[HubMetricSensorEntityDescription, ...] = (
+    HubMetricSensorEntityDescription(
+        key="requests_per_second",
+        name="requests per second",
+        native_unit_of_measurement="req/s",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda hub: round(hub.metrics.requests_per_second(), 2),
+    ),
+    HubMetricSensorEntityDescription(
+        key="response_latency",
+        name="response latency",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda hub: _ms(hub.pacing.latency),
+    ),
+    HubMetricSensorEntityDescription(
+        key="response_latency_p95",
+        name="response latency p95",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda hub: _ms(hub.metrics.overall_latency().quantile(0.95)),
+    ),
+    HubMetricSensorEntityDescription(
+        key="poll_queue_wait",
+        name="poll queue wait",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda hub: _ms(hub.queue.stats()["poll"]["mean_wait"]),
+    ),
+    HubMetricSensorEntityDescription(
+        key="write_queue_wait",
+        name="write queue wait",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda hub: _ms(hub.queue.stats()["write"]["mean_wait"]),
+    ),
+    HubMetricSensorEntityDescription(
+        key="message_gap",
+        name="message gap",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda hub: _ms(hub.pacing.gap),
+    ),
+    HubMetricSensorEntityDescription(
+        key="bytes_sent",
+        name="bytes sent",
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: _connection(hub, "bytes_sent"),
+    ),
+    HubMetricSensorEntityDescription(
+        key="bytes_received",
+        name="bytes received",
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: _connection(hub, "bytes_received"),
+    ),
+    HubMetricSensorEntityDescription(
+        key="timeouts",
+        name="timeouts",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: hub.metrics.timeouts,
+    ),
+    HubMetricSensorEntityDescription(
+        key="retries",
+        name="retries",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: hub.metrics.retries,
+    ),
+    HubMetricSensorEntityDescription(
+        key="state_writes",
+        name="state writes",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: hub.metrics.state_writes,
+    ),
+    HubMetricSensorEntityDescription(
+        key="state_writes_suppressed",
+        name="state writes suppressed",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: hub.metrics.state_writes_suppressed,
+    ),
+    HubMetricSensorEntityDescription(
+        key="connects",
+        name="connects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: _connection(hub, "connects"),
+    ),
+    HubMetricSensorEntityDescription(
+        key="reconnects",
+        name="reconnects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: _connection(hub, "reconnects"),
+    ),
+    HubMetricSensorEntityDescription(
+        key="poll_overruns",
+        name="poll overruns",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda hub: sum(
+            stats["overruns"] for stats in hub.scheduler.stats().values()
+        ),
+    ),
+    HubMetricSensorEntityDescription(
+        key="cache_hit_ratio",
+        name="cache hit ratio",
+        native_unit_of_measurement=PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_cache_hit_ratio,
+    ),
+)
+
+
+class HubMetricSensor(SensorEntity):
+    """Performance counter of a hub, polled by Home Assistant."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    entity_description: HubMetricSensorEntityDescription
+
+    def __init__(
+        self, hub: ModbusHub, description: HubMetricSensorEntityDescription
+    ) -> None:
+        """Initialize the hub metric sensor."""
+        self._hub = hub
+        self.entity_description = description
+        self._attr_name = f"{hub.name} {description.name}"
+        self._attr_unique_id = f"{MODBUS_DOMAIN}_{hub.name}_{description.key}"
+
+    async def async_update(self) -> None:
+        """Read the counter, the hub keeps it up to date."""
+        self._attr_native_value = self.entity_description.value_fn(self._hub)
@@ -0,0 +1,135 @@
+"""Register layout of the sensor data types.
+
+The rules are shared by the configuration validation of the integration and
+by fleet.py, so this module imports nothing from Home Assistant.
+"""
+
+from __future__ import annotations
+
+from collections import namedtuple
+import struct
+
+ENTRY = namedtuple(  # noqa: PYI024
+    "ENTRY",
+    [
+        "struct_id",
+        "register_count",
+        "validate_parm",
+    ],
+)
+
+
+ILLEGAL = "I"
+OPTIONAL = "O"
+DEMANDED = "D"
+
+PARM_IS_LEGAL = namedtuple(  # noqa: PYI024
+    "PARM_IS_LEGAL",
+    [
+        "count",
+        "structure",
+        "slave_count",
+        "swap_byte",
+        "swap_word",
+    ],
+)
+# keyed by the DataType values, DataType members find them as well
+DEFAULT_STRUCT_FORMAT = {
+    "int16": ENTRY(
+        "h", 1, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, ILLEGAL)
+    ),
+    "uint16": ENTRY(
+        "H", 1, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, ILLEGAL)
+    ),
+    "float16": ENTRY(
+        "e", 1, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, ILLEGAL)
+    ),
+    "int32": ENTRY(
+        "i", 2, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
+    ),
+    "uint32": ENTRY(
+        "I", 2, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
+    ),
+    "float32": ENTRY(
+        "f", 2, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
+    ),
+    "int64": ENTRY(
+        "q", 4, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
+    ),
+    "uint64": ENTRY(
+        "Q", 4, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
+    ),
+    "float64": ENTRY(
+        "d", 4, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
+    ),
+    "string": ENTRY(
+        "s", 0, PARM_IS_LEGAL(DEMANDED, ILLEGAL, ILLEGAL, OPTIONAL, ILLEGAL)
+    ),
+    "custom": ENTRY(
+        "?", 0, PARM_IS_LEGAL(DEMANDED, DEMANDED, ILLEGAL, ILLEGAL, ILLEGAL)
+    ),
+}
+# data types shown without decimals unless a precision is configured
+INTEGER_TYPES = ("int16", "int32", "int64", "uint16", "uint32", "uint64")
+
+
+def sensor_structure(
+    name: str,
+    data_type: str,
+    count: int | None,
+    structure: str | None,
+    slave_count: int | None,
+    swap: str | None,
+) -> tuple[str, int]:
+    """Return the struct format and the registers per value of a sensor.
+
+    The arguments are as configured, None if not set.  Raises ValueError
+    for settings the data type does not allow.
+    """
+    if data_type not in DEFAULT_STRUCT_FORMAT:
+        raise ValueError(f"{name}: unknown `data_type: {data_type}`")
+    validator = DEFAULT_STRUCT_FORMAT[data_type].validate_parm
+    swap_dict = {
+        "byte": validator.swap_byte,
+        "word": validator.swap_word,
+        "word_byte": validator.swap_word,
+    }
+    if swap and swap not in swap_dict:
+        raise ValueError(f"{name}: unknown `swap: {swap}`")
+    swap_type_validator = swap_dict[swap] if swap else OPTIONAL
+    for entry in (
+        (count, validator.count, "count"),
+        (structure, validator.structure, "structure"),
+        (slave_count, validator.slave_count, "virtual_count / slave_count:"),
+        (swap, swap_type_validator, f"swap:{swap}"),
+    ):
+        if entry[0] is None:
+            if entry[1] == DEMANDED:
+                raise ValueError(
+                    f"{name}: `{entry[2]}` missing, demanded with `data_type: {data_type}`"
+                )
+        elif entry[1] == ILLEGAL:
+            raise ValueError(
+                f"{name}: `{entry[2]}` illegal with `data_type: {data_type}`"
+            )
+
+    if data_type == "custom":
+        assert isinstance(structure, str)
+        assert isinstance(count, int)
+        try:
+            size = struct.calcsize(structure)
+        except struct.error as err:
+            raise ValueError(f"{name}: error in structure format --> {err!s}") from err
+        bytecount = count * 2
+        if bytecount != size:
+            raise ValueError(
+                f"{name}: Size of structure is {size} bytes but `count: {count}` is {bytecount} bytes"
+            )
+        return structure, count
+    if data_type != "string":
+        count = DEFAULT_STRUCT_FORMAT[data_type].register_count
+    assert count is not None
+    struct_id = DEFAULT_STRUCT_FORMAT[data_type].struct_id
+    if slave_count:
+        return f">{slave_count + 1}{struct_id}", count
+    return f">{struct_id}", count
@@ -0,0 +1,62 @@
+"""Skip state writes of values that did not change enough."""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+import time
+
+
+class StateFilter:
+    """Decide whether a new read is worth a state write.
+
+    Without change_only every read is written.  In change-only mode a read
+    is written when a value changed by more than deadband and by more than
+    deadband_percent of the last written value, or when the last write is
+    heartbeat seconds old so the state never goes silent for longer.
+    """
+
+    def __init__(
+        self,
+        change_only: bool = False,
+        deadband: float = 0.0,
+        deadband_percent: float = 0.0,
+        heartbeat: float = 0.0,
+    ) -> None:
+        """Initialize a filter that writes the first read."""
+        self.change_only = change_only or bool(deadband or deadband_percent)
+        self.deadband = deadband
+        self.relative = deadband_percent / 100
+        self.heartbeat = heartbeat
+        self._last: Sequence | None = None
+        self._written_at: float | None = None
+
+    def should_write(self, values: Sequence | None) -> bool:
+        """Return True and remember values if they are to be written."""
+        now = time.monotonic()
+        if (
+            not self.change_only
+            or self._written_at is None
+            or (self.heartbeat and now - self._written_at >= self.heartbeat)
+            or self._changed(values)
+        ):
+            self._last = values
+            self._written_at = now
+            return True
+        return False
+
+    def reset(self) -> None:
+        """Write the next read, e.g. after the entity was unavailable."""
+        self._written_at = None
+
+    def _changed(self, values: Sequence | None) -> bool:
+        if values is None or self._last is None or len(values) != len(self._last):
+            return values != self._last
+        for new, old in zip(values, self._last, strict=True):
+            if new == old:
+                continue
+            if not (isinstance(new, (int, float)) and isinstance(old, (int, float))):
+                return True
+            change = abs(new - old)
+            if change > self.deadband and change > abs(old) * self.relative:
+                return True
+        return False
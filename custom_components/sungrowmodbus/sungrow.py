@@ -1,96 +1,707 @@
 from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.constants import ExcCodes
+from pymodbus.exceptions import ConnectionException, ModbusIOException, ParameterException
 from pymodbus.logging import Log
+from pymodbus.pdu import ExceptionResponse, ModbusPDU
 from Cryptodome.Cipher import AES
 import asyncio
+import json
+import os
+import random
+import time
 
 PRIV_KEY = b'Grow#0*2Sun68CbE'
 NO_CRYPTO1 = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 NO_CRYPTO2 = b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff'
 GET_KEY = b'\x68\x68\x00\x00\x00\x06\xf7\x04\x0a\xe7\x00\x08'
 HEADER = bytes([0x68, 0x68])
+CRYPTO_HEADER_SIZE = 4
+KEY_PACKET_SIZE = 25
+# packet_len is a single byte of the crypto header
+MAX_PACKET_LEN = 255
+# largest encrypted frame: crypto header + packet_len (1 byte) + padding
+MAX_FRAME_SIZE = CRYPTO_HEADER_SIZE + MAX_PACKET_LEN + 16
+# transaction id, protocol id, length and unit id
+MBAP_SIZE = 7
+# largest read whose reply (function code, byte count, registers) fits a frame
+MAX_READ_REGISTERS = (MAX_PACKET_LEN - MBAP_SIZE - 2) // 2
+READ_REGISTERS = (3, 4)
+# coils, discrete inputs, holding and input registers
+READ_FUNCTIONS = (1, 2, 3, 4)
+# quiet seconds after a pipelined request timed out before requests are
+# sent again, late replies meanwhile are dropped
+PIPELINE_DRAIN = 0.5
+# what a request does while the session is being reconnected
+RECONNECT_QUEUE = 'queue'
+RECONNECT_FAIL = 'fail'
+# exception replies of a device or gateway that cannot keep up
+BUSY_EXCEPTIONS = {
+    ExcCodes.ACKNOWLEDGE,
+    ExcCodes.DEVICE_BUSY,
+    ExcCodes.GATEWAY_PATH_UNAVIABLE,
+    ExcCodes.GATEWAY_NO_RESPONSE,
+}
+# 0xff padding for every possible padding length, indexed by length
+PADDING = tuple(b'\xff' * padding for padding in range(17))
 
 def raise_():
     raise Exception("Invalid state")
 
+class _PipelineDrained(Exception):
+    """A pipelined request was failed with the request before it."""
+
+class _NoSession(ConnectionException):
+    """A request was refused while no session is up, it was not sent."""
+
+class SessionKeyCache:
+    """Session keys per host/port, valid for ttl seconds.
+
+    Shared between client instances so a reconnect can skip the GET_KEY round
+    trip; pass path to keep the keys in a JSON file across restarts.
+    """
+
+    def __init__(self, ttl: float = 3600, path: str | None = None):
+        self._ttl = ttl
+        self._path = path
+        self._keys: dict[str, tuple[bytes, float]] = {}
+        if path:
+            self._load()
+
+    def get(self, host: str, port: int) -> bytes | None:
+        entry = self._keys.get(f"{host}:{port}")
+        if entry is None:
+            return None
+        key, expires = entry
+        if time.time() >= expires:
+            self.invalidate(host, port)
+            return None
+        return key
+
+    def put(self, host: str, port: int, key: bytes) -> None:
+        self._keys[f"{host}:{port}"] = (key, time.time() + self._ttl)
+        self._save()
+
+    def invalidate(self, host: str, port: int) -> None:
+        if self._keys.pop(f"{host}:{port}", None) is not None:
+            self._save()
+
+    def _load(self) -> None:
+        try:
+            with open(self._path, encoding="utf-8") as store:
+                entries = json.load(store)
+            self._keys = {
+                host: (bytes.fromhex(key), expires)
+                for host, (key, expires) in entries.items()
+            }
+        except (OSError, ValueError, TypeError) as err:
+            Log.debug("*** SessionKeyCache *** cannot load {}: {}", self._path, err)
+
+    def _save(self) -> None:
+        if not self._path:
+            return
+        entries = {host: (key.hex(), expires) for host, (key, expires) in self._keys.items()}
+        try:
+            with open(f"{self._path}.tmp", "w", encoding="utf-8") as store:
+                json.dump(entries, store)
+            os.replace(f"{self._path}.tmp", self._path)
+        except OSError as err:
+            Log.warning("*** SessionKeyCache *** cannot save {}: {}", self._path, err)
+
+class ReceiveBuffer:
+    """Preallocated receive buffer, unread bytes are exposed as memoryviews.
+
+    Incoming chunks are appended in place; the unread region is moved back to
+    the front only when the tail runs out of room, so a reply of unknown length
+    arriving in many small segments is copied once instead of once per segment.
+    """
+
+    def __init__(self, capacity: int = 4 * MAX_FRAME_SIZE):
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._capacity = capacity
+        self._start = 0
+        self.pending = 0
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def __getitem__(self, index: int) -> int:
+        return self._buffer[self._start + index]
+
+    def clear(self) -> None:
+        self._start = self.pending = 0
+
+    def write(self, data: bytes) -> int:
+        """Append data, return the number of unread bytes."""
+        end = self._start + self.pending
+        size = len(data)
+        if end + size > self._capacity:
+            self._compact(size)
+            end = self.pending
+        self._view[end:end + size] = data
+        self.pending += size
+        return self.pending
+
+    def view(self, start: int = 0, stop: int | None = None) -> memoryview:
+        stop = self.pending if stop is None else stop
+        return self._view[self._start + start:self._start + stop]
+
+    def consume(self, size: int) -> None:
+        if size >= self.pending:
+            self._start = self.pending = 0
+        else:
+            self._start += size
+            self.pending -= size
+
+    def _compact(self, size: int) -> None:
+        pending = self._view[self._start:self._start + self.pending]
+        capacity = len(self._buffer)
+        while self.pending + size > capacity:
+            capacity *= 2
+        if capacity != len(self._buffer):
+            self._buffer = bytearray(capacity)
+            self._buffer[:self.pending] = pending
+            self._view = memoryview(self._buffer)
+            self._capacity = capacity
+        elif self.pending:
+            self._view[:self.pending] = pending
+        self._start = 0
+
+
 class AsyncSungrowModbusTcpClient(AsyncModbusTcpClient):
-    def __init__(self, priv_key=PRIV_KEY, **kwargs):
-        super().__init__(**kwargs)
+    def __init__(
+        self,
+        priv_key=PRIV_KEY,
+        pipeline_depth=1,
+        key_cache=None,
+        reconnect_policy=RECONNECT_QUEUE,
+        reconnect_delay=0.1,
+        reconnect_delay_max=300,
+        **kwargs,
+    ):
+        # a new connection needs a new handshake, so the supervisor below
+        # reconnects instead of the transport
+        super().__init__(reconnect_delay=0, **kwargs)
         Log.debug("*** AsyncSungrowModbusTcpClient *** init priv_key {}", priv_key)
         self._orig_callback_data = self.ctx.callback_data
         self._orig_low_level_send = self.ctx.low_level_send
+        self._orig_callback_disconnected = self.ctx.callback_disconnected
+        self.ctx.callback_disconnected = self._callback_disconnected
         self._priv_key = priv_key
+        self._key_cache = key_cache
+        self._key_verified = False
+        # the dongle answers in order and replaces the transaction id with
+        # HEADER, so in-flight requests are matched to replies by send order
+        self._pipeline_depth = max(1, pipeline_depth)
+        self._pipeline = asyncio.Semaphore(self._pipeline_depth)
+        self._transactions: dict[int, tuple[ModbusPDU, asyncio.Future]] = {}
+        # a read reply has no address, so requests that would get replies of
+        # the same shape are not in flight together
+        self._shape_locks: dict[tuple, asyncio.Lock] = {}
+        # the handshake reply, frames of a rejected key may precede the key
+        self._fifo = ReceiveBuffer()
+        # a buffer per frame size to decrypt single frames into
+        self._plain: dict[int, bytearray] = {}
+        # requests are encrypted in place behind a reusable crypto header
+        self._cipher = bytearray(MAX_FRAME_SIZE)
+        self._cipher[0:2] = b'\x01\x00'
+        self._cipher_views: dict[int, tuple[memoryview, memoryview]] = {}
+        # traffic on the wire, crypto header and padding included
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connects = 0
+        # a lost session is reconnected with jittered exponential backoff,
+        # requests meanwhile wait for it (queue) or fail at once (fail)
+        self._reconnect_policy = reconnect_policy
+        self._reconnect_delay = reconnect_delay
+        self._reconnect_delay_max = max(reconnect_delay, reconnect_delay_max)
+        self._supervisor: asyncio.Task | None = None
+        self._online = asyncio.Event()
+        self._closed = False
+        self._lost_at = 0.0
+        # sessions lost so far, a request lost with one is sent again
+        self._losses = 0
+        self.reconnects = 0
+        self.reconnect_attempts = 0
+        # seconds from losing a session to the next one
+        self.last_recovery: float | None = None
+        self.max_recovery: float | None = None
         self._reset()
 
     def _reset(self):
         Log.debug("*** AsyncSungrowModbusTcpClient *** reset")
         self._state = 'INIT'
         self.ctx.callback_data = self._callback_data_decipher
-        self.ctx.low_level_send = self._orig_low_level_send
-        self._fifo = bytes()
+        # nothing but the handshake goes out before the session is set up
+        self.ctx.low_level_send = self._send_refused
+        self._fifo.clear()
+        self._partial = b''
+        self._frame_wanted = CRYPTO_HEADER_SIZE
         self._key = None
+        for _request, future in self._transactions.values():
+            if not future.done():
+                future.set_exception(ConnectionException("Connection closed"))
+        self._transactions.clear()
+        # a new connection gets no late replies
+        self._drain_until = 0.0
 
-    def _setup(self):
-        Log.debug("*** AsyncSungrowModbusTcpClient *** setup pub_key {}", self._pub_key)
-        self._key = bytes(a ^ b for (a, b) in zip(self._pub_key, self._priv_key))
+    def _setup(self, key: bytes | None = None):
+        if key is None:
+            Log.debug("*** AsyncSungrowModbusTcpClient *** setup pub_key {}", self._pub_key)
+            key = bytes(a ^ b for (a, b) in zip(self._pub_key, self._priv_key))
+            if self._key_cache:
+                self._key_cache.put(self.comm_params.host, self.comm_params.port, key)
+        self._key = key
+        # a key straight from the handshake is known good, a cached one is
+        # trusted once the dongle answered with it
+        self._key_verified = self._state == 'HANDSHAKE'
         self._aes_ecb = AES.new(self._key, AES.MODE_ECB)
         self._state = 'CRYPTO'
         self.ctx.low_level_send = self._low_level_send_cipher
 
     async def connect(self):
         Log.debug("*** AsyncSungrowModbusTcpClient *** connect")
+        self._closed = False
+        if await self._open_session():
+            return True
+        # keep trying in the background
+        self._session_lost("connect failed")
+        return False
+
+    async def _open_session(self) -> bool:
         result = await super().connect()
         response = None
         if result:
+            self.connects += 1
+            if self._key_cache and (
+                key := self._key_cache.get(self.comm_params.host, self.comm_params.port)
+            ):
+                Log.debug("*** AsyncSungrowModbusTcpClient *** using cached key")
+                self._setup(key)
+                self._online.set()
+                return True
             self._state = 'HANDSHAKE'
             async with self.ctx._lock:
                 self.response_future = asyncio.Future()
-                self._orig_low_level_send(GET_KEY)
-                response = await asyncio.wait_for(
-                    self.response_future, timeout=self.comm_params.timeout_connect
-                )
-        return result and response is not None
+                self._send(GET_KEY)
+                try:
+                    response = await asyncio.wait_for(
+                        self.response_future, timeout=self.comm_params.timeout_connect
+                    )
+                except (asyncio.TimeoutError, ConnectionException):
+                    response = None
+        if result and response is not None:
+            self._online.set()
+            return True
+        return False
+
+    def _callback_disconnected(self, exc: Exception | None) -> None:
+        self._orig_callback_disconnected(exc)
+        self._session_lost(f"connection lost: {exc}")
+
+    def _session_lost(self, reason: str) -> None:
+        # the connection dropped or its stream no longer decrypts: start
+        # over with a new connection and handshake
+        if self._closed or self._supervisor is not None:
+            return
+        Log.warning("*** AsyncSungrowModbusTcpClient *** session lost ({}), reconnecting", reason)
+        self._lost_at = time.monotonic()
+        self._losses += 1
+        self._online.clear()
+        self._drop_session()
+        self._supervisor = asyncio.get_running_loop().create_task(self._supervise())
+
+    def _drop_session(self) -> None:
+        self.ctx.close()
+        self._reset()
+        # the reply to the request or the handshake in flight is lost; no
+        # one may be waiting for it, so the exception counts as retrieved
+        for future in (self.ctx.response_future, getattr(self, 'response_future', None)):
+            if future is not None and not future.done():
+                future.set_exception(ConnectionException("Session lost"))
+                future.exception()
+
+    async def _supervise(self) -> None:
+        delay = self._reconnect_delay
+        try:
+            while True:
+                # jitter keeps the clients of a dongle that went away from
+                # coming back in step
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                self.reconnect_attempts += 1
+                if await self._open_session():
+                    break
+                self._drop_session()
+                delay = min(delay * 2, self._reconnect_delay_max)
+        finally:
+            self._supervisor = None
+        self.reconnects += 1
+        self.last_recovery = time.monotonic() - self._lost_at
+        self.max_recovery = max(self.max_recovery or 0.0, self.last_recovery)
+        Log.info("*** AsyncSungrowModbusTcpClient *** session back after {:.1f}s", self.last_recovery)
+
+    async def _wait_online(self) -> None:
+        if self._reconnect_policy == RECONNECT_FAIL:
+            raise ConnectionException(f"Reconnecting[{self!s}]")
+        try:
+            await asyncio.wait_for(self._online.wait(), timeout=self.comm_params.timeout_connect)
+        except asyncio.TimeoutError:
+            raise ConnectionException(f"Still reconnecting[{self!s}]") from None
+
+    async def _execute_when_online(self, no_response_expected: bool, request: ModbusPDU) -> ModbusPDU:
+        await self._wait_online()
+        return await self.execute(no_response_expected, request)
+
+    async def _execute_retrying(self, no_response_expected: bool, request: ModbusPDU) -> ModbusPDU:
+        # a read lost with the session is sent again on the next one, up to
+        # retries times, a write is not as it may have been carried out; the
+        # read waits for the session outside the transaction lock, so the
+        # handshake of the next session does not queue behind it
+        lost = 0
+        while True:
+            losses = self._losses
+            try:
+                return await self._execute_session(no_response_expected, request)
+            except _NoSession:
+                if self._supervisor is None:
+                    raise
+            except (ConnectionException, ModbusIOException):
+                if lost == self.ctx.retries or (
+                    self._losses == losses and self._supervisor is None
+                ):
+                    raise
+                lost += 1
+            await self._wait_online()
+
+    def _start_handshake(self):
+        # fetch a new key on the open connection, requests sent meanwhile are
+        # dropped and recovered by the retries of the caller
+        Log.debug("*** AsyncSungrowModbusTcpClient *** handshake")
+        self._fifo.clear()
+        self._partial = b''
+        self._frame_wanted = CRYPTO_HEADER_SIZE
+        self._state = 'HANDSHAKE'
+        self.response_future = asyncio.get_running_loop().create_future()
+        self._send(GET_KEY)
+
+    def _reject_key(self):
+        if self._key_verified:
+            self._session_lost("frame does not decrypt")
+            return
+        Log.warning("*** AsyncSungrowModbusTcpClient *** cached key rejected, requesting a new one")
+        if self._key_cache:
+            self._key_cache.invalidate(self.comm_params.host, self.comm_params.port)
+        self._start_handshake()
+
+    @property
+    def plain(self) -> bool:
+        """Whether the dongle announced no encryption."""
+        return self._state == 'NO_CRYPTO'
 
     def close(self):
        Log.debug("*** AsyncSungrowModbusTcpClient *** close")
+       self._closed = True
+       if self._supervisor is not None:
+           self._supervisor.cancel()
        super().close()
        self._reset()
 
+    def execute(self, no_response_expected: bool, request: ModbusPDU):
+        if self._supervisor is not None:
+            return self._execute_when_online(no_response_expected, request)
+        if self._state != 'NO_CRYPTO':
+            if request.function_code in READ_REGISTERS:
+                if request.count > MAX_READ_REGISTERS:
+                    return self._split_read(no_response_expected, request)
+            elif (length := MBAP_SIZE + 1 + len(request.encode())) > MAX_PACKET_LEN:
+                # a write cannot be split without losing its atomicity
+                raise ParameterException(f"request of {length} bytes does not fit an encrypted frame")
+        if self._reconnect_policy == RECONNECT_QUEUE and request.function_code in READ_FUNCTIONS:
+            return self._execute_retrying(no_response_expected, request)
+        return self._execute_session(no_response_expected, request)
+
+    def _execute_session(self, no_response_expected: bool, request: ModbusPDU):
+        if self._state == 'CRYPTO' and not self._key_verified:
+            return self._execute_unverified(no_response_expected, request)
+        return self._execute(no_response_expected, request)
+
+    def _execute(self, no_response_expected: bool, request: ModbusPDU):
+        if not self.ctx.transport:
+            # pymodbus would open a connection without a handshake
+            raise _NoSession(f"Not connected[{self!s}]")
+        if self._pipeline_depth > 1 and self._state == 'CRYPTO':
+            return self._pipelined_execute(no_response_expected, request)
+        return super().execute(no_response_expected, request)
+
+    async def _split_read(self, no_response_expected: bool, request: ModbusPDU) -> ModbusPDU:
+        # the reply would not fit the packet_len byte, read the registers in
+        # the largest parts that do and join the replies
+        parts = [
+            type(request)(
+                address=request.address + offset,
+                count=min(MAX_READ_REGISTERS, request.count - offset),
+                dev_id=request.dev_id,
+            )
+            for offset in range(0, request.count, MAX_READ_REGISTERS)
+        ]
+        Log.debug("*** AsyncSungrowModbusTcpClient *** reading {} registers in {} frames", request.count, len(parts))
+        responses = await asyncio.gather(
+            *(self.execute(no_response_expected, part) for part in parts)
+        )
+        for response in responses:
+            if response.isError():
+                return response
+        response = responses[0]
+        response.registers = [value for part in responses for value in part.registers]
+        response.retries = max(getattr(part, "retries", 0) for part in responses)
+        return response
+
+    async def _execute_unverified(self, no_response_expected: bool, request: ModbusPDU) -> ModbusPDU:
+        try:
+            return await self._execute(no_response_expected, request)
+        except ModbusIOException:
+            # no answer at all to a cached key counts as a rejection
+            if self._state == 'CRYPTO' and not self._key_verified:
+                self._reject_key()
+            raise
+
+    async def _pipelined_execute(self, no_response_expected: bool, request: ModbusPDU) -> ModbusPDU:
+        shape = self._reply_shape(request)
+        if (lock := self._shape_locks.get(shape)) is None:
+            lock = self._shape_locks[shape] = asyncio.Lock()
+        async with lock, self._pipeline:
+            request.transaction_id = tid = self.ctx.getNextTID()
+            count_retries = 0
+            while count_retries <= self.ctx.retries:
+                await self._drained()
+                future = asyncio.get_running_loop().create_future()
+                self._transactions[tid] = (request, future)
+                try:
+                    self.ctx.pdu_send(request)
+                    if no_response_expected:
+                        return ExceptionResponse(0xff)
+                    response = await asyncio.wait_for(
+                        future, timeout=self.comm_params.timeout_connect
+                    )
+                    response.retries = count_retries
+                    return response
+                except asyncio.exceptions.TimeoutError:
+                    self._drain(tid)
+                    count_retries += 1
+                except _PipelineDrained:
+                    count_retries += 1
+                finally:
+                    if self._transactions.get(tid, (None, None))[1] is future:
+                        del self._transactions[tid]
+            txt = f"No response received after {self.ctx.retries} retries, continue with next request"
+            Log.error(txt)
+            raise ModbusIOException(txt)
+
+    def _drain(self, lost_tid: int) -> None:
+        # the dongle dropped the request or its reply is late; a late reply
+        # would be taken for a request sent after it, so everything in
+        # flight is sent again once no reply came for PIPELINE_DRAIN seconds
+        Log.warning("*** AsyncSungrowModbusTcpClient *** no reply to {}, draining {} requests in flight", lost_tid, len(self._transactions) - 1)
+        self._drain_until = asyncio.get_running_loop().time() + PIPELINE_DRAIN
+        for tid, (_request, future) in list(self._transactions.items()):
+            if tid != lost_tid and not future.done():
+                future.set_exception(_PipelineDrained())
+        self._transactions.clear()
+
+    async def _drained(self) -> None:
+        loop = asyncio.get_running_loop()
+        while (wait := self._drain_until - loop.time()) > 0:
+            await asyncio.sleep(wait)
+
+    def _deliver(self, packet: memoryview, addr: tuple | None) -> None:
+        if self._drain_until:
+            loop = asyncio.get_running_loop()
+            if loop.time() < self._drain_until:
+                Log.debug("*** AsyncSungrowModbusTcpClient *** dropping a late reply")
+                self._drain_until = loop.time() + PIPELINE_DRAIN
+                return
+            self._drain_until = 0.0
+        if not self._transactions:
+            packet[:2] = self._transactionID
+            self._orig_callback_data(bytes(packet), addr)
+            return
+        _used, pdu = self.ctx.framer.handleFrame(bytes(packet), 0, 0)
+        if pdu is None:
+            return
+        # replies come back in send order, but a request the dongle dropped
+        # must not swallow the replies queued behind it; at most one request
+        # in flight has the shape of the reply
+        for tid, (request, future) in self._transactions.items():
+            if self._reply_matches(request, pdu):
+                break
+        else:
+            Log.warning("*** AsyncSungrowModbusTcpClient *** dropping stray reply {}", pdu)
+            return
+        del self._transactions[tid]
+        pdu.transaction_id = tid
+        if not future.done():
+            future.set_result(pdu)
+
+    @staticmethod
+    def _reply_shape(request: ModbusPDU) -> tuple:
+        # what _reply_matches can tell replies apart by
+        if request.function_code in READ_REGISTERS:
+            return (request.dev_id, request.function_code, request.count)
+        return (request.dev_id, request.function_code)
+
+    @staticmethod
+    def _reply_matches(request: ModbusPDU, pdu: ModbusPDU) -> bool:
+        if pdu.dev_id != request.dev_id or (pdu.function_code & 0x7f) != request.function_code:
+            return False
+        if pdu.function_code in (3, 4):
+            # read holding/input registers, the reply carries the register count
+            return len(pdu.registers) == request.count
+        return True
+
     def _low_level_send_cipher(self, request, addr: tuple | None = None):
         Log.debug("*** AsyncSungrowModbusTcpClient *** cypher {}", len(request))
+        if self._state != 'CRYPTO':
+            Log.debug("*** AsyncSungrowModbusTcpClient *** {} dropping request", self._state)
+            return
         length = len(request)
         padding = 16 - (length % 16)
+        end = CRYPTO_HEADER_SIZE + length + padding
         self._transactionID = request[:2]
-        request = HEADER + bytes(request[2:]) + bytes([0xff for i in range(0, padding)])
-        crypto_header = bytes([1, 0, length, padding])
-        encrypted_request = crypto_header + self._aes_ecb.encrypt(request)
-        self._orig_low_level_send(encrypted_request, addr)
+        cipher = self._cipher
+        cipher[2] = length
+        cipher[3] = padding
+        cipher[CRYPTO_HEADER_SIZE:CRYPTO_HEADER_SIZE + length] = request
+        cipher[CRYPTO_HEADER_SIZE:CRYPTO_HEADER_SIZE + 2] = HEADER
+        cipher[CRYPTO_HEADER_SIZE + length:end] = PADDING[padding]
+        frame, plain = self._cipher_frame(end)
+        self._aes_ecb.encrypt(plain, output=plain)
+        # the transport may keep what it is given, so it gets its own copy
+        self._send(bytes(frame), addr)
+
+    def _send_refused(self, request, addr: tuple | None = None):
+        # the connection is gone or its handshake is not done yet, a request
+        # must not go out in the clear
+        raise _NoSession(f"No session[{self!s}]")
+
+    def _send(self, data: bytes, addr: tuple | None = None) -> None:
+        self.bytes_sent += len(data)
+        self._orig_low_level_send(data, addr)
+
+    def _cipher_frame(self, end: int) -> tuple[memoryview, memoryview]:
+        # frames are a multiple of 16 bytes, only a handful of sizes exist
+        views = self._cipher_views.get(end)
+        if views is None:
+            view = memoryview(self._cipher)
+            views = self._cipher_views[end] = (view[:end], view[CRYPTO_HEADER_SIZE:end])
+        return views
 
     def handshake_state(self, data: bytes, addr: tuple | None = None) -> int:
-        self._fifo = self._fifo + data
-        if len(self._fifo) >= 25:
-            self._pub_key = self._fifo[9:25]
-            self._fifo = self._fifo[25:]
+        fifo = self._fifo
+        fifo.write(data)
+        # replies encrypted with a rejected key may still precede the key packet
+        while len(fifo) >= CRYPTO_HEADER_SIZE and fifo[0] == 1 and fifo[1] == 0:
+            length = fifo[2] + fifo[3] + CRYPTO_HEADER_SIZE
+            if len(fifo) < length:
+                return len(data)
+            fifo.consume(length)
+        if len(self._fifo) >= KEY_PACKET_SIZE:
+            self._pub_key = bytes(self._fifo.view(9, KEY_PACKET_SIZE))
+            self._fifo.consume(KEY_PACKET_SIZE)
             if (self._pub_key != NO_CRYPTO1) and (self._pub_key != NO_CRYPTO2):
                 self._setup()
+                # a response coalesced with the key packet is already complete
+                rest = bytes(self._fifo.view())
+                self._fifo.clear()
+                self.crypto_state(rest, addr)
             else:
                 self._state = 'NO_CRYPTO'
+                self.ctx.low_level_send = self._send
             self.response_future.set_result(self._pub_key)
         return len(data)
-        
+
     def crypto_state(self, data: bytes, addr: tuple | None = None) -> int:
-        self._fifo = self._fifo + data
-        if len(self._fifo) >= 4:
-            packet_len = int(self._fifo[2])
-            padding = int(self._fifo[3])
-            length = packet_len + padding + 4
-            if len(self._fifo) >= length:
-                encrypted_packet = self._fifo[4:length]
-                self._fifo = self._fifo[length:]
-                packet = self._aes_ecb.decrypt(encrypted_packet)
-                packet = self._transactionID + packet[2:]
-                self._orig_callback_data(packet, addr)
-        return len(data)
-    
+        size = len(data)
+        if self._partial:
+            # complete frames are decrypted as they arrive, so no more than
+            # one frame is kept; joining it to the segment costs less than a
+            # ReceiveBuffer write, view and consume at every segment size
+            data = self._partial + data
+            if len(data) < self._frame_wanted:
+                self._partial = data
+                return size
+        used = self._decrypt_frames(data, addr)
+        self._partial = data[used:] if used < len(data) else b''
+        return size
+
+    def _decrypt_frames(self, data: bytes, addr: tuple | None) -> int:
+        # deliver every complete frame, a partial header or body is left over
+        # and _frame_wanted tells crypto_state when it can be completed
+        size = len(data)
+        # (start, end) of the complete frames
+        frames = []
+        used = 0
+        wanted = CRYPTO_HEADER_SIZE
+        in_step = True
+        while size - used >= CRYPTO_HEADER_SIZE:
+            packet_len = data[used + 2]
+            padding = data[used + 3]
+            if not packet_len or padding > 16 or (packet_len + padding) % 16:
+                # not a crypto header, the stream is out of step
+                in_step = False
+                break
+            length = packet_len + padding + CRYPTO_HEADER_SIZE
+            if size - used < length:
+                wanted = length
+                break
+            used += length
+            frames.append((used - length, used))
+        self._frame_wanted = wanted
+        if frames:
+            # ECB decrypts every block on its own, so the frames of a segment
+            # take one call
+            if len(frames) == 1:
+                encrypted = data[CRYPTO_HEADER_SIZE:used]
+                # one frame decrypts into a buffer of its size, kept for reuse
+                buffer = self._plain.get(len(encrypted))
+                if buffer is None:
+                    buffer = self._plain[len(encrypted)] = bytearray(len(encrypted))
+            else:
+                encrypted = b''.join(
+                    [data[start + CRYPTO_HEADER_SIZE:end] for start, end in frames]
+                )
+                buffer = bytearray(len(encrypted))
+            self._aes_ecb.decrypt(encrypted, output=buffer)
+            plain = memoryview(buffer)
+            offset = 0
+            for start, end in frames:
+                packet = offset
+                offset += end - start - CRYPTO_HEADER_SIZE
+                # byte compares on the bytearray, a view indexes slower
+                if buffer[packet] != HEADER[0] or buffer[packet + 1] != HEADER[1]:
+                    self._reject_key()
+                    if self._state != 'CRYPTO':
+                        # everything received so far predates the new GET_KEY
+                        return size
+                    continue
+                self._key_verified = True
+                packet_len = data[start + 2]
+                if packet_len < MBAP_SIZE or (
+                    buffer[packet + 4] << 8 | buffer[packet + 5]
+                ) + 6 != packet_len:
+                    # a reply longer than packet_len can express arrives cut
+                    # off, the rest of it would be taken for the next frames
+                    Log.warning("*** AsyncSungrowModbusTcpClient *** dropping truncated frame and {} bytes", size - end)
+                    self._frame_wanted = CRYPTO_HEADER_SIZE
+                    self._session_lost("truncated frame")
+                    return size
+                self._deliver(plain[packet:packet + packet_len], addr)
+        if not in_step:
+            Log.warning("*** AsyncSungrowModbusTcpClient *** dropping {} bytes without a valid frame", size - used)
+            self._frame_wanted = CRYPTO_HEADER_SIZE
+            self._session_lost("invalid frame header")
+            return size
+        return used
+
     def no_crypto_state(self, data: bytes, addr: tuple | None = None) -> int:
         return self._orig_callback_data(data, addr)
     
@@ -102,5 +713,10 @@ class AsyncSungrowModbusTcpClient(AsyncModbusTcpClient):
     }
     
     def _callback_data_decipher(self, data: bytes, addr: tuple | None = None) -> int:
+        self.bytes_received += len(data)
+        if self._state == 'CRYPTO':
+            # every segment of the session, skip the debug call and the
+            # states table, each costs as much as joining a small segment
+            return self.crypto_state(data, addr)
         Log.debug("*** AsyncSungrowModbusTcpClient *** {} decypher {}", self._state, len(data))
         return AsyncSungrowModbusTcpClient.states[self._state](self, data, addr)
@@ -2,9 +2,7 @@
 
 from __future__ import annotations
 
-from collections import namedtuple
 import logging
-import struct
 from typing import Any
 
 import voluptuous as vol
@@ -14,8 +12,11 @@ from homeassistant.const import (
     CONF_COUNT,
     CONF_HOST,
     CONF_NAME,
+    CONF_OFFSET,
     CONF_PORT,
     CONF_SCAN_INTERVAL,
+    CONF_SENSORS,
+    CONF_SLAVE,
     CONF_STRUCTURE,
     CONF_TIMEOUT,
 )
@@ -23,82 +24,38 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.issue_registry import IssueSeverity, async_create_issue
 
 from .const import (
+    CONF_BLOCK_MAX_GAP,
+    CONF_BLOCK_MAX_SIZE,
     CONF_DATA_TYPE,
+    CONF_DECODER,
+    CONF_DEVICE_ADDRESS,
+    CONF_INPUT_TYPE,
+    CONF_MAX_VALUE,
+    CONF_MIN_VALUE,
+    CONF_NAN_VALUE,
+    CONF_PRECISION,
+    CONF_REGISTER_MAP,
+    CONF_SCALE,
     CONF_SLAVE_COUNT,
     CONF_SWAP,
     CONF_SWAP_BYTE,
     CONF_SWAP_WORD,
     CONF_SWAP_WORD_BYTE,
     CONF_VIRTUAL_COUNT,
+    CONF_ZERO_SUPPRESS,
     DEFAULT_HUB,
     DEFAULT_SCAN_INTERVAL,
     MODBUS_DOMAIN as DOMAIN,
     PLATFORMS,
     DataType,
 )
+from .decoder import RegisterDecoder
+from .planner import ReadSpan
+from .register_map import MapEntry, RegisterMap
+from .sensor_format import INTEGER_TYPES, sensor_structure
 
 _LOGGER = logging.getLogger(__name__)
 
-ENTRY = namedtuple(  # noqa: PYI024
-    "ENTRY",
-    [
-        "struct_id",
-        "register_count",
-        "validate_parm",
-    ],
-)
-
-
-ILLEGAL = "I"
-OPTIONAL = "O"
-DEMANDED = "D"
-
-PARM_IS_LEGAL = namedtuple(  # noqa: PYI024
-    "PARM_IS_LEGAL",
-    [
-        "count",
-        "structure",
-        "slave_count",
-        "swap_byte",
-        "swap_word",
-    ],
-)
-DEFAULT_STRUCT_FORMAT = {
-    DataType.INT16: ENTRY(
-        "h", 1, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, ILLEGAL)
-    ),
-    DataType.UINT16: ENTRY(
-        "H", 1, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, ILLEGAL)
-    ),
-    DataType.FLOAT16: ENTRY(
-        "e", 1, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, ILLEGAL)
-    ),
-    DataType.INT32: ENTRY(
-        "i", 2, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
-    ),
-    DataType.UINT32: ENTRY(
-        "I", 2, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
-    ),
-    DataType.FLOAT32: ENTRY(
-        "f", 2, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
-    ),
-    DataType.INT64: ENTRY(
-        "q", 4, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
-    ),
-    DataType.UINT64: ENTRY(
-        "Q", 4, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
-    ),
-    DataType.FLOAT64: ENTRY(
-        "d", 4, PARM_IS_LEGAL(ILLEGAL, ILLEGAL, OPTIONAL, OPTIONAL, OPTIONAL)
-    ),
-    DataType.STRING: ENTRY(
-        "s", 0, PARM_IS_LEGAL(DEMANDED, ILLEGAL, ILLEGAL, OPTIONAL, ILLEGAL)
-    ),
-    DataType.CUSTOM: ENTRY(
-        "?", 0, PARM_IS_LEGAL(DEMANDED, DEMANDED, ILLEGAL, ILLEGAL, ILLEGAL)
-    ),
-}
-
 
 def modbus_create_issue(
     hass: HomeAssistant, key: str, subs: list[str], err: str
@@ -130,60 +87,45 @@ def struct_validator(config: dict[str, Any]) -> dict[str, Any]:
     data_type = config[CONF_DATA_TYPE]
     if data_type == "int":
         data_type = config[CONF_DATA_TYPE] = DataType.INT16
-    count = config.get(CONF_COUNT)
-    structure = config.get(CONF_STRUCTURE)
     slave_count = config.get(CONF_SLAVE_COUNT, config.get(CONF_VIRTUAL_COUNT))
-    validator = DEFAULT_STRUCT_FORMAT[data_type].validate_parm
     swap_type = config.get(CONF_SWAP)
-    swap_dict = {
-        CONF_SWAP_BYTE: validator.swap_byte,
-        CONF_SWAP_WORD: validator.swap_word,
-        CONF_SWAP_WORD_BYTE: validator.swap_word,
-    }
-    swap_type_validator = swap_dict[swap_type] if swap_type else OPTIONAL
-    for entry in (
-        (count, validator.count, CONF_COUNT),
-        (structure, validator.structure, CONF_STRUCTURE),
-        (
+    try:
+        structure, config[CONF_COUNT] = sensor_structure(
+            name,
+            data_type,
+            config.get(CONF_COUNT),
+            config.get(CONF_STRUCTURE),
             slave_count,
-            validator.slave_count,
-            f"{CONF_VIRTUAL_COUNT} / {CONF_SLAVE_COUNT}:",
-        ),
-        (swap_type, swap_type_validator, f"{CONF_SWAP}:{swap_type}"),
-    ):
-        if entry[0] is None:
-            if entry[1] == DEMANDED:
-                error = f"{name}: `{entry[2]}` missing, demanded with `{CONF_DATA_TYPE}: {data_type}`"
-                raise vol.Invalid(error)
-        elif entry[1] == ILLEGAL:
-            error = f"{name}: `{entry[2]}` illegal with `{CONF_DATA_TYPE}: {data_type}`"
-            raise vol.Invalid(error)
-
-    if config[CONF_DATA_TYPE] == DataType.CUSTOM:
-        assert isinstance(structure, str)
-        assert isinstance(count, int)
-        try:
-            size = struct.calcsize(structure)
-        except struct.error as err:
-            raise vol.Invalid(f"{name}: error in structure format --> {err!s}") from err
-        bytecount = count * 2
-        if bytecount != size:
-            raise vol.Invalid(
-                f"{name}: Size of structure is {size} bytes but `{CONF_COUNT}: {count}` is {bytecount} bytes"
-            )
+            swap_type,
+        )
+    except ValueError as err:
+        raise vol.Invalid(str(err)) from err
+    if data_type in INTEGER_TYPES:
+        precision = config.get(CONF_PRECISION, 0)
     else:
-        if data_type != DataType.STRING:
-            config[CONF_COUNT] = DEFAULT_STRUCT_FORMAT[data_type].register_count
-        if slave_count:
-            structure = (
-                f">{slave_count + 1}{DEFAULT_STRUCT_FORMAT[data_type].struct_id}"
-            )
-        else:
-            structure = f">{DEFAULT_STRUCT_FORMAT[data_type].struct_id}"
+        precision = config.get(CONF_PRECISION, 2)
+    decoder = RegisterDecoder(
+        structure,
+        slave_size=config[CONF_COUNT],
+        slave_count=slave_count or 0,
+        swap_bytes=swap_type in (CONF_SWAP_BYTE, CONF_SWAP_WORD_BYTE),
+        swap_words=swap_type in (CONF_SWAP_WORD, CONF_SWAP_WORD_BYTE),
+        scale=config[CONF_SCALE],
+        offset=config[CONF_OFFSET],
+        precision=precision,
+        min_value=config.get(CONF_MIN_VALUE),
+        max_value=config.get(CONF_MAX_VALUE),
+        zero_suppress=config.get(CONF_ZERO_SUPPRESS),
+        nan_value=config.get(CONF_NAN_VALUE),
+        string=data_type == DataType.STRING,
+        none_as_zero=data_type == DataType.CUSTOM,
+    )
     return {
         **config,
         CONF_STRUCTURE: structure,
         CONF_SWAP: swap_type,
+        CONF_PRECISION: precision,
+        CONF_DECODER: decoder,
     }
 
 def nan_validator(value: Any) -> int:
@@ -293,6 +235,25 @@ def validate_entity(
     return True
 
 
+def compile_register_map(hub: dict) -> RegisterMap:
+    """Compile the sensor reads of a hub with their decoders."""
+    entries = []
+    for sensor in hub.get(CONF_SENSORS, ()):
+        if (slave := sensor.get(CONF_SLAVE)) is None:
+            slave = sensor.get(CONF_DEVICE_ADDRESS, 1)
+        slave_count = sensor.get(CONF_SLAVE_COUNT) or sensor.get(CONF_VIRTUAL_COUNT, 0)
+        # the span ModbusRegisterSensor registers with the hub
+        span = ReadSpan(
+            slave,
+            sensor[CONF_INPUT_TYPE],
+            int(sensor[CONF_SCAN_INTERVAL]),
+            int(sensor[CONF_ADDRESS]),
+            sensor[CONF_COUNT] * (slave_count + 1),
+        )
+        entries.append(MapEntry(span, sensor[CONF_DECODER], sensor[CONF_NAME]))
+    return RegisterMap(entries, hub[CONF_BLOCK_MAX_GAP], hub[CONF_BLOCK_MAX_SIZE])
+
+
 def check_config(hass: HomeAssistant, config: dict) -> dict:
     """Do final config check."""
     hosts: set[str] = set()
@@ -342,6 +303,7 @@ def check_config(hass: HomeAssistant, config: dict) -> dict:
             )
             del config[hub_inx]
             continue
+        hub[CONF_REGISTER_MAP] = compile_register_map(hub)
         if hub[CONF_TIMEOUT] >= minimum_scan_interval:
             hub[CONF_TIMEOUT] = minimum_scan_interval - 1
             _LOGGER.warning(
@@ -0,0 +1,66 @@
+"""Fixtures for the standalone modules of the integration.
+
+The tests import sungrow.py, decoder.py and friends directly, the way the
+benchmarks and standalone users do, so they run without Home Assistant.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "sungrowmodbus"))
+
+from common import PUB_KEY  # noqa: E402
+
+from sungrow import AsyncSungrowModbusTcpClient  # noqa: E402
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def crypto_client(loop, **kwargs):
+    """A client in the CRYPTO state on a key from the handshake."""
+
+    async def make():
+        return AsyncSungrowModbusTcpClient(host="127.0.0.1", port=502, **kwargs)
+
+    client = loop.run_until_complete(make())
+    client._pub_key = PUB_KEY
+    client._state = "HANDSHAKE"
+    client._setup()
+    return client
+
+
+@pytest.fixture
+def client(loop):
+    """A client in the CRYPTO state that records what it delivers.
+
+    delivered holds the plain frames handed to pymodbus, rejected and lost
+    count the calls of _reject_key and _session_lost.
+    """
+    client = crypto_client(loop)
+    client._transactionID = b"\x00\x01"
+    client.delivered = []
+    client.rejected = 0
+    client.lost = []
+
+    def sink(packet, addr=None):
+        client.delivered.append(packet)
+        return len(packet)
+
+    def reject_key():
+        client.rejected += 1
+
+    client._orig_callback_data = sink
+    client._reject_key = reject_key
+    client._session_lost = client.lost.append
+    yield client
+    client._reset()
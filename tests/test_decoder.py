@@ -0,0 +1,178 @@
+"""RegisterDecoder gives the same values with and without NumPy."""
+
+import random
+import sys
+
+import pytest
+
+from decoder import BlockDecoder, RegisterDecoder
+
+np = pytest.importorskip("numpy")
+
+
+class ScalarDecoder(RegisterDecoder):
+    """Never decode with NumPy."""
+
+    vector_min_values = sys.maxsize
+
+
+class VectorDecoder(RegisterDecoder):
+    """Decode with NumPy whenever the decoder allows it."""
+
+    vector_min_values = 1
+
+
+# struct code: registers per value
+CODES = {"h": 1, "H": 1, "e": 1, "i": 2, "I": 2, "f": 2, "q": 4, "Q": 4, "d": 4}
+# values that hit NaN, infinity, nan_value and the sign bits
+SPECIAL = [0, 1, 0xFFFF, 0x7FFF, 0x8000, 0x7FC0, 0x7C00, 0xFC00, 0x7F80]
+
+
+def same(a, b):
+    if a is None or b is None:
+        return a is b
+    return type(a) is type(b) and (a == b or (a != a and b != b))  # noqa: PLR0124
+
+
+def configs(rng, size):
+    for _ in range(150):
+        yield {
+            "slave_size": size,
+            "slave_count": rng.choice([1, 5, 70]),
+            "swap_bytes": rng.random() < 0.5,
+            "swap_words": size > 1 and rng.random() < 0.5,
+            # the schema default is the int 1, configured scales are floats
+            "scale": rng.choice([1, 1.0, 0.1, 2.0, -0.5]),
+            "offset": rng.choice([0, 0.0, 5.0, -3.5]),
+            "precision": rng.choice([0, 1, 2]),
+            "min_value": rng.choice([None, -100.0]),
+            "max_value": rng.choice([None, 1000.0]),
+            "zero_suppress": rng.choice([None, 0.5]),
+            "nan_value": rng.choice([None, 0x7FFF, 0xFFFF, 0x7FFFFFFF]),
+        }
+
+
+@pytest.mark.parametrize("code", CODES)
+def test_vector_matches_scalar(code):
+    rng = random.Random(code)
+    size = CODES[code]
+    for config in configs(rng, size):
+        structure = f">{config['slave_count'] + 1}{code}"
+        registers = [
+            rng.choice([rng.randrange(0x10000), *SPECIAL])
+            for _ in range((config["slave_count"] + 1) * size)
+        ]
+        try:
+            expected = ScalarDecoder(structure, **config).decode(registers)
+        except (ValueError, OverflowError):
+            with pytest.raises((ValueError, OverflowError)):
+                VectorDecoder(structure, **config).decode(registers)
+            continue
+        values = VectorDecoder(structure, **config).decode(registers)
+        assert len(values) == len(expected)
+        assert all(map(same, values, expected)), (structure, config, registers)
+
+
+def test_int64_is_exact():
+    registers = [0x0FF3, 0x3333, 0x3333, 0x332D] * 71
+    decoder = VectorDecoder(">71q", slave_size=4, slave_count=70)
+    assert decoder._dtype is None
+    assert decoder.decode(registers) == [0x0FF333333333332D] * 71
+
+
+def block_layout():
+    """Sensors of one block read: byte offset and decoder."""
+    return [
+        (0, RegisterDecoder(">h", slave_size=1)),
+        (2, RegisterDecoder(">I", slave_size=2, swap_words=True)),
+        (8, RegisterDecoder(">h", slave_size=1, scale=0.1, precision=1)),
+        (12, RegisterDecoder(">s", slave_size=2, string=True)),
+    ]
+
+
+def own_values(layout, registers):
+    """What every sensor decodes from its own registers."""
+    return {
+        decoder: decoder.decode(registers[start // 2 : start // 2 + decoder._registers])
+        for start, decoder in layout
+    }
+
+
+def test_block_decodes_like_the_sensors():
+    layout = block_layout()
+    registers = [1, 2, 3, 4, 5, 6, 0x4142, 0x4344]
+    assert BlockDecoder(layout).decode(registers) == own_values(layout, registers)
+
+
+@pytest.mark.parametrize("count", range(8))
+def test_short_reply_decodes_the_sensors_it_holds(count):
+    layout = block_layout()
+    registers = [1, 2, 3, 4, 5, 6, 0x4142, 0x4344][:count]
+    decoded = BlockDecoder(layout).decode(registers)
+    complete = [
+        decoder for start, decoder in layout if start + decoder._registers * 2 <= count * 2
+    ]
+    assert set(decoded) == set(complete)
+    for decoder in complete:
+        start = next(start for start, other in layout if other is decoder) // 2
+        assert decoded[decoder] == decoder.decode(
+            registers[start : start + decoder._registers]
+        )
+
+
+class VectorBlockDecoder(BlockDecoder):
+    """Scale every block with NumPy."""
+
+    vector_min_values = 1
+
+
+def random_layout(rng):
+    """Sensors of all types and settings next to each other, some apart."""
+    layout, start = [], 0
+    for _ in range(rng.randrange(2, 30)):
+        code = rng.choice(list(CODES))
+        config = next(configs(rng, CODES[code]))
+        config["slave_count"] = rng.choice([0, 0, 1, 3])
+        layout.append(
+            (start, ScalarDecoder(f">{config['slave_count'] + 1}{code}", **config))
+        )
+        start += layout[-1][1]._registers * 2 + rng.choice([0, 0, 2, 6])
+    return layout, start // 2
+
+
+@pytest.mark.parametrize("block", [BlockDecoder, VectorBlockDecoder])
+def test_random_blocks_decode_like_the_sensors(block):
+    rng = random.Random(block.__name__)
+    for _ in range(300):
+        layout, count = random_layout(rng)
+        registers = [
+            rng.choice([rng.randrange(0x10000), *SPECIAL, 0x6E61, 0x6E00])
+            for _ in range(count)
+        ]
+        try:
+            expected = own_values(layout, registers)
+        except (ValueError, OverflowError):
+            with pytest.raises((ValueError, OverflowError)):
+                block(layout).decode(registers)
+            continue
+        decoded = block(layout).decode(registers)
+        assert decoded.keys() == expected.keys()
+        for decoder, values in expected.items():
+            if values is None:
+                assert decoded[decoder] is None
+                continue
+            assert len(decoded[decoder]) == len(values)
+            assert all(map(same, decoded[decoder], values)), (layout, registers)
+
+
+def test_vector_block_settings_stay_with_their_sensor():
+    layout = [
+        (0, RegisterDecoder(">i", slave_size=2)),
+        (4, RegisterDecoder(">h", slave_size=1, nan_value=0x7FFF)),
+        (6, RegisterDecoder(">h", slave_size=1, precision=1, scale=0.5)),
+        (8, RegisterDecoder(">i", slave_size=2, precision=2, scale=0.01)),
+    ]
+    # the text "nan", nan_value, and 0 where no sensor has it as nan_value
+    registers = [0x6E61, 0x6E00, 0x7FFF, 0, 0, 1234]
+    decoded = VectorBlockDecoder(layout).decode(registers)
+    assert [decoded[decoder] for _, decoder in layout] == [None, [None], [0.0], [12.34]]
@@ -0,0 +1,107 @@
+"""Frame splitting and coalescing of AsyncSungrowModbusTcpClient."""
+
+from common import PUB_KEY, encrypt_frame, read_response, session_key
+
+from sungrow import CRYPTO_HEADER_SIZE
+
+KEY = session_key()
+
+
+def plain(transaction_id, count):
+    """The frame pymodbus gets for a reply, with the request's id."""
+    return b"\x00\x01" + read_response(transaction_id, 1, count)[2:]
+
+
+def test_coalesced_frames_are_all_delivered(client):
+    frames = [encrypt_frame(KEY, read_response(1, 1, count)) for count in (1, 10, 100)]
+    stream = b"".join(frames)
+
+    assert client._decrypt_frames(stream, None) == len(stream)
+    assert client.delivered == [plain(1, 1), plain(1, 10), plain(1, 100)]
+    assert client._frame_wanted == CRYPTO_HEADER_SIZE
+
+
+def test_partial_frame_is_left_over(client):
+    frame = encrypt_frame(KEY, read_response(1, 1, 10))
+    stream = frame + frame[:20]
+
+    assert client._decrypt_frames(stream, None) == len(frame)
+    assert client.delivered == [plain(1, 10)]
+    assert client._frame_wanted == len(frame)
+
+
+def test_frame_split_inside_crypto_header(client):
+    frame = encrypt_frame(KEY, read_response(1, 1, 10))
+    callback = client.ctx.callback_data
+    for split in range(1, CRYPTO_HEADER_SIZE):
+        # the tail of the previous frame arrives with the head of this one
+        callback(frame + frame[:split])
+        callback(frame[split:])
+    assert client.delivered == [plain(1, 10)] * 2 * (CRYPTO_HEADER_SIZE - 1)
+    assert client._partial == b""
+
+
+def test_frame_in_single_bytes(client):
+    frame = encrypt_frame(KEY, read_response(1, 1, 3))
+    callback = client.ctx.callback_data
+    for byte in frame * 2:
+        callback(bytes([byte]))
+    assert client.delivered == [plain(1, 3)] * 2
+
+
+def test_frame_coalesced_with_the_key_packet(loop, client):
+    frame = encrypt_frame(KEY, read_response(1, 1, 10))
+    key_packet = b"\x68\x68\x00\x00\x00\x13\xf7\x04\x10" + PUB_KEY
+    client._state = "HANDSHAKE"
+    client.response_future = loop.create_future()
+    callback = client.ctx.callback_data
+    # the key, a whole frame and the head of the next in one segment
+    callback(key_packet + frame + frame[:20])
+    callback(frame[20:])
+    assert client.response_future.result() == PUB_KEY
+    assert client.delivered == [plain(1, 10)] * 2
+    assert client._partial == b""
+
+
+def test_wrong_key_frame_rejects_the_key(client):
+    wrong = encrypt_frame(bytes(16), read_response(1, 1, 10))
+    good = encrypt_frame(KEY, read_response(1, 1, 1))
+
+    assert client._decrypt_frames(wrong + good, None) == len(wrong + good)
+    assert client.rejected == 1
+    # the client still holds its key, so the next frame decrypts
+    assert client.delivered == [plain(1, 1)]
+    assert not client.lost
+
+
+def test_bad_padding_drops_the_session(client):
+    frame = bytearray(encrypt_frame(KEY, read_response(1, 1, 10)))
+    frame[3] = 17
+    good = encrypt_frame(KEY, read_response(1, 1, 1))
+    stream = bytes(frame) + good
+
+    assert client._decrypt_frames(stream, None) == len(stream)
+    assert client.delivered == []
+    assert client.lost == ["invalid frame header"]
+    assert client.rejected == 0
+
+
+def test_padding_not_completing_a_block_drops_the_session(client):
+    frame = bytearray(encrypt_frame(KEY, read_response(1, 1, 10)))
+    frame[3] -= 1
+
+    assert client._decrypt_frames(bytes(frame), None) == len(frame)
+    assert client.delivered == []
+    assert client.lost == ["invalid frame header"]
+
+
+def test_truncated_reply_drops_the_session(client):
+    # packet_len says less than the MBAP length of the reply
+    packet = read_response(1, 1, 10)
+    frame = bytearray(encrypt_frame(KEY, packet))
+    frame[2] -= 2
+    frame[3] += 2
+
+    assert client._decrypt_frames(bytes(frame), None) == len(frame)
+    assert client.delivered == []
+    assert client.lost == ["truncated frame"]
@@ -0,0 +1,171 @@
+"""Polling a fleet of simulated inverters and the sample formats."""
+
+import asyncio
+import io
+import math
+import socket
+
+import pytest
+
+pytest.importorskip("yaml")
+
+from simulator import Simulator  # noqa: E402
+
+import fleet  # noqa: E402
+
+HOLDING = {address: address for address in range(40)}
+# b: 0x00020001 word swapped, f: float32 inf, g: float32 1.5
+HOLDING.update({10: 0x0001, 11: 0x0002, 20: 0x7F80, 21: 0, 22: 0x3FC0, 23: 0})
+
+SENSORS = """\
+      - {name: a, address: 0, scale: 0.1, precision: 1}
+      - {name: b, address: 10, data_type: uint32, swap: word}
+      - {name: c, address: 1, slave_count: 2}
+      - {name: f, address: 20, data_type: float32}
+      - {name: g, address: 22, data_type: float32, precision: 1, scan_interval: 2}
+      - {name: s, address: 30, data_type: string, count: 2, input_type: input,
+         scan_interval: 1}
+"""
+
+
+def write_config(tmp_path, ports, sensors=SENSORS):
+    """A configuration.yaml with a hub on each port."""
+    path = tmp_path / "configuration.yaml"
+    hubs = "".join(
+        f"  - name: inv{inx}\n"
+        f"    host: 127.0.0.1\n"
+        f"    port: {port}\n"
+        f"    block_max_gap: 10\n"
+        f"    sensors:\n{sensors}"
+        for inx, port in enumerate(ports)
+    )
+    path.write_text(f"sungrowmodbus:\n{hubs}")
+    return str(path)
+
+
+@pytest.fixture
+def simulator(loop):
+    simulator = loop.run_until_complete(
+        Simulator(
+            holding_registers=HOLDING,
+            input_registers={30: 0x4142, 31: 0x4344},
+            strict=True,
+        ).start()
+    )
+    yield simulator
+    simulator.close()
+    loop.run_until_complete(asyncio.sleep(0.01))
+
+
+async def make_poller(path, writer):
+    """A poller of the hubs of path, the clients need a running loop."""
+    return fleet.FleetPoller(fleet.load_fleet(path), writer)
+
+
+def poll_once(loop, path, writer_class):
+    stream = io.StringIO()
+    poller = loop.run_until_complete(make_poller(path, writer_class(stream)))
+    loop.run_until_complete(poller.run(once=True))
+    return poller, stream.getvalue().splitlines()
+
+
+def test_poll_once_line_protocol(loop, tmp_path, simulator):
+    poller, lines = poll_once(
+        loop, write_config(tmp_path, [simulator.port]), fleet.LineProtocolWriter
+    )
+    points = [line.rsplit(" ", 1) for line in lines]
+    assert all(timestamp.isdigit() for _, timestamp in points)
+    # f is inf, which line protocol cannot hold
+    assert [point for point, _ in points] == [
+        "sungrow,hub=inv0 g=1.5",
+        r"sungrow,hub=inv0 a=0.0,c=1,c\ 0=2,c\ 1=3,b=131073",
+        'sungrow,hub=inv0 s="ABCD"',
+    ]
+    assert poller.stats() == {
+        "hubs": 1,
+        "reads": 3,
+        "failures": 0,
+        "skipped": 0,
+        "samples": 8,
+    }
+
+
+def test_poll_once_csv(loop, tmp_path, simulator):
+    _, lines = poll_once(loop, write_config(tmp_path, [simulator.port]), fleet.CsvWriter)
+    assert lines[0] == "time,hub,sensor,value"
+    rows = [line.split(",", 1)[1] for line in lines[1:]]
+    assert rows == [
+        "inv0,g,1.5",
+        "inv0,a,0.0",
+        "inv0,c,1",
+        "inv0,c 0,2",
+        "inv0,c 1,3",
+        "inv0,b,131073",
+        "inv0,f,inf",
+        "inv0,s,ABCD",
+    ]
+
+
+def test_failed_and_skipped_reads(loop, tmp_path, simulator):
+    # nothing listens on the port of a closed socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed = sock.getsockname()[1]
+    sensors = "      - {name: x, address: 100}\n" + SENSORS
+    poller, lines = poll_once(
+        loop, write_config(tmp_path, [simulator.port, closed], sensors), fleet.SampleWriter
+    )
+    # the strict simulator refuses register 100, the closed hub is skipped
+    assert poller.stats() == {
+        "hubs": 2,
+        "reads": 4,
+        "failures": 1,
+        "skipped": 4,
+        "samples": 8,
+    }
+    assert {line.split(" ", 2)[1] for line in lines} == {"inv0"}
+
+
+def test_polling_loop_keeps_the_intervals(loop, tmp_path, simulator, monkeypatch):
+    # the first polls start at once
+    monkeypatch.setattr(fleet.random, "uniform", lambda low, high: low)
+    path = write_config(tmp_path, [simulator.port])
+    stream = io.StringIO()
+    poller = loop.run_until_complete(make_poller(path, fleet.CsvWriter(stream)))
+
+    async def run():
+        task = asyncio.create_task(poller.run())
+        await asyncio.sleep(1.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    loop.run_until_complete(run())
+    sensors = [line.split(",")[2] for line in stream.getvalue().splitlines()[1:]]
+    # s every second, g every 2 s, the rest every 15 s
+    assert sensors.count("s") == 2
+    assert sensors.count("g") == 1
+    assert sensors.count("a") == 1
+    assert poller.stats()["reads"] == 4
+    assert poller.stats()["failures"] == 0
+    assert all(not hub.client.connected for hub in poller.hubs)
+
+
+@pytest.mark.parametrize(
+    ("samples", "fields"),
+    [
+        ([("a", math.inf), ("b", 1), ("c", -math.inf)], "b=1"),
+        ([("a", math.nan), ("b", 2.5)], "b=2.5"),
+        ([("a b", 'say "hi"'), ("c=d", 0)], r'a\ b="say \"hi\"",c\=d=0'),
+    ],
+)
+def test_line_protocol_fields(samples, fields):
+    stream = io.StringIO()
+    fleet.LineProtocolWriter(stream)._write("inv 0", 123, samples)
+    assert stream.getvalue() == f"sungrow,hub=inv\\ 0 {fields} 123\n"
+
+
+def test_line_protocol_without_finite_values_writes_no_point():
+    stream = io.StringIO()
+    fleet.LineProtocolWriter(stream)._write("inv", 123, [("a", math.inf)])
+    assert stream.getvalue() == ""
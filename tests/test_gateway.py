@@ -0,0 +1,231 @@
+"""The plain Modbus TCP gateway in front of one encrypted session, against
+the simulator."""
+
+import asyncio
+import struct
+
+from pymodbus.client import AsyncModbusTcpClient
+import pytest
+
+from gateway import GATEWAY_NO_RESPONSE, ILLEGAL_FUNCTION, ILLEGAL_VALUE, ModbusGateway
+from simulator import ILLEGAL_ADDRESS, Simulator
+from sungrow import AsyncSungrowModbusTcpClient
+
+REGISTERS = {address: address for address in range(300)}
+
+
+@pytest.fixture
+def gateway(loop):
+    """A gateway on a free port in front of a strict simulator."""
+
+    async def start():
+        simulator = await Simulator(
+            holding_registers=REGISTERS,
+            input_registers={address: 1000 + address for address in range(300)},
+            strict=True,
+            latency=0.02,
+        ).start()
+        upstream = AsyncSungrowModbusTcpClient(
+            host=simulator.host,
+            port=simulator.port,
+            timeout=0.5,
+            retries=0,
+            pipeline_depth=2,
+        )
+        assert await upstream.connect()
+        gateway = ModbusGateway(upstream, cache_max_age=0.5)
+        server = await gateway.start("127.0.0.1", 0)
+        gateway.port = server.sockets[0].getsockname()[1]
+        gateway.simulator = simulator
+        return gateway
+
+    gateway = loop.run_until_complete(start())
+    yield gateway
+    gateway._server.close()
+    gateway.client.close()
+    gateway.simulator.close()
+    loop.run_until_complete(asyncio.sleep(0.01))
+
+
+async def connect(gateway, count=1):
+    """Plain Modbus TCP clients of the gateway."""
+    clients = [
+        AsyncModbusTcpClient("127.0.0.1", port=gateway.port, timeout=2, retries=0)
+        for _ in range(count)
+    ]
+    for client in clients:
+        assert await client.connect()
+    return clients
+
+
+async def raw_request(gateway, tid, pdu):
+    """Send one request frame as is and return the reply frame."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+    try:
+        writer.write(struct.pack(">HHHB", tid, 0, len(pdu) + 1, 1) + pdu)
+        header = await reader.readexactly(7)
+        return header + await reader.readexactly(struct.unpack(">H", header[4:6])[0] - 1)
+    finally:
+        writer.close()
+
+
+def test_reads_and_writes_are_forwarded(loop, gateway):
+    async def run():
+        (client,) = await connect(gateway)
+        try:
+            response = await client.read_holding_registers(10, count=20, device_id=1)
+            assert response.registers == list(range(10, 30))
+            response = await client.read_input_registers(100, count=125, device_id=1)
+            assert response.registers == list(range(1100, 1225))
+            # answered from the cached read
+            response = await client.read_holding_registers(15, count=5, device_id=1)
+            assert response.registers == list(range(15, 20))
+            assert gateway.cache.hits == 1
+            assert not (await client.write_register(12, 999, device_id=1)).isError()
+            assert not (
+                await client.write_registers(20, [1, 2, 3], device_id=1)
+            ).isError()
+            assert gateway.simulator.holding_registers[12] == 999
+            # the writes dropped the cached read
+            response = await client.read_holding_registers(10, count=12, device_id=1)
+            assert response.registers == [*range(10, 12), 999, *range(13, 20), 1, 2]
+            assert gateway.simulator.invalid_frames == 0
+        finally:
+            client.close()
+
+    loop.run_until_complete(run())
+
+
+def test_exception_replies_are_forwarded(loop, gateway):
+    async def run():
+        (client,) = await connect(gateway)
+        try:
+            # beyond the registers of the strict simulator
+            response = await client.read_holding_registers(290, count=20, device_id=1)
+            assert response.isError()
+            assert response.exception_code == ILLEGAL_ADDRESS
+            # the simulator knows no coils
+            response = await client.read_coils(0, count=3, device_id=1)
+            assert response.exception_code == ILLEGAL_FUNCTION
+            # the session is still good
+            response = await client.read_holding_registers(0, count=2, device_id=1)
+            assert response.registers == [0, 1]
+        finally:
+            client.close()
+
+    loop.run_until_complete(run())
+
+
+@pytest.mark.parametrize(
+    ("pdu", "code"),
+    [
+        (struct.pack(">BHH", 0x03, 0, 0), ILLEGAL_VALUE),
+        (struct.pack(">BHH", 0x03, 0, 126), ILLEGAL_VALUE),
+        (struct.pack(">BH", 0x04, 0), ILLEGAL_VALUE),
+        (struct.pack(">BHHB", 0x10, 0, 2, 2) + b"\x00\x01", ILLEGAL_VALUE),
+        (bytes([0x2B, 0x0E, 0x01, 0x00]), ILLEGAL_FUNCTION),
+    ],
+)
+def test_bad_requests_are_answered_by_the_gateway(loop, gateway, pdu, code):
+    async def run():
+        requests = gateway.simulator.requests
+        reply = await raw_request(gateway, 0x1234, pdu)
+        # the transaction id of the client comes back
+        assert reply == struct.pack(">HHHBBB", 0x1234, 0, 3, 1, pdu[0] | 0x80, code)
+        assert gateway.simulator.requests == requests
+
+    loop.run_until_complete(run())
+
+
+def test_no_upstream_reply(loop, gateway):
+    async def run():
+        (client,) = await connect(gateway)
+        try:
+            gateway.simulator.close()
+            await asyncio.sleep(0.05)
+            response = await client.read_holding_registers(0, count=2, device_id=1)
+            assert response.isError()
+            assert response.exception_code == GATEWAY_NO_RESPONSE
+        finally:
+            client.close()
+
+    loop.run_until_complete(run())
+
+
+def test_concurrent_clients_share_the_session(loop, gateway):
+    async def run():
+        clients = await connect(gateway, 10)
+        try:
+            for _ in range(2):
+                gateway.cache.invalidate()
+                upstream = gateway.upstream_requests
+                responses = await asyncio.gather(
+                    *(
+                        client.read_holding_registers(10, count=20, device_id=1)
+                        for client in clients
+                    ),
+                    *(
+                        client.read_input_registers(100 + i, count=5, device_id=1)
+                        for i, client in enumerate(clients)
+                    ),
+                )
+                assert all(
+                    response.registers == list(range(10, 30))
+                    for response in responses[:10]
+                )
+                assert [response.registers for response in responses[10:]] == [
+                    list(range(1100 + i, 1105 + i)) for i in range(10)
+                ]
+                # the identical reads went upstream once
+                assert gateway.upstream_requests - upstream == 11
+            assert gateway.stats()["clients"] == 10
+            assert gateway.simulator.connections == 1
+        finally:
+            for client in clients:
+                client.close()
+
+    loop.run_until_complete(run())
+
+
+def test_requests_in_flight_keep_their_transaction_ids(loop, gateway):
+    async def run():
+        reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+        try:
+            # several requests without waiting, with ids of the client
+            for tid in range(5):
+                pdu = struct.pack(">BHH", 0x03, 50 * tid, 2)
+                writer.write(struct.pack(">HHHB", 1000 + tid, 0, 6, 1) + pdu)
+            replies = {}
+            for _ in range(5):
+                header = await reader.readexactly(7)
+                tid, _, length, _ = struct.unpack(">HHHB", header)
+                replies[tid] = await reader.readexactly(length - 1)
+            assert replies == {
+                1000 + tid: struct.pack(">BBHH", 0x03, 4, 50 * tid, 50 * tid + 1)
+                for tid in range(5)
+            }
+        finally:
+            writer.close()
+
+    loop.run_until_complete(run())
+
+
+def test_client_leaving_does_not_cancel_a_shared_read(loop, gateway):
+    async def run():
+        first, second = await connect(gateway, 2)
+        try:
+            leaving = asyncio.ensure_future(
+                first.read_holding_registers(200, count=10, device_id=1)
+            )
+            staying = asyncio.ensure_future(
+                second.read_holding_registers(200, count=10, device_id=1)
+            )
+            await asyncio.sleep(0.005)
+            first.close()
+            assert (await staying).registers == list(range(200, 210))
+            assert gateway.upstream_requests == 1
+            leaving.cancel()
+        finally:
+            second.close()
+
+    loop.run_until_complete(run())
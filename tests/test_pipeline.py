@@ -0,0 +1,170 @@
+"""Matching pipelined replies, which carry neither id nor address, and
+requests in flight when the session drops."""
+
+import asyncio
+import struct
+
+import pytest
+
+from common import encrypt_frame, session_key
+from conftest import crypto_client
+from simulator import Simulator
+
+import sungrow
+
+KEY = session_key()
+
+
+def reply(values):
+    """Encrypted read holding registers reply with values."""
+    pdu = bytes([3, len(values) * 2]) + struct.pack(f">{len(values)}H", *values)
+    return encrypt_frame(KEY, struct.pack(">HHHB", 0, 0, len(pdu) + 1, 1) + pdu)
+
+
+@pytest.fixture
+def pipelined(loop, monkeypatch):
+    monkeypatch.setattr(sungrow, "PIPELINE_DRAIN", 0.05)
+    client = crypto_client(loop, pipeline_depth=4, timeout=0.1, retries=2)
+    client.ctx.transport = True
+    client.sent = []
+    client.ctx.pdu_send = client.sent.append
+    yield client
+    client._reset()
+
+
+async def sent(client, count):
+    while len(client.sent) < count:
+        await asyncio.sleep(0.005)
+    return client.sent[count - 1]
+
+
+def test_same_count_read_waits_for_the_dropped_one(loop, pipelined):
+    async def run():
+        first = asyncio.create_task(pipelined.read_holding_registers(0, count=2))
+        second = asyncio.create_task(pipelined.read_holding_registers(100, count=2))
+        await sent(pipelined, 1)
+        await asyncio.sleep(0.02)
+        # the second read would take the first one's reply
+        assert [request.address for request in pipelined.sent] == [0]
+        # the dongle drops the first request, it is sent again
+        assert (await sent(pipelined, 2)).address == 0
+        pipelined.ctx.callback_data(reply([1, 2]))
+        assert (await first).registers == [1, 2]
+        assert (await sent(pipelined, 3)).address == 100
+        pipelined.ctx.callback_data(reply([101, 102]))
+        assert (await second).registers == [101, 102]
+
+    loop.run_until_complete(run())
+
+
+def test_late_reply_is_dropped(loop, pipelined):
+    async def run():
+        first = asyncio.create_task(pipelined.read_holding_registers(0, count=2))
+        await sent(pipelined, 1)
+        await asyncio.sleep(0.12)
+        # the reply to the timed out request arrives while draining
+        pipelined.ctx.callback_data(reply([1, 2]))
+        second = asyncio.create_task(pipelined.read_holding_registers(100, count=2))
+        assert (await sent(pipelined, 2)).address == 0
+        pipelined.ctx.callback_data(reply([3, 4]))
+        assert (await first).registers == [3, 4]
+        assert (await sent(pipelined, 3)).address == 100
+        pipelined.ctx.callback_data(reply([101, 102]))
+        assert (await second).registers == [101, 102]
+
+    loop.run_until_complete(run())
+
+
+def test_timeout_fails_the_requests_behind(loop, pipelined):
+    async def run():
+        first = asyncio.create_task(pipelined.read_holding_registers(0, count=2))
+        second = asyncio.create_task(pipelined.read_holding_registers(100, count=3))
+        await sent(pipelined, 2)
+        # both replies are lost, the timeout sends both again after the drain
+        requests = {(await sent(pipelined, 3)).address, (await sent(pipelined, 4)).address}
+        assert requests == {0, 100}
+        pipelined.ctx.callback_data(reply([101, 102, 103]))
+        pipelined.ctx.callback_data(reply([1, 2]))
+        assert (await first).registers == [1, 2]
+        assert (await second).registers == [101, 102, 103]
+
+    loop.run_until_complete(run())
+
+
+def test_different_counts_stay_pipelined(loop, pipelined):
+    async def run():
+        first = asyncio.create_task(pipelined.read_holding_registers(0, count=2))
+        second = asyncio.create_task(pipelined.read_holding_registers(100, count=3))
+        await sent(pipelined, 2)
+        # the dongle dropped the first request, the second one's reply
+        # is still told apart by its count
+        pipelined.ctx.callback_data(reply([101, 102, 103]))
+        assert (await second).registers == [101, 102, 103]
+        assert (await sent(pipelined, 3)).address == 0
+        pipelined.ctx.callback_data(reply([1, 2]))
+        assert (await first).registers == [1, 2]
+
+    loop.run_until_complete(run())
+
+
+async def dropping_session(depth):
+    """A simulator that closes every connection after one reply, and a
+    client connected to it."""
+    simulator = await Simulator(
+        holding_registers={address: address for address in range(300)},
+        drop_after=1,
+        latency=0.01,
+    ).start()
+    client = sungrow.AsyncSungrowModbusTcpClient(
+        host=simulator.host,
+        port=simulator.port,
+        timeout=1,
+        retries=2,
+        reconnect_delay=0.05,
+        pipeline_depth=depth,
+    )
+    assert await client.connect()
+    return simulator, client
+
+
+@pytest.mark.parametrize("depth", [1, 4])
+def test_concurrent_reads_across_a_drop(loop, depth):
+    async def run():
+        simulator, client = await dropping_session(depth)
+        try:
+            start = loop.time()
+            responses = await asyncio.gather(
+                *(client.read_holding_registers(10 * i, count=2) for i in range(3))
+            )
+            # queued for the next sessions, not failed after the timeout
+            assert loop.time() - start < 1
+            assert [response.registers for response in responses] == [
+                [0, 1],
+                [10, 11],
+                [20, 21],
+            ]
+            assert client.reconnects >= 2
+            # nothing was sent in the clear before a handshake
+            assert simulator.invalid_frames == 0
+        finally:
+            client.close()
+            simulator.close()
+
+    loop.run_until_complete(run())
+
+
+@pytest.mark.parametrize("depth", [1, 4])
+def test_split_read_across_a_drop(loop, depth):
+    async def run():
+        simulator, client = await dropping_session(depth)
+        try:
+            start = loop.time()
+            response = await client.read_holding_registers(0, count=250)
+            assert loop.time() - start < 1
+            assert response.registers == list(range(250))
+            assert simulator.invalid_frames == 0
+        finally:
+            client.close()
+            simulator.close()
+
+    loop.run_until_complete(run())
@@ -0,0 +1,67 @@
+"""The sensor layout rules shared by struct_validator and fleet.py."""
+
+import pytest
+
+from sensor_format import DEFAULT_STRUCT_FORMAT, sensor_structure
+
+
+@pytest.mark.parametrize(
+    ("data_type", "slave_count", "expected"),
+    [
+        ("int16", None, (">h", 1)),
+        ("uint32", None, (">I", 2)),
+        ("float64", None, (">d", 4)),
+        ("int16", 9, (">10h", 1)),
+        ("float32", 3, (">4f", 2)),
+    ],
+)
+def test_structure(data_type, slave_count, expected):
+    assert sensor_structure("s", data_type, None, None, slave_count, None) == expected
+
+
+def test_every_type_has_a_layout():
+    for data_type, entry in DEFAULT_STRUCT_FORMAT.items():
+        if data_type in ("string", "custom"):
+            continue
+        structure, count = sensor_structure("s", data_type, None, None, None, "byte")
+        assert structure == ">" + entry.struct_id
+        assert count == entry.register_count
+
+
+def test_string_and_custom_keep_count():
+    assert sensor_structure("s", "string", 5, None, None, None) == (">s", 5)
+    assert sensor_structure("s", "custom", 3, ">hI", None, None) == (">hI", 3)
+
+
+@pytest.mark.parametrize(
+    ("args", "message"),
+    [
+        (("int16", None, None, None, "word"), "`swap:word` illegal"),
+        (("int32", 2, None, None, None), "`count` illegal"),
+        (("string", None, None, None, None), "`count` missing"),
+        (("string", 4, None, 0, None), "`virtual_count / slave_count:` illegal"),
+        (("custom", 2, None, None, None), "`structure` missing"),
+        (("custom", 2, ">hh", None, "byte"), "`swap:byte` illegal"),
+        (("custom", 3, ">hh", None, None), "Size of structure is 4 bytes"),
+        (("custom", 2, ">zz", None, None), "error in structure format"),
+        (("int24", None, None, None, None), "unknown `data_type: int24`"),
+        (("int32", None, None, None, "nibble"), "unknown `swap: nibble`"),
+    ],
+)
+def test_rejected(args, message):
+    with pytest.raises(ValueError, match=message) as err:
+        sensor_structure("s", *args)
+    assert str(err.value).startswith("s: ")
+
+
+def test_fleet_uses_the_rules():
+    pytest.importorskip("yaml")
+    from fleet import compile_sensor
+
+    span, decoder = compile_sensor(
+        {"name": "s", "address": 10, "data_type": "uint32", "slave_count": 2}
+    )
+    assert (span.address, span.count) == (10, 6)
+    assert decoder.structure == ">3I"
+    with pytest.raises(ValueError, match="`swap:word` illegal"):
+        compile_sensor({"name": "s", "address": 10, "swap": "word"})